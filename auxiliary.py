@@ -7,9 +7,345 @@ import gurobipy as gp
 from gurobipy import GRB
 import pandas as pd
 import numpy as np
+import scipy.sparse as sp
+import scipy.optimize
 from dataclasses import dataclass
 import matplotlib.pyplot as plt
 import itertools
+import json
+import copy
+import hashlib
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from types import SimpleNamespace
+try:
+    import highspy
+except ImportError:
+    highspy = None
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Sheets of the xlsx instance files
+INSTANCE_SHEETS = ['vertices', 'solar_params', 'wind_params', 'electrolyzer_params', 'tank_params', 'fuelcell_params',
+    'electricityloads', 'industrialloads', 'time_params', 'day_params', 'scenario_params', 'electricity_edges',
+    'gas_edges', 'liquid_edges', 'electricity_demand', 'gas_demand', 'solar_generation', 'wind_generation', 'scalar_params']
+
+# Directory where parsed instance sheets are cached, one subdirectory per workbook content hash
+INSTANCE_CACHE_DIR = os.path.join('.cache', 'instances')
+INSTANCE_CACHE_MAX_BYTES = 1 << 30
+
+def evict_lru_entries(directory:str, max_bytes:int, keep:str=None):
+    '''
+    Remove the least recently used entries of a cache directory until it fits in max_bytes
+    Input:
+        directory - Directory with one subdirectory per entry, the modification time of an entry is its last use
+        max_bytes - Size limit of the directory
+        keep      - Name of an entry that is never removed
+    '''
+    entries = []
+    try:
+        for entry in os.scandir(directory):
+            if entry.is_dir() and ('.tmp' not in entry.name):
+                size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+                entries.append((entry.stat().st_mtime, size, entry.path, entry.name))
+    except OSError:
+        # Entries removed by another process while scanning, eviction is retried on the next write
+        return
+    total = sum(size for _, size, _, _ in entries)
+    for _, size, path, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        if name != keep:
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+def read_instance_sheets(filename:str, use_cache:bool=True, max_bytes:int=INSTANCE_CACHE_MAX_BYTES):
+    '''
+    Input:
+        filename  - Name of the xlsx instance file
+        use_cache - If True, sheets are read from (or stored in) the cache instead of parsing the workbook
+        max_bytes - Size limit of the cache, the least recently used workbooks are removed beyond it
+    Output:
+        Dictionary of dataframes for each sheet
+    '''
+    if not use_cache:
+        return pd.read_excel(filename, sheet_name=INSTANCE_SHEETS)
+
+    # The cache key changes whenever the content of the workbook or the list of sheets changes
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    digest.update(','.join(INSTANCE_SHEETS).encode())
+    cache_path = os.path.join(INSTANCE_CACHE_DIR, digest.hexdigest())
+
+    if os.path.isdir(cache_path):
+        try:
+            dict_pd = {sheet: pd.read_feather(os.path.join(cache_path, f'{sheet}.feather')) for sheet in INSTANCE_SHEETS}
+            # Last use of the entry, for the eviction order
+            os.utime(cache_path)
+            return dict_pd
+        except Exception:
+            # Incomplete or unreadable entry, parse the workbook again
+            shutil.rmtree(cache_path, ignore_errors=True)
+
+    dict_pd = pd.read_excel(filename, sheet_name=INSTANCE_SHEETS)
+
+    # Write to a temporary directory first so that readers never see a partial entry
+    tmp_path = f'{cache_path}.tmp{os.getpid()}'
+    try:
+        os.makedirs(tmp_path, exist_ok=True)
+        for sheet, df in dict_pd.items():
+            df.to_feather(os.path.join(tmp_path, f'{sheet}.feather'))
+        os.replace(tmp_path, cache_path)
+    except Exception:
+        # Caching is best effort, the parsed sheets are returned regardless
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        return dict_pd
+    evict_lru_entries(INSTANCE_CACHE_DIR, max_bytes, keep=os.path.basename(cache_path))
+    return dict_pd
+
+#------------------------------------------------------------------------------
+# Synthetic Instances
+#------------------------------------------------------------------------------
+
+# Scenario names and weights of the xlsx instance files, solar level then wind level
+SYNTHETIC_SCENARIOS = [('Medium', 'Medium', 0.300), ('Medium', 'High', 0.155), ('Medium', 'Low', 0.155),
+                       ('High', 'Medium', 0.155), ('High', 'High', 0.010), ('High', 'Low', 0.030),
+                       ('Low', 'Medium', 0.155), ('Low', 'High', 0.030), ('Low', 'Low', 0.010)]
+SYNTHETIC_LEVELS = {'Low': 0.7, 'Medium': 1.0, 'High': 1.3}
+
+def synthetic_edges(sources:list, targets:list, density:float, rng:np.random.Generator):
+    # Random subset of the edges from sources to targets, every source and target keeps at least one edge
+    if (len(sources) == 0) or (len(targets) == 0):
+        return []
+    keep = rng.random((len(sources), len(targets))) < density
+    keep[rng.integers(len(sources), size=len(targets)), np.arange(len(targets))] = True
+    keep[np.arange(len(sources)), rng.integers(len(targets), size=len(sources))] = True
+    return [(sources[a], targets[b]) for a, b in zip(*np.nonzero(keep))]
+
+def synthetic_instance_sheets(num_loads:int=7, num_industrial:int=2, num_solar:int=1, num_wind:int=1,
+                              num_electrolyzers:int=1, num_tanks:int=1, num_fuelcells:int=1, edge_density:float=1.0,
+                              num_days:int=4, periods_per_day:int=96, num_scenarios:int=9, seed:int=0):
+    '''
+    Sheets of a random instance with the layout of the xlsx instance files, defaults follow template_instance.xlsx
+    Input:
+        num_*           - Number of nodes of each type, the first num_industrial load areas are industrial
+        edge_density    - Fraction of the possible edges of each network that are built (see synthetic_edges)
+        num_days        - Number of days of the horizon, each with periods_per_day periods
+        num_scenarios   - Number of scenarios of solar and wind levels
+        seed            - Seed of the random profiles and costs
+    Output:
+        Dictionary of dataframes for each sheet, see InstanceMOPTA.from_sheets
+    '''
+    assert (0 < num_industrial <= num_loads), f'Industrial areas must be between 1 and the number of load areas.'
+    assert (num_solar + num_wind > 0) and (num_electrolyzers > 0), f'Instances need renewable plants and electrolyzers.'
+    assert (0 < edge_density <= 1), f'Edge density must be in (0, 1].'
+    rng = np.random.default_rng(seed)
+
+    # Node ids in the order of the template: loads, solar, wind, electrolyzers, fuel cells and tanks
+    ids, start = {}, 1
+    for name, num in [('loads', num_loads), ('solar', num_solar), ('wind', num_wind), ('electrolyzers', num_electrolyzers),
+                      ('fuelcells', num_fuelcells), ('tanks', num_tanks)]:
+        ids[name] = list(range(start, start + num))
+        start += num
+    industrial = ids['loads'][:num_industrial]
+    renewables = ids['solar'] + ids['wind']
+    jitter = lambda value, num: np.round(value * rng.uniform(0.9, 1.1, num), 4)
+
+    sheets = {}
+    sheets['vertices'] = pd.DataFrame({'vertex_id': np.arange(1, start)})
+    sheets['solar_params'] = pd.DataFrame({'solar_panel_id': ids['solar'], 'cost_building_solarpanel': jitter(400000, num_solar),
+                                           'fixed_cost': 200000, 'max_building_capacity': 5000})
+    sheets['wind_params'] = pd.DataFrame({'wind_turbine_id': ids['wind'], 'cost_building_turbine': jitter(3000000, num_wind),
+                                          'fixed_cost': 6000000, 'max_building_capacity': 100})
+    sheets['electrolyzer_params'] = pd.DataFrame({'electrolyzer_id': ids['electrolyzers'], 'self_discharge_rate_gas_tank': 0.015,
+                                                  'charge_efficiency_gas_tank': 0.7, 'discharge_efficiency_gas_tank': 0.7,
+                                                  'capacity_per_gas_tank': 9, 'cost_per_gas_tank': jitter(20000, num_electrolyzers),
+                                                  'max_charge_gas_tank': 4.5})
+    sheets['tank_params'] = pd.DataFrame({'liquid_tank_id': ids['tanks'], 'self_discharge_rate_liquid_tank': 0.015,
+                                          'charge_efficiency_liquid_tank': 0.75, 'discharge_efficiency_liquid_tank': 0.75,
+                                          'capacity_per_liquid_tank': 4000, 'cost_per_liquid_tank': jitter(800000, num_tanks),
+                                          'max_charge_liquid_tank': 2000})
+    sheets['fuelcell_params'] = pd.DataFrame({'fuel_cell_id': ids['fuelcells']})
+    sheets['electricityloads'] = pd.DataFrame({'electricity_loads_id': ids['loads']})
+    sheets['industrialloads'] = pd.DataFrame({'industrial_loads_id': industrial})
+
+    # Consecutive days of periods_per_day periods
+    num_periods = num_days * periods_per_day
+    periods = np.arange(1, num_periods + 1)
+    sheets['time_params'] = pd.DataFrame({'time_period_id': periods, 'day_of_period': (periods - 1) // periods_per_day + 1})
+    sheets['day_params'] = pd.DataFrame({'day_id': np.arange(1, num_days + 1),
+                                         'start_time_period': np.arange(num_days) * periods_per_day + 1,
+                                         'end_time_period': np.arange(1, num_days + 1) * periods_per_day})
+
+    # Scenarios of solar and wind levels, cycling over the levels of the template
+    levels = [SYNTHETIC_SCENARIOS[s % len(SYNTHETIC_SCENARIOS)] for s in range(num_scenarios)]
+    weights = np.array([weight for _, _, weight in levels])
+    names = [f'{solar} Solar & {wind} Wind' + ('' if s < len(SYNTHETIC_SCENARIOS) else f' {s // len(SYNTHETIC_SCENARIOS) + 1}')
+             for s, (solar, wind, _) in enumerate(levels)]
+    sheets['scenario_params'] = pd.DataFrame({'scenario_id': np.arange(1, num_scenarios + 1),
+                                              'percent_weight': weights / weights.sum(), 'scenario_name': names})
+
+    # Networks with the connections of the template: renewables feed the loads and electrolyzers, fuel cells feed the
+    # loads, electrolyzers feed the industrial areas and tanks, and tanks feed the fuel cells
+    edges = {'electricity': synthetic_edges(renewables, ids['loads'] + ids['electrolyzers'], edge_density, rng)
+                            + synthetic_edges(ids['fuelcells'], ids['loads'], edge_density, rng),
+             'gas': synthetic_edges(ids['electrolyzers'], industrial + ids['tanks'], edge_density, rng)
+                    + synthetic_edges(ids['fuelcells'], industrial, edge_density, rng),
+             'liquid': synthetic_edges(ids['tanks'], ids['fuelcells'], edge_density, rng)}
+    for network, capacity in [('electricity', 500), ('gas', 100000), ('liquid', 500000)]:
+        sheets[f'{network}_edges'] = pd.DataFrame(edges[network], columns=['vertex_from', 'vertex_to']).astype(int)
+        sheets[f'{network}_edges'][f'max_{network}_flow'] = capacity
+
+    # Hour of the day in the middle of each period
+    hour = ((periods - 1) % periods_per_day + 0.5) * 24 / periods_per_day
+
+    # Electricity demand with morning and evening peaks, gas demand with a mild daily cycle
+    shape = 0.55 + 0.25 * np.exp(-((hour - 8) / 2)**2) + 0.45 * np.exp(-((hour - 19) / 3)**2)
+    daily = np.repeat(rng.normal(1, 0.05, (num_loads, num_days)), periods_per_day, axis=1)
+    demand = rng.uniform(12, 23, (num_loads, 1)) * shape / shape.mean() * daily * rng.normal(1, 0.08, (num_loads, num_periods))
+    demand = np.maximum(demand, 0)
+    sheets['electricity_demand'] = pd.DataFrame({'vertex': np.repeat(ids['loads'], num_periods), 'time_period': np.tile(periods, num_loads),
+                                                 'demand': demand.ravel(), 'MWh': demand.ravel() * 24 / periods_per_day})
+    demand = rng.uniform(450, 850, (num_industrial, 1)) * (1 + 0.15 * np.sin(2 * np.pi * (hour - 9) / 24)) * rng.normal(1, 0.05, (num_industrial, num_periods))
+    sheets['gas_demand'] = pd.DataFrame({'vertex': np.repeat(industrial, num_periods), 'time_period': np.tile(periods, num_industrial),
+                                         'demand': np.maximum(demand, 0).ravel()})
+
+    # Solar generation per panel row: daylight bell scaled by the clearness of each day
+    solar_level = np.array([SYNTHETIC_LEVELS[solar] for solar, _, _ in levels])
+    bell = np.maximum(np.sin(np.pi * (hour - 6) / 12), 0)**1.5
+    clearness = np.repeat(rng.beta(5, 2, (num_solar, num_scenarios, num_days)), periods_per_day, axis=2)
+    solar = 1.25 * bell * clearness * solar_level[None,:,None] * rng.normal(1, 0.05, (num_solar, num_scenarios, num_periods))
+    solar = np.clip(solar, 0, 1.25 * SYNTHETIC_LEVELS['High'])
+
+    # Wind generation per turbine: autocorrelated around a mean set by the wind level
+    wind_mean = 2.5 * np.array([SYNTHETIC_LEVELS[wind] for _, wind, _ in levels])[None,:]
+    wind = np.empty((num_wind, num_scenarios, num_periods))
+    wind[:,:,0] = wind_mean
+    noise = rng.normal(0, 0.3, wind.shape)
+    for k in range(1, num_periods):
+        wind[:,:,k] = wind_mean + 0.95 * (wind[:,:,k-1] - wind_mean) + noise[:,:,k]
+    wind = np.clip(wind, 0, 4)
+
+    for sheet, nodes, values in [('solar_generation', ids['solar'], solar), ('wind_generation', ids['wind'], wind)]:
+        node, scenario, period = np.meshgrid(nodes, np.arange(1, num_scenarios + 1), periods, indexing='ij')
+        sheets[sheet] = pd.DataFrame({'vertex': node.ravel(), 'time_period': period.ravel(), 'scenario': scenario.ravel(),
+                                      'generation': values.ravel()})
+
+    sheets['scalar_params'] = pd.DataFrame({'unit_convertion_gas_liquid': [1], 'unit_convertion_electricity_gas': [0.05],
+                                            'efficiency_electrolysis': [0.7], 'efficiency_liquefaction': [1],
+                                            'efficiency_gasification': [0.75], 'max_electricity_loss_load_percentage': [0.00035],
+                                            'max_gas_loss_load_percentage': [0.00035], 'operational_cost_gas_storage': [10],
+                                            'operational_cost_liquid_storage': [0.2]})
+    return {sheet: sheets[sheet] for sheet in INSTANCE_SHEETS}
+
+@dataclass
+class IndexMOPTA():
+    ## Network Index
+    nodeIds  : np.ndarray   # Node id of each node code
+    nodeCode : dict         # Node id -> node code
+    edgeFrom : dict         # Network -> node code where each edge starts
+    edgeTo   : dict         # Network -> node code where each edge ends
+    inPtr    : dict         # Network -> CSR pointers of the edges entering each node code
+    inEdges  : dict         # Network -> edges entering each node code
+    outPtr   : dict         # Network -> CSR pointers of the edges leaving each node code
+    outEdges : dict         # Network -> edges leaving each node code
+
+    ## Time Index
+    periodIds        : np.ndarray   # Period id at each position, in the order of TimePeriods
+    periodPos        : dict         # Period id -> position
+    prevPeriodGas    : np.ndarray   # Position of the previous period, cycling within each day
+    prevPeriodLiquid : np.ndarray   # Position of the previous period, cycling over the whole horizon
+    periodDay        : np.ndarray   # Day id of each period position (-1 if outside every day)
+    periodPosInDay   : np.ndarray   # Position of each period within its day, starting at 1
+    periodOrder      : np.ndarray   # Positions sorting the period ids, to search arrays of periods
+
+    def __init__(self, inst:'InstanceMOPTA'):
+        '''
+        Input:
+            inst - Instance data whose network and time structure is compiled
+        '''
+        # Integer codes of the nodes
+        self.nodeIds  = np.array(list(inst.Nodes))
+        self.nodeCode = {i: c for c, i in enumerate(self.nodeIds)}
+
+        # CSR adjacency of the edges of each network
+        self.edgeFrom, self.edgeTo = {}, {}
+        self.inPtr, self.inEdges, self.outPtr, self.outEdges = {}, {}, {}, {}
+        for network, capacity in [('Electricity', inst.capacityEdgeElectricity), ('Gas', inst.capacityEdgeGas), ('Liquid', inst.capacityEdgeLiquid)]:
+            edges = list(capacity.index)
+            assert all((i in self.nodeCode) and (j in self.nodeCode) for i, j in edges), f"Edges of the {network} network must connect existing vertices."
+            self.edgeFrom[network] = np.array([self.nodeCode[i] for i, j in edges], dtype=int)
+            self.edgeTo[network]   = np.array([self.nodeCode[j] for i, j in edges], dtype=int)
+            self.inPtr[network], self.inEdges[network] = self.__csr(self.edgeTo[network], len(self.nodeIds))
+            self.outPtr[network], self.outEdges[network] = self.__csr(self.edgeFrom[network], len(self.nodeIds))
+
+        # Positions of the periods
+        self.periodIds = np.array(list(inst.TimePeriods))
+        self.periodPos = {t: k for k, t in enumerate(self.periodIds)}
+        assert all((t == self.periodIds.min()) or (t-1 in self.periodPos) for t in self.periodIds), "Time periods must be consecutive."
+
+        # Previous periods of the yearly (liquid) and daily (gas) storage cycles
+        t_first, t_last = self.periodIds.min(), self.periodIds.max()
+        self.prevPeriodLiquid = np.array([self.periodPos[t_last if t == t_first else t-1] for t in self.periodIds], dtype=int)
+        end_of_day = dict(zip(inst.startPeriodOfDay, inst.endPeriodOfDay))
+        self.prevPeriodGas = np.array([self.periodPos[end_of_day[t] if t in end_of_day else t-1] for t in self.periodIds], dtype=int)
+
+        # Day of each period and position within the day
+        starts = inst.startPeriodOfDay.sort_values()
+        k = np.searchsorted(starts.to_numpy(), self.periodIds, side='right') - 1
+        in_day = (k >= 0) & (self.periodIds <= inst.endPeriodOfDay[starts.index[np.maximum(k, 0)]].to_numpy())
+        self.periodDay = np.where(in_day, starts.index[np.maximum(k, 0)], -1)
+        self.periodPosInDay = np.where(in_day, self.periodIds - starts.to_numpy()[np.maximum(k, 0)] + 1, -1)
+        self.periodOrder = np.argsort(self.periodIds)
+
+    @staticmethod
+    def __csr(end:np.ndarray, num_nodes:int):
+        # Edges grouped by the node code at one of their ends
+        ptr = np.zeros(num_nodes + 1, dtype=int)
+        ptr[1:] = np.cumsum(np.bincount(end, minlength=num_nodes))
+        return ptr, np.argsort(end, kind='stable')
+
+    def __edges(self, ptr:dict, edges:dict, network:str, i:int):
+        c = self.nodeCode[i]
+        return edges[network][ptr[network][c]:ptr[network][c+1]]
+
+    def in_nodes(self, network:str, i:int):
+        # Nodes with an edge towards node i
+        return self.nodeIds[self.edgeFrom[network][self.__edges(self.inPtr, self.inEdges, network, i)]]
+
+    def out_nodes(self, network:str, i:int):
+        # Nodes with an edge from node i
+        return self.nodeIds[self.edgeTo[network][self.__edges(self.outPtr, self.outEdges, network, i)]]
+
+    def prev_period_gas(self, t:int):
+        return self.periodIds[self.prevPeriodGas[self.periodPos[t]]]
+
+    def prev_period_liquid(self, t:int):
+        return self.periodIds[self.prevPeriodLiquid[self.periodPos[t]]]
+
+    def day_of_period(self, t:int):
+        day = self.periodDay[self.periodPos[t]]
+        return None if day < 0 else day
+
+    def days_of_periods(self, periods:np.ndarray):
+        '''
+        Input:
+            periods - Array of periods of the instance
+        Output:
+            Arrays with the day of each period and its position within the day (-1 outside of every day)
+        '''
+        positions = self.periodOrder[np.searchsorted(self.periodIds, periods, sorter=self.periodOrder)]
+        return self.periodDay[positions], self.periodPosInDay[positions]
 
 @dataclass
 class InstanceMOPTA():
@@ -105,16 +441,38 @@ class InstanceMOPTA():
     duals_E : pd.DataFrame = pd.DataFrame()
     duals_G : pd.DataFrame = pd.DataFrame()
 
-    def __init__(self, filename:str):
+    ## Compiled Index
+    index : IndexMOPTA = None
+
+    ## Time Aggregation (see aggregate_days)
+    dayWeight   : pd.Series = None    # Representative day -> number of original days it represents
+    dayMedoid   : pd.Series = None    # Representative day -> original day it was taken from
+    daySequence : np.ndarray = None   # Representative day of each original day, in chronological order
+
+    ## Sheets the instance was read from
+    sheets : dict = None
+
+    def __init__(self, filename:str, use_cache:bool=True):
         '''
         Input:
-            filename - Name of the xlsx instance file
+            filename  - Name of the xlsx instance file
+            use_cache - If True, parsed sheets are cached on disk (see read_instance_sheets)
         '''
         # Read file into dictionary of dataframes for each sheet
-        sheets_list = ['vertices', 'solar_params', 'wind_params', 'electrolyzer_params', 'tank_params', 'fuelcell_params',
-            'electricityloads', 'industrialloads', 'time_params', 'day_params', 'scenario_params', 'electricity_edges',
-            'gas_edges', 'liquid_edges', 'electricity_demand', 'gas_demand', 'solar_generation', 'wind_generation', 'scalar_params']
-        dict_pd = pd.read_excel(filename, sheet_name=sheets_list)
+        self.__load_sheets(read_instance_sheets(filename, use_cache))
+
+    @classmethod
+    def from_sheets(cls, sheets:dict):
+        '''
+        Input:
+            sheets - Dictionary of dataframes for each sheet, with the layout of the xlsx instance files
+        '''
+        inst = cls.__new__(cls)
+        inst.__load_sheets(sheets)
+        return inst
+
+    def __load_sheets(self, dict_pd:dict):
+        self.sheets = dict_pd
 
         # Initialise Sets Data
         self.Days        = set(dict_pd['day_params']['day_id'])
@@ -211,20 +569,457 @@ class InstanceMOPTA():
         self.maxLossLoadGas           = df_temp['max_gas_loss_load_percentage'].iloc[0]
         self.costStorageGas           = df_temp['operational_cost_gas_storage'].iloc[0]
         self.costStorageLiquid        = df_temp['operational_cost_liquid_storage'].iloc[0]
-        
+
+        # Compile network and time index
+        self.index = IndexMOPTA(self)
+
+    def period_weights(self):
+        # Number of original periods represented by each period, one unless the instance is aggregated
+        if self.daySequence is None:
+            return {t: 1 for t in self.TimePeriods}
+        return {t: int(self.dayWeight[self.index.day_of_period(t)]) for t in self.TimePeriods}
+
+    def periods_in_day(self, d:int):
+        return self.endPeriodOfDay[d] - self.startPeriodOfDay[d] + 1
+
+    def day_profiles(self):
+        '''
+        Output:
+            Array with one row per day (in chronological order) with its solar, wind and demand profiles,
+            each profile scaled by its largest absolute value over the horizon
+        '''
+        days = list(self.startPeriodOfDay.sort_values().index)
+        lengths = {self.periods_in_day(d) for d in days}
+        assert (len(lengths) == 1), f'Days must have the same number of periods, found {sorted(lengths)}.'
+        periods = np.concatenate([np.arange(self.startPeriodOfDay[d], self.endPeriodOfDay[d] + 1) for d in days])
+
+        features = []
+        for param in [self.generationSolar, self.generationWind, self.demandElectricity, self.demandGas]:
+            # Periods in rows and every other index level in columns
+            frame = param.unstack([level for level in param.index.names if level != 'time_period'])
+            values = frame.reindex(periods).fillna(0).to_numpy(dtype=float)
+            scale = np.abs(values).max(axis=0)
+            features.append(values / np.where(scale > 0, scale, 1))
+        return np.hstack(features).reshape(len(days), -1)
+
+    def aggregate_days(self, num_days:int):
+        '''
+        Input:
+            num_days - Number of representative days
+        Output:
+            Instance over representative days, the medoids of the daily profiles (see day_profiles),
+            with dayWeight, dayMedoid and daySequence linking them to the original days
+        '''
+        assert (self.daySequence is None), f'The instance is already aggregated.'
+        assert (1 <= num_days <= len(self.Days)), f'Number of representative days must be between 1 and {len(self.Days)}.'
+        days = list(self.startPeriodOfDay.sort_values().index)
+        medoids, labels = k_medoids(self.day_profiles(), num_days)
+
+        # Representative days numbered in the chronological order of their medoids
+        order = np.argsort(medoids)
+        medoids = medoids[order]
+        rank = np.empty(num_days, dtype=int)
+        rank[order] = np.arange(num_days)
+        labels = rank[labels]
+
+        # Periods of the representative days, numbered consecutively
+        num_periods = self.periods_in_day(days[0])
+        mapping = {self.startPeriodOfDay[days[m]] + k: r * num_periods + k + 1 for r, m in enumerate(medoids) for k in range(num_periods)}
+        sheets = dict(self.sheets)
+        sheets['day_params'] = pd.DataFrame({'day_id': np.arange(1, num_days + 1),
+                                             'start_time_period': np.arange(num_days) * num_periods + 1,
+                                             'end_time_period': np.arange(1, num_days + 1) * num_periods})
+        sheets['time_params'] = pd.DataFrame({'time_period_id': np.arange(1, num_days * num_periods + 1),
+                                              'day_of_period': np.repeat(np.arange(1, num_days + 1), num_periods)})
+        for sheet in ['electricity_demand', 'gas_demand', 'solar_generation', 'wind_generation']:
+            df = sheets[sheet][sheets[sheet]['time_period'].isin(mapping)].copy()
+            df['time_period'] = df['time_period'].map(mapping)
+            sheets[sheet] = df.reset_index(drop=True)
+
+        inst = InstanceMOPTA.from_sheets(sheets)
+        inst.daySequence = labels + 1
+        inst.dayWeight = pd.Series(np.bincount(labels, minlength=num_days), index=np.arange(1, num_days + 1))
+        inst.dayMedoid = pd.Series([days[m] for m in medoids], index=np.arange(1, num_days + 1))
+        return inst
+
+    def scenario_profiles(self):
+        '''
+        Output:
+            Array with one row per scenario (in the order of Scenarios) with its solar and wind generation,
+            the generation of each plant scaled by its largest value over periods and scenarios
+        '''
+        features = []
+        for param in [self.generationSolar, self.generationWind]:
+            frame = param.unstack('scenario').reindex(columns=list(self.Scenarios)).fillna(0)
+            scale = frame.groupby(level='vertex').transform(lambda x: np.abs(x.to_numpy()).max())
+            features.append((frame / scale.where(scale > 0, 1)).to_numpy(dtype=float))
+        return np.vstack(features).T
+
+    def reduce_scenarios(self, num_scenarios:int, method:str='forward', verbose:bool=False):
+        '''
+        Input:
+            num_scenarios - Number of scenarios to keep
+            method        - 'forward' (fast forward selection) or 'backward' (backward reduction)
+            verbose       - If True, the kept scenarios and the distance of the reduction are printed
+        Output:
+            Instance over the kept scenarios, the weight of every removed scenario is moved to the
+            closest kept one (see scenario_reduction)
+        '''
+        scenarios = list(self.Scenarios)
+        weights = np.array([self.scenarioWeight[s] for s in scenarios], dtype=float)
+        points = self.scenario_profiles()
+        dist = np.sqrt(((points[:,None,:] - points[None,:,:])**2).sum(axis=2))
+        kept, kept_weights, distance = scenario_reduction(dist, weights, num_scenarios, method)
+        if verbose:
+            print(f"Kept scenarios = {[scenarios[k] for k in kept]} | Distance = {distance:g}")
+
+        new_weights = {scenarios[k]: w for k, w in zip(kept, kept_weights)}
+        sheets = dict(self.sheets)
+        df = sheets['scenario_params']
+        df = df[df['scenario_id'].isin(new_weights)].copy()
+        df['percent_weight'] = df['scenario_id'].map(new_weights)
+        sheets['scenario_params'] = df.reset_index(drop=True)
+        for sheet in ['solar_generation', 'wind_generation']:
+            sheets[sheet] = sheets[sheet][sheets[sheet]['scenario'].isin(new_weights)].reset_index(drop=True)
+        return InstanceMOPTA.from_sheets(sheets)
+
+    def to_excel(self, filename:str):
+        # Write the sheets of the instance to an xlsx file that can be read back with InstanceMOPTA
+        with pd.ExcelWriter(filename, engine='xlsxwriter') as writer:
+            for sheet in INSTANCE_SHEETS:
+                self.sheets[sheet].to_excel(writer, sheet_name=sheet, index=False)
+
+    def scenario_subset(self, scenarios:list):
+        '''
+        Shallow copy of the instance restricted to some of its scenarios, parameter data is shared
+        with the original instance and scenario weights are kept as they are
+        '''
+        inst = copy.copy(self)
+        inst.Scenarios = set(scenarios)
+        inst.Scenario_names = self.Scenario_names[self.Scenario_names['scenario_id'].isin(inst.Scenarios)]
+        inst.is_solution_loaded = False
+        inst.optimality_status = 'Not Yet Solved'
+        return inst
+
+    def fingerprint(self):
+        '''
+        Output:
+            Hash of the content of the instance: its sheets, the scenarios and aggregation it is restricted to,
+            and the loss of load limits and investment costs, which the models may change after loading
+        '''
+        digest = hashlib.sha256()
+        for sheet in INSTANCE_SHEETS:
+            df = self.sheets[sheet]
+            digest.update(f'{sheet}:{",".join(map(str, df.columns))}'.encode())
+            digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+        digest.update(str(sorted(self.Scenarios)).encode())
+        if self.daySequence is not None:
+            digest.update(np.asarray(self.daySequence, dtype=np.int64).tobytes())
+        digest.update(f'{float(self.maxLossLoadElectricity)!r},{float(self.maxLossLoadGas)!r}'.encode())
+        for cost in BUILD_COSTS.values():
+            digest.update(pd.util.hash_pandas_object(getattr(self, cost)).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    def solution_fingerprint(self, families:list=None):
+        '''
+        Input:
+            families - Names of the variable families whose values are hashed (default: all)
+        Output:
+            Hash of the solution loaded into the instance and its loss of load duals
+        '''
+        digest = hashlib.sha256(f'{self.is_solution_loaded},{self.optimality_status}'.encode())
+        if self.is_solution_loaded:
+            for name in (SOLUTION_LEVELS if families is None else families):
+                digest.update(name.encode())
+                digest.update(pd.util.hash_pandas_object(getattr(self, name)).to_numpy().tobytes())
+            for duals in [self.duals_E, self.duals_G]:
+                digest.update(pd.util.hash_pandas_object(duals).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    def day_window(self, days:list):
+        '''
+        Input:
+            days - Consecutive days of the instance
+        Output:
+            Instance over the given days, with the original day and period ids
+        '''
+        assert (self.daySequence is None), f'Windows of an aggregated instance are not supported.'
+        periods = set(self.df_day_of_period.index[self.df_day_of_period['day_of_period'].isin(days)])
+        sheets = dict(self.sheets)
+        sheets['day_params'] = sheets['day_params'][sheets['day_params']['day_id'].isin(days)].reset_index(drop=True)
+        sheets['time_params'] = sheets['time_params'][sheets['time_params']['time_period_id'].isin(periods)].reset_index(drop=True)
+        for sheet in ['electricity_demand', 'gas_demand', 'solar_generation', 'wind_generation']:
+            sheets[sheet] = sheets[sheet][sheets[sheet]['time_period'].isin(periods)].reset_index(drop=True)
+        return InstanceMOPTA.from_sheets(sheets)
+
+# Index sets and index names of the solution frames of each variable family
+SOLUTION_LEVELS = {
+    'buildNumSolar'          : [('SolarNodes', 'Solar Plant')],
+    'buildNumWind'           : [('WindNodes', 'Wind Plant')],
+    'buildNumStorageGas'     : [('ElectrolyzerNodes', 'Electrolyzer')],
+    'buildNumStorageLiquid'  : [('TankNodes', 'Hydrogen Tank')],
+    'flowElectricity'        : [('Nodes', 'Node'), ('Nodes', 'Node'), ('TimePeriods', 'Time Period'), ('Scenarios', 'Scenario')],
+    'flowGas'                : [('Nodes', 'Node'), ('Nodes', 'Node'), ('TimePeriods', 'Time Period'), ('Scenarios', 'Scenario')],
+    'flowLiquid'             : [('Nodes', 'Node'), ('Nodes', 'Node'), ('TimePeriods', 'Time Period'), ('Scenarios', 'Scenario')],
+    'lossLoadElectricity'    : [('LoadNodes', 'Load Area'), ('TimePeriods', 'Time Period'), ('Scenarios', 'Scenario')],
+    'lossLoadGas'            : [('IndustrialNodes', 'Industrial Area'), ('TimePeriods', 'Time Period'), ('Scenarios', 'Scenario')],
+    'generationRenewable'    : [('RenewableNodes', 'Renewable Plant'), ('TimePeriods', 'Time Period'), ('Scenarios', 'Scenario')],
+    'spillRenewable'         : [('RenewableNodes', 'Renewable Plant'), ('TimePeriods', 'Time Period'), ('Scenarios', 'Scenario')],
+    'storageGasSoc'          : [('ElectrolyzerNodes', 'Electrolyzer'), ('TimePeriods', 'Time Period'), ('Scenarios', 'Scenario')],
+    'storageGasCharge'       : [('ElectrolyzerNodes', 'Electrolyzer'), ('TimePeriods', 'Time Period'), ('Scenarios', 'Scenario')],
+    'storageGasDischarge'    : [('ElectrolyzerNodes', 'Electrolyzer'), ('TimePeriods', 'Time Period'), ('Scenarios', 'Scenario')],
+    'storageLiquidSoc'       : [('TankNodes', 'Hydrogen Tank'), ('TimePeriods', 'Time Period'), ('Scenarios', 'Scenario')],
+    'storageLiquidCharge'    : [('TankNodes', 'Hydrogen Tank'), ('TimePeriods', 'Time Period'), ('Scenarios', 'Scenario')],
+    'storageLiquidDischarge' : [('TankNodes', 'Hydrogen Tank'), ('TimePeriods', 'Time Period'), ('Scenarios', 'Scenario')],
+}
+
+def k_medoids(points:np.ndarray, k:int, max_iterations:int=100):
+    '''
+    Greedy initialisation (each new medoid reduces the total distance the most) followed by
+    alternating assignment and medoid updates
+    Input:
+        points - Array with one point per row
+        k      - Number of clusters
+    Output:
+        Positions of the medoids and cluster of each point
+    '''
+    dist = np.sqrt(((points[:,None,:] - points[None,:,:])**2).sum(axis=2))
+    medoids = [int(np.argmin(dist.sum(axis=1)))]
+    while len(medoids) < k:
+        closest = dist[:, medoids].min(axis=1)
+        gain = np.maximum(closest[:,None] - dist, 0).sum(axis=0)
+        gain[medoids] = -1
+        medoids.append(int(np.argmax(gain)))
+
+    for _ in range(max_iterations):
+        labels = np.argmin(dist[:, medoids], axis=1)
+        new_medoids = []
+        for c in range(k):
+            members = np.flatnonzero(labels == c)
+            new_medoids.append(int(members[np.argmin(dist[np.ix_(members, members)].sum(axis=1))]))
+        if new_medoids == medoids:
+            break
+        medoids = new_medoids
+    return np.array(medoids), np.argmin(dist[:, medoids], axis=1)
+
+def scenario_reduction(dist:np.ndarray, weights:np.ndarray, num_kept:int, method:str='forward'):
+    '''
+    Scenario reduction of Heitsch and Römisch, which minimises the Kantorovich distance between the
+    original and the reduced distributions
+    Input:
+        dist     - Distance between each pair of scenarios
+        weights  - Weight of each scenario
+        num_kept - Number of scenarios to keep
+        method   - 'forward' (fast forward selection) or 'backward' (simultaneous backward reduction)
+    Output:
+        Positions of the kept scenarios, their redistributed weights and the Kantorovich distance
+    '''
+    assert (method in ['forward', 'backward']), f"Method '{method}' must be 'forward' or 'backward'."
+    num = len(weights)
+    assert (1 <= num_kept <= num), f'Number of kept scenarios must be between 1 and {num}.'
+    kept = np.zeros(num, dtype=bool)
+
+    if method == 'forward':
+        # Add the scenario that brings the others closest to the kept set
+        closest = np.full(num, np.inf)
+        for _ in range(num_kept):
+            cost = (weights[:,None] * np.minimum(closest[:,None], dist)).sum(axis=0)
+            cost[kept] = np.inf
+            u = int(np.argmin(cost))
+            kept[u] = True
+            closest = np.minimum(closest, dist[:,u])
+    else:
+        # Remove the scenario whose removal moves the fewest weight the least
+        kept[:] = True
+        for _ in range(num - num_kept):
+            cost = np.full(num, np.inf)
+            for l in np.flatnonzero(kept):
+                kept[l] = False
+                removed = ~kept
+                cost[l] = (weights[removed] * dist[np.ix_(removed, kept)].min(axis=1)).sum()
+                kept[l] = True
+            kept[int(np.argmin(cost))] = False
+
+    # Each removed scenario gives its weight to the closest kept one
+    positions = np.flatnonzero(kept)
+    nearest = positions[np.argmin(dist[:, positions], axis=1)]
+    new_weights = np.bincount(nearest, weights=weights, minlength=num)[positions]
+    distance = float((weights * dist[np.arange(num), nearest]).sum())
+    return positions, new_weights, distance
+
+def solution_index(inst:InstanceMOPTA, name:str):
+    # Index of the solution frame of a variable family
+    levels = [list(getattr(inst, attr)) for attr, _ in SOLUTION_LEVELS[name]]
+    names = [level_name for _, level_name in SOLUTION_LEVELS[name]]
+    if len(levels) == 1:
+        return pd.Index(levels[0], name=names[0])
+    return pd.MultiIndex.from_product(levels, names=names)
+
+def status_name(status:int):
+    # Optimality status of the instance from a Gurobi status code
+    if (status == GRB.OPTIMAL):
+        return 'Optimal'
+    elif (status == GRB.INFEASIBLE):
+        return 'Infeasible'
+    elif (status == GRB.UNBOUNDED):
+        return 'Unbounded'
+    return f'Termination Status {status}'
+
+def solution_frame(inst:InstanceMOPTA, name:str, values:np.ndarray, sparse:bool, index:pd.Index=None):
+    '''
+    Input:
+        values - Values of the variable family, in the creation order of the variables
+        sparse - If True, flow values are only given for the edges of the network
+        index  - Index of the frame (default: solution_index(inst, name))
+    '''
+    values = np.asarray(values, dtype=float)
+    if sparse and name.startswith('flow'):
+        # Pairs of nodes without an edge carry no flow, as in the dense formulation
+        network = name[len('flow'):]
+        nN, nT, nS = len(inst.index.nodeIds), len(inst.TimePeriods), len(inst.Scenarios)
+        arc = inst.index.edgeFrom[network] * nN + inst.index.edgeTo[network]
+        dense = np.zeros(nN * nN * nT * nS)
+        dense[(arc[:,None] * (nT * nS) + np.arange(nT * nS)[None,:]).ravel()] = values
+        values = dense
+    return pd.DataFrame(values, index=solution_index(inst, name) if index is None else index, columns=[name])
+
+# First stage decisions and their investment cost parameters
+BUILD_FAMILIES = ['buildNumSolar', 'buildNumWind', 'buildNumStorageGas', 'buildNumStorageLiquid']
+BUILD_COSTS = {'buildNumSolar': 'costBuildSolar', 'buildNumWind': 'costBuildWind',
+               'buildNumStorageGas': 'costBuildStorageGas', 'buildNumStorageLiquid': 'costBuildStorageLiquid'}
+
+# Environment variable with the name of a JSONL file, telemetry records are appended to it when set
+TELEMETRY_LOG_ENV = 'MOPTA_TELEMETRY_LOG'
+
+def peak_rss_mb():
+    # Peak resident memory of the process, ru_maxrss is in bytes on macOS and in kilobytes elsewhere (unknown on Windows)
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2**20 if sys.platform == 'darwin' else 2**10)
+
+def log_telemetry(record:dict, filename:str=None):
+    '''
+    Input:
+        record   - Telemetry record, see ModelMOPTA.telemetry
+        filename - JSONL file the record is appended to (default: the file named by TELEMETRY_LOG_ENV, if set)
+    '''
+    filename = filename or os.environ.get(TELEMETRY_LOG_ENV)
+    if filename:
+        # A single write per line, so that records of parallel workers do not interleave
+        with open(filename, 'a') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+
+def driver_telemetry(driver:str, start:float, rows:pd.DataFrame, model:'ModelMOPTA'=None, **params):
+    '''
+    Input:
+        driver - Name of the driver of the run
+        start  - time.perf_counter() at the start of the run
+        rows   - Results of the run, runtime columns are summed
+        model  - Model of the run, its telemetry is part of the record
+        params - Parameters of the run
+    Output:
+        Telemetry record of the run, also appended to the telemetry log
+    '''
+    record = {'kind': 'driver', 'driver': driver, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'params': params,
+              'wall_time': time.perf_counter() - start, 'points': len(rows),
+              'runtimes': {column: float(rows[column].sum()) for column in rows.columns if column.startswith('runtime')},
+              'peak_rss_mb': peak_rss_mb()}
+    # Models without telemetry (e.g. the decompositions) only give the record of the driver
+    if (model is not None) and hasattr(model, 'telemetry'):
+        record['model'] = model.telemetry()
+    log_telemetry(record)
+    return record
+
 class ModelMOPTA(gp.Model):
-    def __init__(self, instance:InstanceMOPTA, **kwds):
+    def __init__(self, instance:InstanceMOPTA, sparse:bool=False, vectorized:bool=False, **kwds):
+        '''
+        Input:
+            instance   - Instance data of the problem
+            sparse     - If True, flow variables are only created for the edges of the network
+                         instead of every pair of nodes
+            vectorized - If True, constraints and objective are assembled as sparse matrices
+                         and added in bulk with the matrix API
+        '''
         super().__init__(**kwds)
         self.__inst = instance
+        self.__sparse = sparse
+        self.__vectorized = vectorized
+        self.__solution_indices = {}
+        self.__lpBasis = None
+        # Investment costs of the instance, cost scenarios are always applied on top of these
+        self.__baseBuildCosts = {name: getattr(instance, cost).copy() for name, cost in BUILD_COSTS.items()}
+        # Original periods represented by each period of an aggregated instance
+        self.__periodWeight = instance.period_weights()
+        # Total demands of the loss of load constraints, the limits are fractions of these
+        self.__totalDemandElectricity = sum(self.periodWeight[t] * instance.demandElectricity[i,t] for i in instance.LoadNodes for t in instance.TimePeriods)
+        self.__totalDemandGas = sum(self.periodWeight[t] * instance.demandGas[i,t] for i in instance.IndustrialNodes for t in instance.TimePeriods)
+        # Seconds spent on each part of the construction (see buildTimes) and (first row, number of rows)
+        # of the blocks of each constraint family, constraints are only added by addConstrs and addMConstr
+        self.__buildTimes = {}
+        self.__numRows = 0
+        self.__familyRows = {}
+        self.__familyStats = None
+        # Measures of the last solve and of the other phases of the run (see telemetry)
+        self.__runId = uuid.uuid4().hex
+        self.__phases = {}
+        start = time.perf_counter()
         self.__build_variables()
-        self.__build_constraints()
-        self.__build_objective()
+        self.__buildTimes['variables'] = time.perf_counter() - start
+        if self.vectorized:
+            self.__build_matrix_model()
+        else:
+            self.__build_constraints()
+            start = time.perf_counter()
+            self.__build_objective()
+            self.__buildTimes['objective'] = time.perf_counter() - start
+        start = time.perf_counter()
         self.update()
+        self.__buildTimes['update'] = time.perf_counter() - start
     
     @property
     def inst(self):
         return self.__inst
+    @property
+    def sparse(self):
+        return self.__sparse
+    @property
+    def vectorized(self):
+        return self.__vectorized
+    @property
+    def options(self):
+        # Arguments of create_model that build the same model
+        return {'backend': 'gurobi', 'sparse': self.sparse, 'vectorized': self.vectorized}
+    @property
+    def buildTimes(self):
+        # Seconds spent building the variables, each constraint family and the objective
+        return self.__buildTimes
+    @property
+    def periodWeight(self):
+        return self.__periodWeight
+    @property
+    def totalDemandElectricity(self):
+        return self.__totalDemandElectricity
+    @property
+    def totalDemandGas(self):
+        return self.__totalDemandGas
+    @property
+    def CmaxLossLoadElectricity(self):
+        return self.__CmaxLossLoadElectricity
+    @property
+    def CmaxLossLoadGas(self):
+        return self.__CmaxLossLoadGas
+    @property
+    def CstorageLiquidUpdate(self):
+        return self.__CstorageLiquidUpdate
     
+    def in_nodes(self, network:str, i:int):
+        # Nodes with a flow variable towards node i
+        return self.inst.index.in_nodes(network, i) if self.sparse else self.inst.index.nodeIds
+
+    def out_nodes(self, network:str, i:int):
+        # Nodes with a flow variable from node i
+        return self.inst.index.out_nodes(network, i) if self.sparse else self.inst.index.nodeIds
+
     @property
     def buildNumSolar(self):
         return self.__buildNumSolar
@@ -276,6 +1071,15 @@ class ModelMOPTA(gp.Model):
     @property
     def storageLiquidDischarge(self):
         return self.__storageLiquidDischarge
+    @property
+    def storageLiquidInter(self):
+        return self.__storageLiquidInter
+    @property
+    def storageLiquidIntraMax(self):
+        return self.__storageLiquidIntraMax
+    @property
+    def storageLiquidIntraMin(self):
+        return self.__storageLiquidIntraMin
 
     def __build_variables(self):
         # First Stage Decisions      
@@ -285,9 +1089,15 @@ class ModelMOPTA(gp.Model):
         self.__buildNumStorageLiquid = self.addVars(self.inst.TankNodes, vtype=GRB.INTEGER, name="buildNumStorageLiquid")
         
         # Flow Decisions
-        self.__flowElectricity = self.addVars(self.inst.Nodes, self.inst.Nodes, self.inst.TimePeriods, self.inst.Scenarios, vtype=GRB.CONTINUOUS, name="flowElectricity")
-        self.__flowGas         = self.addVars(self.inst.Nodes, self.inst.Nodes, self.inst.TimePeriods, self.inst.Scenarios, vtype=GRB.CONTINUOUS, name="flowGas")
-        self.__flowLiquid      = self.addVars(self.inst.Nodes, self.inst.Nodes, self.inst.TimePeriods, self.inst.Scenarios, vtype=GRB.CONTINUOUS, name="flowLiquid")
+        if self.sparse:
+            # Only the edges of each network can carry flow
+            self.__flowElectricity = self.addVars(list(self.inst.capacityEdgeElectricity.index), self.inst.TimePeriods, self.inst.Scenarios, vtype=GRB.CONTINUOUS, name="flowElectricity")
+            self.__flowGas         = self.addVars(list(self.inst.capacityEdgeGas.index), self.inst.TimePeriods, self.inst.Scenarios, vtype=GRB.CONTINUOUS, name="flowGas")
+            self.__flowLiquid      = self.addVars(list(self.inst.capacityEdgeLiquid.index), self.inst.TimePeriods, self.inst.Scenarios, vtype=GRB.CONTINUOUS, name="flowLiquid")
+        else:
+            self.__flowElectricity = self.addVars(self.inst.Nodes, self.inst.Nodes, self.inst.TimePeriods, self.inst.Scenarios, vtype=GRB.CONTINUOUS, name="flowElectricity")
+            self.__flowGas         = self.addVars(self.inst.Nodes, self.inst.Nodes, self.inst.TimePeriods, self.inst.Scenarios, vtype=GRB.CONTINUOUS, name="flowGas")
+            self.__flowLiquid      = self.addVars(self.inst.Nodes, self.inst.Nodes, self.inst.TimePeriods, self.inst.Scenarios, vtype=GRB.CONTINUOUS, name="flowLiquid")
 
         self.__lossLoadElectricity = self.addVars(self.inst.LoadNodes, self.inst.TimePeriods, self.inst.Scenarios, vtype=GRB.CONTINUOUS, name="lossLoadElectricity")
         self.__lossLoadGas         = self.addVars(self.inst.IndustrialNodes, self.inst.TimePeriods, self.inst.Scenarios, vtype=GRB.CONTINUOUS, name="lossLoadGas")
@@ -301,10 +1111,34 @@ class ModelMOPTA(gp.Model):
         self.__storageGasCharge    = self.addVars(self.inst.ElectrolyzerNodes, self.inst.TimePeriods, self.inst.Scenarios, vtype=GRB.CONTINUOUS, name="storageGasCharge")
         self.__storageGasDischarge = self.addVars(self.inst.ElectrolyzerNodes, self.inst.TimePeriods, self.inst.Scenarios, vtype=GRB.CONTINUOUS, name="storageGasDischarge")
 
-        self.__storageLiquidSoc       = self.addVars(self.inst.TankNodes, self.inst.TimePeriods, self.inst.Scenarios, vtype=GRB.CONTINUOUS, name="storageLiquidSoc")
+        # Over representative days the liquid state of charge is relative to the start of the day
+        soc_lb = 0 if self.inst.daySequence is None else -GRB.INFINITY
+        self.__storageLiquidSoc       = self.addVars(self.inst.TankNodes, self.inst.TimePeriods, self.inst.Scenarios, lb=soc_lb, vtype=GRB.CONTINUOUS, name="storageLiquidSoc")
         self.__storageLiquidCharge    = self.addVars(self.inst.TankNodes, self.inst.TimePeriods, self.inst.Scenarios, vtype=GRB.CONTINUOUS, name="storageLiquidCharge")
         self.__storageLiquidDischarge = self.addVars(self.inst.TankNodes, self.inst.TimePeriods, self.inst.Scenarios, vtype=GRB.CONTINUOUS, name="storageLiquidDischarge")
 
+        # Time Aggregation Decisions, state of charge at the start of each original day and
+        # range of the relative state of charge within each representative day
+        self.__storageLiquidInter = self.__storageLiquidIntraMax = self.__storageLiquidIntraMin = None
+        if self.inst.daySequence is not None:
+            original_days = range(1, len(self.inst.daySequence) + 1)
+            self.__storageLiquidInter    = self.addVars(self.inst.TankNodes, original_days, self.inst.Scenarios, vtype=GRB.CONTINUOUS, name="storageLiquidInter")
+            self.__storageLiquidIntraMax = self.addVars(self.inst.TankNodes, self.inst.Days, self.inst.Scenarios, lb=-GRB.INFINITY, vtype=GRB.CONTINUOUS, name="storageLiquidIntraMax")
+            self.__storageLiquidIntraMin = self.addVars(self.inst.TankNodes, self.inst.Days, self.inst.Scenarios, lb=-GRB.INFINITY, vtype=GRB.CONTINUOUS, name="storageLiquidIntraMin")
+
+    def addConstrs(self, generator, name:str=''):
+        # Constraint families are timed as they are built
+        start = time.perf_counter()
+        constrs = super().addConstrs(generator, name=name)
+        self.__buildTimes[name] = self.__buildTimes.get(name, 0.0) + time.perf_counter() - start
+        self.__add_family_rows(name, len(constrs))
+        return constrs
+
+    def __add_family_rows(self, name:str, num_rows:int):
+        # New rows are appended after the existing ones
+        self.__familyRows.setdefault(name, []).append((self.__numRows, num_rows))
+        self.__numRows += num_rows
+
     def __build_constraints(self):
         # First Stage Constraints
         self.addConstrs((cons_build_solar_bound(self, i) for i in self.inst.SolarNodes), name="CbuildSolarBound")
@@ -322,10 +1156,19 @@ class ModelMOPTA(gp.Model):
         self.addConstrs((cons_flow_balance_fuelcells(self, i, t, s) for i in self.inst.FuelCellNodes for t in self.inst.TimePeriods for s in self.inst.Scenarios), name="CflowBalanceFuelCells")
         
         # Battery Constraints
-        self.addConstrs((cons_soc_update_storage_liquid(self, i, t, s) for i in self.inst.TankNodes for t in self.inst.TimePeriods for s in self.inst.Scenarios), name="CstorageLiquidUpdate")
+        self.__CstorageLiquidUpdate = self.addConstrs((cons_soc_update_storage_liquid(self, i, t, s) for i in self.inst.TankNodes for t in self.inst.TimePeriods for s in self.inst.Scenarios), name="CstorageLiquidUpdate")
         self.addConstrs((cons_soc_update_storage_gas(self, i, t, s) for i in self.inst.ElectrolyzerNodes for t in self.inst.TimePeriods for s in self.inst.Scenarios), name="CstorageGasUpdate")
 
-        self.addConstrs((cons_max_capacity_storage_liquid(self, i, t, s) for i in self.inst.TankNodes for t in self.inst.TimePeriods for s in self.inst.Scenarios), name="CmaxStorageLiquid")
+        if self.inst.daySequence is None:
+            self.addConstrs((cons_max_capacity_storage_liquid(self, i, t, s) for i in self.inst.TankNodes for t in self.inst.TimePeriods for s in self.inst.Scenarios), name="CmaxStorageLiquid")
+        else:
+            # Representative days linked over the sequence of original days
+            original_days = range(1, len(self.inst.daySequence) + 1)
+            self.addConstrs((cons_storage_liquid_inter_update(self, i, n, s) for i in self.inst.TankNodes for n in original_days for s in self.inst.Scenarios), name="CstorageLiquidInterUpdate")
+            self.addConstrs((cons_storage_liquid_intra_max(self, i, t, s) for i in self.inst.TankNodes for t in self.inst.TimePeriods for s in self.inst.Scenarios), name="CstorageLiquidIntraMax")
+            self.addConstrs((cons_storage_liquid_intra_min(self, i, t, s) for i in self.inst.TankNodes for t in self.inst.TimePeriods for s in self.inst.Scenarios), name="CstorageLiquidIntraMin")
+            self.addConstrs((cons_max_capacity_storage_liquid_inter(self, i, n, s) for i in self.inst.TankNodes for n in original_days for s in self.inst.Scenarios), name="CmaxStorageLiquid")
+            self.addConstrs((cons_min_storage_liquid_inter(self, i, n, s) for i in self.inst.TankNodes for n in original_days for s in self.inst.Scenarios), name="CminStorageLiquid")
         self.addConstrs((cons_max_capacity_storage_gas(self, i, t, s) for i in self.inst.ElectrolyzerNodes for t in self.inst.TimePeriods for s in self.inst.Scenarios), name="CmaxStorageGas")
 
         self.addConstrs((cons_max_liquid_charge_bound(self, i, t, s) for i in self.inst.TankNodes for t in self.inst.TimePeriods for s in self.inst.Scenarios), name="CmaxChargeLiquid")
@@ -334,99 +1177,280 @@ class ModelMOPTA(gp.Model):
         self.addConstrs((cons_max_gas_discharge_bound(self, i, t, s) for i in self.inst.ElectrolyzerNodes for t in self.inst.TimePeriods for s in self.inst.Scenarios), name="CmaxDischargeGas")
 
         # Loss of Load Contraints
-        self.addConstrs((cons_max_loss_load_electricity(self, s) for s in self.inst.Scenarios), name="CmaxLossLoadElectricity")
-        self.addConstrs((cons_max_loss_load_gas(self, s) for s in self.inst.Scenarios), name="CmaxLossLoadGas")
+        self.__CmaxLossLoadElectricity = self.addConstrs((cons_max_loss_load_electricity(self, s) for s in self.inst.Scenarios), name="CmaxLossLoadElectricity")
+        self.__CmaxLossLoadGas = self.addConstrs((cons_max_loss_load_gas(self, s) for s in self.inst.Scenarios), name="CmaxLossLoadGas")
 
         # Bound Contraints
-        self.addConstrs((cons_max_flow_electricity(self, i, j, t, s) for i in self.inst.Nodes for j in self.inst.Nodes for t in self.inst.TimePeriods for s in self.inst.Scenarios), name="CmaxFlowElectricity")
-        self.addConstrs((cons_max_flow_gas(self, i, j, t, s) for i in self.inst.Nodes for j in self.inst.Nodes for t in self.inst.TimePeriods for s in self.inst.Scenarios), name="CmaxFlowGas")
-        self.addConstrs((cons_max_flow_liquid(self, i, j, t, s) for i in self.inst.Nodes for j in self.inst.Nodes for t in self.inst.TimePeriods for s in self.inst.Scenarios), name="CmaxFlowLiquid")
+        if self.sparse:
+            self.addConstrs((cons_max_flow_electricity(self, i, j, t, s) for (i,j) in self.inst.capacityEdgeElectricity.index for t in self.inst.TimePeriods for s in self.inst.Scenarios), name="CmaxFlowElectricity")
+            self.addConstrs((cons_max_flow_gas(self, i, j, t, s) for (i,j) in self.inst.capacityEdgeGas.index for t in self.inst.TimePeriods for s in self.inst.Scenarios), name="CmaxFlowGas")
+            self.addConstrs((cons_max_flow_liquid(self, i, j, t, s) for (i,j) in self.inst.capacityEdgeLiquid.index for t in self.inst.TimePeriods for s in self.inst.Scenarios), name="CmaxFlowLiquid")
+        else:
+            self.addConstrs((cons_max_flow_electricity(self, i, j, t, s) for i in self.inst.Nodes for j in self.inst.Nodes for t in self.inst.TimePeriods for s in self.inst.Scenarios), name="CmaxFlowElectricity")
+            self.addConstrs((cons_max_flow_gas(self, i, j, t, s) for i in self.inst.Nodes for j in self.inst.Nodes for t in self.inst.TimePeriods for s in self.inst.Scenarios), name="CmaxFlowGas")
+            self.addConstrs((cons_max_flow_liquid(self, i, j, t, s) for i in self.inst.Nodes for j in self.inst.Nodes for t in self.inst.TimePeriods for s in self.inst.Scenarios), name="CmaxFlowLiquid")
 
     def __build_objective(self):
         self.setObjective(obj_cost(self), GRB.MINIMIZE)
 
-    def load_solution_inst(self):
+    def __build_matrix_model(self):
+        start = time.perf_counter()
+        formulation = build_matrix_formulation(self.inst, self.sparse)
+        # Columns of the formulation follow the creation order of the variables
+        x = gp.MVar.fromlist([var for name in formulation.columns for var in getattr(self, name).values()])
+        self.__buildTimes['formulation'] = time.perf_counter() - start
+        for name, levels, A, sense, rhs in formulation.blocks:
+            start = time.perf_counter()
+            constrs = self.addMConstr(A, x, sense, rhs)
+            keys = list(index_keys(levels))
+            self.setAttr('ConstrName', constrs.tolist(), [f"{name}[{','.join(map(str, key))}]" for key in keys])
+            # Same handles as the ones returned by addConstrs
+            if name == 'CmaxLossLoadElectricity':
+                self.__CmaxLossLoadElectricity = gp.tupledict(zip([key[0] for key in keys], constrs.tolist()))
+            elif name == 'CmaxLossLoadGas':
+                self.__CmaxLossLoadGas = gp.tupledict(zip([key[0] for key in keys], constrs.tolist()))
+            elif name == 'CstorageLiquidUpdate':
+                self.__CstorageLiquidUpdate = gp.tupledict(zip(keys, constrs.tolist()))
+            self.__buildTimes[name] = time.perf_counter() - start
+            self.__add_family_rows(name, A.shape[0])
+        start = time.perf_counter()
+        self.setObjective(formulation.obj @ x, GRB.MINIMIZE)
+        self.__buildTimes['objective'] = time.perf_counter() - start
+
+    def optimize(self, callback=None, phase_times:bool=None):
+        '''
+        Optimize the model, recording the measures of the solve (see telemetry)
+        Input:
+            callback    - Gurobi callback, called as usual
+            phase_times - If True, presolve and root node times of MIP solves are recorded with a
+                          callback (default: only when the telemetry log of TELEMETRY_LOG_ENV is set)
+        '''
+        if phase_times is None:
+            phase_times = bool(os.environ.get(TELEMETRY_LOG_ENV))
+        times = {}
+        def phase_callback(model, where):
+            # Presolve ends with the first simplex, barrier or MIP callback, the root ends with the first explored node
+            if where not in [GRB.Callback.POLLING, GRB.Callback.PRESOLVE, GRB.Callback.MESSAGE]:
+                times.setdefault('presolve_time', model.cbGet(GRB.Callback.RUNTIME))
+            if (where == GRB.Callback.MIP) and ('root_time' not in times) and (model.cbGet(GRB.Callback.MIP_NODCNT) > 0):
+                times['root_time'] = model.cbGet(GRB.Callback.RUNTIME)
+            if callback is not None:
+                callback(model, where)
+
+        start = time.perf_counter()
+        # Without phase times the callback is the caller's one, so that sweeps do not pay for a Python
+        # callback on every event. Continuous models have no root node and are never timed by phase
+        super().optimize(phase_callback if (phase_times and self.IsMIP) else callback)
+        solve = {'wall_time': time.perf_counter() - start, 'status': status_name(self.Status), 'Runtime': self.Runtime,
+                 'IterCount': self.IterCount, 'BarIterCount': self.BarIterCount, **times}
+        if self.IsMIP:
+            solve['NodeCount'] = self.NodeCount
+            solve['MIPGap'] = self.MIPGap if self.SolCount > 0 else None
+            if 'root_time' in times:
+                solve['branch_and_bound_time'] = self.Runtime - times['root_time']
+        solve['solves'] = self.__phases.get('optimize', {}).get('solves', 0) + 1
+        self.__phases['optimize'] = solve
+        if os.environ.get(TELEMETRY_LOG_ENV):
+            log_telemetry(self.telemetry())
+
+    def family_stats(self):
+        '''
+        Output:
+            Dictionary with the number of rows, columns used and nonzeros of each constraint family
+        '''
+        if (self.__familyStats is None) or (sum(stats['rows'] for stats in self.__familyStats.values()) != self.__numRows):
+            self.update()
+            A = self.getA().tocsr()
+            self.__familyStats = {}
+            for name, blocks in self.__familyRows.items():
+                # Rows of a block are contiguous, so are their entries in the CSR arrays
+                bounds = [(A.indptr[first], A.indptr[first + num_rows]) for first, num_rows in blocks]
+                self.__familyStats[name] = {'rows': sum(num_rows for _, num_rows in blocks),
+                                            'cols': int(np.unique(np.concatenate([A.indices[a:b] for a, b in bounds])).size),
+                                            'nonzeros': int(sum(b - a for a, b in bounds))}
+        return self.__familyStats
+
+    def telemetry(self):
+        '''
+        Output:
+            Record of the run of the model: sizes, construction time, rows, columns and nonzeros of each
+            constraint family, measures of the last solve and of the other phases, and peak memory
+        '''
+        stats = self.family_stats()
+        return {'kind': 'model', 'run_id': self.__runId, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'model': {'class': type(self).__name__, 'sparse': self.sparse, 'vectorized': self.vectorized,
+                          'vars': self.NumVars, 'constrs': self.NumConstrs, 'nonzeros': self.NumNZs},
+                'construction': {name: value for name, value in self.buildTimes.items() if name not in stats},
+                'families': {name: {'time': self.buildTimes.get(name), **stats[name]} for name in stats},
+                'phases': copy.deepcopy(self.__phases), 'peak_rss_mb': peak_rss_mb()}
+
+    def load_solution_inst(self, families:list=None):
+        '''
+        Input:
+            families - Names of the variable families to load into the instance (default: all)
+        '''
+        start = time.perf_counter()
         # Update solution loaded and optimality status parameters
-        if (self.Status == GRB.OPTIMAL):
-            self.inst.optimality_status = 'Optimal'
-        elif (self.Status == GRB.INFEASIBLE):
-            self.inst.optimality_status = 'Infeasible'
-        elif (self.Status == GRB.UNBOUNDED):
-            self.inst.optimality_status = 'Unbounded'
-        else:
-            self.inst.optimality_status = f'Termination Status {self.Status}'
+        self.inst.optimality_status = status_name(self.Status)
         
         assert (hasattr(self.buildNumSolar[list(self.inst.SolarNodes)[0]], 'X')), f'Solutions do not exist, the model must be solved to optimality before.'
         self.inst.is_solution_loaded = True
 
-        self.inst.buildNumSolar = pd.DataFrame.from_dict({index: var.X for index, var in self.buildNumSolar.items()}, orient='index', columns=['buildNumSolar'])
-        self.inst.buildNumSolar.index.name = 'Solar Plant'
-        self.inst.buildNumWind = pd.DataFrame.from_dict({index: var.X for index, var in self.buildNumWind.items()}, orient='index', columns=['buildNumWind'])
-        self.inst.buildNumWind.index.name = 'Wind Plant'
-        self.inst.buildNumStorageGas = pd.DataFrame.from_dict({index: var.X for index, var in self.buildNumStorageGas.items()}, orient='index', columns=['buildNumStorageGas'])
-        self.inst.buildNumStorageGas.index.name = 'Electrolyzer'
-        self.inst.buildNumStorageLiquid = pd.DataFrame.from_dict({index: var.X for index, var in self.buildNumStorageLiquid.items()}, orient='index', columns=['buildNumStorageLiquid'])
-        self.inst.buildNumStorageLiquid.index.name = 'Hydrogen Tank'
-
-        self.inst.flowElectricity = pd.DataFrame.from_dict({index: var.X for index, var in self.flowElectricity.items()}, orient='index', columns=['flowElectricity'])
-        self.inst.flowElectricity.index = pd.MultiIndex.from_tuples(self.inst.flowElectricity.index, names=('Node', 'Node', 'Time Period', 'Scenario')) # Set MultiIndex
-        self.inst.flowGas = pd.DataFrame.from_dict({index: var.X for index, var in self.flowGas.items()}, orient='index', columns=['flowGas'])
-        self.inst.flowGas.index = pd.MultiIndex.from_tuples(self.inst.flowGas.index, names=('Node', 'Node', 'Time Period', 'Scenario')) # Set MultiIndex 
-        self.inst.flowLiquid = pd.DataFrame.from_dict({index: var.X for index, var in self.flowLiquid.items()}, orient='index', columns=['flowLiquid'])
-        self.inst.flowLiquid.index = pd.MultiIndex.from_tuples(self.inst.flowLiquid.index, names=('Node', 'Node', 'Time Period', 'Scenario')) # Set MultiIndex 
-        self.inst.lossLoadElectricity = pd.DataFrame.from_dict({index: var.X for index, var in self.lossLoadElectricity.items()}, orient='index', columns=['lossLoadElectricity'])
-        self.inst.lossLoadElectricity.index = pd.MultiIndex.from_tuples(self.inst.lossLoadElectricity.index, names=('Load Area', 'Time Period', 'Scenario')) # Set MultiIndex 
-        self.inst.lossLoadGas = pd.DataFrame.from_dict({index: var.X for index, var in self.lossLoadGas.items()}, orient='index', columns=['lossLoadGas'])
-        self.inst.lossLoadGas.index = pd.MultiIndex.from_tuples(self.inst.lossLoadGas.index, names=('Industrial Area', 'Time Period', 'Scenario')) # Set MultiIndex 
-
-        self.inst.generationRenewable = pd.DataFrame.from_dict({index: var.X for index, var in self.generationRenewable.items()}, orient='index', columns=['generationRenewable'])
-        self.inst.generationRenewable.index = pd.MultiIndex.from_tuples(self.inst.generationRenewable.index, names=('Renewable Plant', 'Time Period', 'Scenario')) # Set MultiIndex 
-        self.inst.spillRenewable = pd.DataFrame.from_dict({index: var.X for index, var in self.spillRenewable.items()}, orient='index', columns=['spillRenewable'])
-        self.inst.spillRenewable.index = pd.MultiIndex.from_tuples(self.inst.spillRenewable.index, names=('Renewable Plant', 'Time Period', 'Scenario')) # Set MultiIndex 
-        
-        self.inst.storageGasSoc = pd.DataFrame.from_dict({index: var.X for index, var in self.storageGasSoc.items()}, orient='index', columns=['storageGasSoc'])
-        self.inst.storageGasSoc.index = pd.MultiIndex.from_tuples(self.inst.storageGasSoc.index, names=('Electrolyzer', 'Time Period', 'Scenario')) # Set MultiIndex 
-        self.inst.storageGasCharge = pd.DataFrame.from_dict({index: var.X for index, var in self.storageGasCharge.items()}, orient='index', columns=['storageGasCharge'])
-        self.inst.storageGasCharge.index = pd.MultiIndex.from_tuples(self.inst.storageGasCharge.index, names=('Electrolyzer', 'Time Period', 'Scenario')) # Set MultiIndex 
-        self.inst.storageGasDischarge = pd.DataFrame.from_dict({index: var.X for index, var in self.storageGasDischarge.items()}, orient='index', columns=['storageGasDischarge'])
-        self.inst.storageGasDischarge.index = pd.MultiIndex.from_tuples(self.inst.storageGasDischarge.index, names=('Electrolyzer', 'Time Period', 'Scenario')) # Set MultiIndex 
-        self.inst.storageLiquidSoc = pd.DataFrame.from_dict({index: var.X for index, var in self.storageLiquidSoc.items()}, orient='index', columns=['storageLiquidSoc'])
-        self.inst.storageLiquidSoc.index = pd.MultiIndex.from_tuples(self.inst.storageLiquidSoc.index, names=('Hydrogen Tank', 'Time Period', 'Scenario')) # Set MultiIndex 
-        self.inst.storageLiquidCharge = pd.DataFrame.from_dict({index: var.X for index, var in self.storageLiquidCharge.items()}, orient='index', columns=['storageLiquidCharge'])
-        self.inst.storageLiquidCharge.index = pd.MultiIndex.from_tuples(self.inst.storageLiquidCharge.index, names=('Hydrogen Tank', 'Time Period', 'Scenario')) # Set MultiIndex 
-        self.inst.storageLiquidDischarge = pd.DataFrame.from_dict({index: var.X for index, var in self.storageLiquidDischarge.items()}, orient='index', columns=['storageLiquidDischarge'])
-        self.inst.storageLiquidDischarge.index = pd.MultiIndex.from_tuples(self.inst.storageLiquidDischarge.index, names=('Hydrogen Tank', 'Time Period', 'Scenario')) # Set MultiIndex 
-
-    def update_loss_load_params(self, ll_perc_E:float, ll_perc_G:float):
-        # Remove constraints where the loss of load parameters appear
-        for s in self.inst.Scenarios:
-            self.remove(self.getConstrByName(f"CmaxLossLoadElectricity[{s}]"))
-            self.remove(self.getConstrByName(f"CmaxLossLoadGas[{s}]"))
+        for name in (SOLUTION_LEVELS if families is None else families):
+            setattr(self.inst, name, self.__solution_frame(name))
+        self.__phases['load_solution_inst'] = {'wall_time': time.perf_counter() - start}
+
+    def __solution_frame(self, name:str):
+        # Values of the whole variable family in a single call
+        values = self.getAttr('X', list(getattr(self, name).values()))
+        return solution_frame(self.inst, name, values, self.sparse, self.__solution_index(name))
+
+    def __solution_index(self, name:str):
+        # Index of the solution frames, built once per model
+        if name not in self.__solution_indices:
+            self.__solution_indices[name] = solution_index(self.inst, name)
+        return self.__solution_indices[name]
+
+    def get_build_values(self):
+        # Build decisions of the current solution
+        return {name: self.getAttr('X', list(getattr(self, name).values())) for name in BUILD_FAMILIES}
+
+    def set_build_start(self, values:dict):
+        # MIP start on the build decisions, the rest of the start is completed by Gurobi
+        for name in BUILD_FAMILIES:
+            self.setAttr('Start', list(getattr(self, name).values()), values[name])
+
+    def fix_build(self, values:dict=None):
+        # Fix the build decisions to the given values, or release them if None. Values are rounded,
+        # solution values such as 2.9999999 of the integer variables would make the bounds infeasible
+        for name in BUILD_FAMILIES:
+            build = list(getattr(self, name).values())
+            self.setAttr('LB', build, [0.0] * len(build) if values is None else np.round(values[name]).tolist())
+            self.setAttr('UB', build, [GRB.INFINITY] * len(build) if values is None else np.round(values[name]).tolist())
         self.update()
 
+    def fixed_lp(self, warm_start:bool=False):
+        '''
+        Fixed continuous model of the current solution (see gurobipy Model.fixed)
+        Input:
+            warm_start - If True, the final basis of the previous fixed model is used as starting basis
+        '''
+        start = time.perf_counter()
+        LPmodel = self.fixed()
+        self.__phases['fixed_lp'] = {'wall_time': time.perf_counter() - start}
+        if warm_start and (self.__lpBasis is not None):
+            vbasis, cbasis = self.__lpBasis
+            if (len(vbasis) == LPmodel.NumVars) and (len(cbasis) == LPmodel.NumConstrs):
+                LPmodel.setAttr('VBasis', LPmodel.getVars(), vbasis)
+                LPmodel.setAttr('CBasis', LPmodel.getConstrs(), cbasis)
+                # Only bounds and right-hand sides change between solves, the basis stays dual feasible
+                LPmodel.Params.Method = 1
+        return LPmodel
+
+    def save_lp_basis(self, LPmodel:gp.Model):
+        # Keep the final basis of a fixed model to warm start the next one
+        try:
+            self.__lpBasis = (LPmodel.getAttr('VBasis', LPmodel.getVars()), LPmodel.getAttr('CBasis', LPmodel.getConstrs()))
+        except gp.GurobiError:
+            self.__lpBasis = None
+
+    def update_loss_load_params(self, ll_perc_E:float, ll_perc_G:float):
         # Update the loss of load parameters
         self.inst.maxLossLoadElectricity = ll_perc_E
         self.inst.maxLossLoadGas = ll_perc_G
-        
-        # Add the loss of load constraints again
-        self.addConstrs((cons_max_loss_load_electricity(self, s) for s in self.inst.Scenarios), name="CmaxLossLoadElectricity")
-        self.addConstrs((cons_max_loss_load_gas(self, s) for s in self.inst.Scenarios), name="CmaxLossLoadGas")
+
+        # Only the right-hand sides of the loss of load constraints change
+        constrs = list(self.CmaxLossLoadElectricity.values()) + list(self.CmaxLossLoadGas.values())
+        rhs = [ll_perc_E * self.totalDemandElectricity] * len(self.CmaxLossLoadElectricity) \
+            + [ll_perc_G * self.totalDemandGas] * len(self.CmaxLossLoadGas)
+        self.setAttr('RHS', constrs, rhs)
         self.update()
+
+    def fix_initial_storage_liquid(self, soc:dict=None):
+        '''
+        Replace the cyclic condition of the liquid storages by an initial state of charge at the first period
+        Input:
+            soc - Dictionary of the initial state of charge for each tank and scenario, if None it is left free
+        '''
+        assert (self.inst.daySequence is None), f'The initial state of charge of an aggregated instance is always zero.'
+        t_first = self.inst.index.periodIds.min()
+        t_prev = self.inst.index.prev_period_liquid(t_first)
+        for i in self.inst.TankNodes:
+            for s in self.inst.Scenarios:
+                c = self.CstorageLiquidUpdate[i,t_first,s]
+                for var in [self.storageLiquidSoc[i,t_prev,s], self.storageLiquidCharge[i,t_prev,s], self.storageLiquidDischarge[i,t_prev,s]]:
+                    self.chgCoeff(c, var, 0)
+                self.chgCoeff(c, self.storageLiquidSoc[i,t_first,s], 0 if soc is None else 1)
+                c.RHS = 0 if soc is None else soc[i,s]
+        self.update()
+
+    def bound_final_storage_liquid(self, soc:dict):
+        '''
+        State of charge of the liquid storages after the last period at least at a given level
+        Input:
+            soc - Dictionary of the minimum final state of charge for each tank and scenario
+        '''
+        t_last = self.inst.index.periodIds.max()
+        self.addConstrs((storage_liquid_next_soc(self, i, t_last, s) >= soc[i,s] for i in self.inst.TankNodes for s in self.inst.Scenarios), name="CfinalStorageLiquid")
+        self.update()
+
+    def fixed_values(self, LPmodel:gp.Model, name:str):
+        # Values of a variable family in a solved fixed model of this model
+        LPvars = LPmodel.getVars()
+        return np.array(LPmodel.getAttr('X', [LPvars[var.index] for var in getattr(self, name).values()]))
+
+    def loss_load_duals(self, LPmodel:gp.Model):
+        '''
+        Input:
+            LPmodel - Solved fixed model of this model, its constraints are in the same order
+        Output:
+            Dictionaries of the loss of load duals of electricity and gas for each scenario
+        '''
+        LPconstrs = LPmodel.getConstrs()
+        duals = []
+        for constrs in [self.CmaxLossLoadElectricity, self.CmaxLossLoadGas]:
+            pi = LPmodel.getAttr('Pi', [LPconstrs[c.index] for c in constrs.values()])
+            duals.append(dict(zip(constrs.keys(), pi)))
+        return duals[0], duals[1]
     
-    def update_investment_costs(self, wind_cost_perc:float, pv_cost_perc:float, h2_tank_cost_perc:float, h2_intraday_cost_perc:float):
-        # Update the cost parameters
-        self.inst.costBuildWind = self.inst.costBuildWind * (1 + wind_cost_perc)
-        self.inst.costBuildSolar = self.inst.costBuildSolar * (1 + pv_cost_perc)
-        self.inst.costBuildStorageLiquid = self.inst.costBuildStorageLiquid * (1 + h2_tank_cost_perc)
-        self.inst.costBuildStorageGas = self.inst.costBuildStorageGas * (1 + h2_intraday_cost_perc)
+    def set_investment_cost_multipliers(self, wind_cost_perc:float, pv_cost_perc:float, h2_tank_cost_perc:float, h2_intraday_cost_perc:float):
+        '''
+        Set the investment costs to the base costs of the instance times (1 + perc), the objective
+        coefficients of the build decisions are changed in place
+        Input:
+            wind_cost_perc        - Relative change of the cost of a wind turbine
+            pv_cost_perc          - Relative change of the cost of a solar panel
+            h2_tank_cost_perc     - Relative change of the cost of a liquid hydrogen tank
+            h2_intraday_cost_perc - Relative change of the cost of a gas hydrogen storage
+        '''
+        percs = {'buildNumSolar': pv_cost_perc, 'buildNumWind': wind_cost_perc,
+                 'buildNumStorageGas': h2_intraday_cost_perc, 'buildNumStorageLiquid': h2_tank_cost_perc}
+        variables, coefficients = [], []
+        for name in BUILD_FAMILIES:
+            cost = self.__baseBuildCosts[name] * (1 + percs[name])
+            setattr(self.inst, BUILD_COSTS[name], cost)
+            build = getattr(self, name)
+            variables += list(build.values())
+            coefficients += [cost[i] for i in build.keys()]
+        self.setAttr('Obj', variables, coefficients)
+        self.update()
 
-        # Reset Objective
-        self.setObjective(obj_cost(self), GRB.MINIMIZE)
+    def update_investment_costs(self, wind_cost_perc:float, pv_cost_perc:float, h2_tank_cost_perc:float, h2_intraday_cost_perc:float):
+        # Costs are relative to the base costs of the instance, repeated calls do not compound
+        self.set_investment_cost_multipliers(wind_cost_perc, pv_cost_perc, h2_tank_cost_perc, h2_intraday_cost_perc)
 
 #------------------------------------------------------------------------------
 # Auxiliary Functions to Define Constraints
 #------------------------------------------------------------------------------
 
+def flow_in(m:ModelMOPTA, network:str, i:int, t:int, s:int):
+    flow = getattr(m, f'flow{network}')
+    return gp.quicksum(flow[j,i,t,s] for j in m.in_nodes(network, i))
+
+def flow_out(m:ModelMOPTA, network:str, i:int, t:int, s:int):
+    flow = getattr(m, f'flow{network}')
+    return gp.quicksum(flow[i,j,t,s] for j in m.out_nodes(network, i))
+
 def cons_build_solar_bound(m:ModelMOPTA, i:int):
     return m.buildNumSolar[i] <= m.inst.capacitySolar[i]
 
@@ -434,13 +1458,13 @@ def cons_build_wind_bound(m:ModelMOPTA, i:int):
     return m.buildNumWind[i] <= m.inst.capacityWind[i]
 
 def cons_flow_balance_loads(m:ModelMOPTA, i:int, t:int, s:int):
-    inflow = sum(m.flowElectricity[j,i,t,s] for j in m.inst.Nodes) + m.lossLoadElectricity[i,t,s] 
-    outflow = sum(m.flowElectricity[i,j,t,s] for j in m.inst.Nodes) + m.inst.demandElectricity[i,t]
+    inflow = flow_in(m, 'Electricity', i, t, s) + m.lossLoadElectricity[i,t,s] 
+    outflow = flow_out(m, 'Electricity', i, t, s) + m.inst.demandElectricity[i,t]
     return inflow == outflow
 
 def cons_flow_balance_renewables(m:ModelMOPTA, i:int, t:int, s:int):
-    inflow = sum(m.flowElectricity[j,i,t,s] for j in m.inst.Nodes) + m.generationRenewable[i,t,s] 
-    outflow = sum(m.flowElectricity[i,j,t,s] for j in m.inst.Nodes) + m.spillRenewable[i,t,s]
+    inflow = flow_in(m, 'Electricity', i, t, s) + m.generationRenewable[i,t,s] 
+    outflow = flow_out(m, 'Electricity', i, t, s) + m.spillRenewable[i,t,s]
     return inflow == outflow
 
 def cons_renewable_generation_def(m:ModelMOPTA, i:int, t:int, s:int):
@@ -453,51 +1477,82 @@ def cons_renewable_generation_def(m:ModelMOPTA, i:int, t:int, s:int):
     return m.generationRenewable[i,t,s] == rhs
 
 def cons_flow_balance_gas_loads(m:ModelMOPTA, i:int, t:int, s:int):
-    inflow = sum(m.flowGas[j,i,t,s] for j in m.inst.Nodes) + m.lossLoadGas[i,t,s] 
-    outflow = sum(m.flowGas[i,j,t,s] for j in m.inst.Nodes) + m.inst.demandGas[i,t]
+    inflow = flow_in(m, 'Gas', i, t, s) + m.lossLoadGas[i,t,s] 
+    outflow = flow_out(m, 'Gas', i, t, s) + m.inst.demandGas[i,t]
     return inflow == outflow
 
 def cons_flow_balance_electrolyzers(m:ModelMOPTA, i:int, t:int, s:int):
-    electflow = sum(m.flowElectricity[j,i,t,s] for j in m.inst.Nodes)
-    gasflow = m.inst.conversionElectricityGas * m.inst.efficiencyElectrolysis * (sum(m.flowGas[i,j,t,s] for j in m.inst.Nodes) + m.storageGasCharge[i,t,s] - m.storageGasDischarge[i,t,s])
+    electflow = flow_in(m, 'Electricity', i, t, s)
+    gasflow = m.inst.conversionElectricityGas * m.inst.efficiencyElectrolysis * (flow_out(m, 'Gas', i, t, s) + m.storageGasCharge[i,t,s] - m.storageGasDischarge[i,t,s])
     return electflow == gasflow
 
 def cons_flow_balance_tanks(m:ModelMOPTA, i:int, t:int, s:int):
-    inflow = sum(m.flowGas[j,i,t,s] for j in m.inst.Nodes)
-    outflow = m.inst.conversionGasLiquid * m.inst.efficiencyLiquefaction * (sum(m.flowLiquid[i,j,t,s] for j in m.inst.Nodes) + m.storageLiquidCharge[i,t,s] - m.storageLiquidDischarge[i,t,s])
+    inflow = flow_in(m, 'Gas', i, t, s)
+    outflow = m.inst.conversionGasLiquid * m.inst.efficiencyLiquefaction * (flow_out(m, 'Liquid', i, t, s) + m.storageLiquidCharge[i,t,s] - m.storageLiquidDischarge[i,t,s])
     return inflow == outflow
 
 def cons_flow_balance_fuelcells(m:ModelMOPTA, i:int, t:int, s:int):
-    inflow = m.inst.efficiencyGasification * (sum(m.flowGas[j,i,t,s] for j in m.inst.Nodes) + m.inst.conversionGasLiquid * sum(m.flowLiquid[j,i,t,s] for j in m.inst.Nodes))
-    outflow = sum(m.flowGas[i,j,t,s] for j in m.inst.Nodes) + sum(m.flowElectricity[i,j,t,s] for j in m.inst.Nodes)/m.inst.conversionElectricityGas
+    inflow = m.inst.efficiencyGasification * (flow_in(m, 'Gas', i, t, s) + m.inst.conversionGasLiquid * flow_in(m, 'Liquid', i, t, s))
+    outflow = flow_out(m, 'Gas', i, t, s) + flow_out(m, 'Electricity', i, t, s)/m.inst.conversionElectricityGas
     return inflow == outflow
 
+def storage_liquid_next_soc(m:ModelMOPTA, i:int, t:int, s:int):
+    # State of charge of a liquid storage at the start of the period after t
+    charged = m.inst.effChargingStorageLiquid[i] * m.storageLiquidCharge[i,t,s]
+    discharged = 1/m.inst.effDischargingStorageLiquid[i] * m.storageLiquidDischarge[i,t,s]
+    return (1 - m.inst.selfDischargeStorageLiquid[i]) * m.storageLiquidSoc[i,t,s] + charged - discharged
+
 def cons_soc_update_storage_liquid(m:ModelMOPTA, i:int, t:int, s:int):
-    if t == min(m.inst.TimePeriods):
-        t_final = max(m.inst.TimePeriods)
-        charged = m.inst.effChargingStorageLiquid[i] * m.storageLiquidCharge[i,t_final,s]
-        discharged = 1/m.inst.effDischargingStorageLiquid[i] * m.storageLiquidDischarge[i,t_final,s]
-        return m.storageLiquidSoc[i,t,s] == (1 - m.inst.selfDischargeStorageLiquid[i]) * m.storageLiquidSoc[i,t_final,s] + charged - discharged
+    if m.inst.daySequence is not None:
+        # Over representative days the state of charge is relative to the start of the day
+        if m.inst.index.periodPosInDay[m.inst.index.periodPos[t]] == 1:
+            return m.storageLiquidSoc[i,t,s] == 0
+        t_prev = m.inst.index.prev_period_gas(t)
     else:
-        charged = m.inst.effChargingStorageLiquid[i] * m.storageLiquidCharge[i,t-1,s]
-        discharged = 1/m.inst.effDischargingStorageLiquid[i] * m.storageLiquidDischarge[i,t-1,s]
-        return m.storageLiquidSoc[i,t,s] == (1 - m.inst.selfDischargeStorageLiquid[i]) * m.storageLiquidSoc[i,t-1,s] + charged - discharged
+        # The first period follows the last one of the horizon
+        t_prev = m.inst.index.prev_period_liquid(t)
+    return m.storageLiquidSoc[i,t,s] == storage_liquid_next_soc(m, i, t_prev, s)
 
 def cons_soc_update_storage_gas(m:ModelMOPTA, i:int, t:int, s:int):
-    for d in m.inst.Days:
-        if t == m.inst.startPeriodOfDay[d]:
-            t_final = m.inst.endPeriodOfDay[d]
-            charged = m.inst.effChargingStorageGas[i] * m.storageGasCharge[i,t_final,s]
-            discharged = 1/m.inst.effDischargingStorageGas[i] * m.storageGasDischarge[i,t_final,s]
-            return m.storageGasSoc[i,t,s] == (1 - m.inst.selfDischargeStorageGas[i]) * m.storageGasSoc[i,t_final,s] + charged - discharged
-    
-    charged = m.inst.effChargingStorageGas[i] * m.storageGasCharge[i,t-1,s]
-    discharged = 1/m.inst.effDischargingStorageGas[i] * m.storageGasDischarge[i,t-1,s]
-    return m.storageGasSoc[i,t,s] == (1 - m.inst.selfDischargeStorageGas[i]) * m.storageGasSoc[i,t-1,s] + charged - discharged
+    # The first period of a day follows the last one of the same day
+    t_prev = m.inst.index.prev_period_gas(t)
+    charged = m.inst.effChargingStorageGas[i] * m.storageGasCharge[i,t_prev,s]
+    discharged = 1/m.inst.effDischargingStorageGas[i] * m.storageGasDischarge[i,t_prev,s]
+    return m.storageGasSoc[i,t,s] == (1 - m.inst.selfDischargeStorageGas[i]) * m.storageGasSoc[i,t_prev,s] + charged - discharged
 
 def cons_max_capacity_storage_liquid(m:ModelMOPTA, i:int, t:int, s:int):
     return m.storageLiquidSoc[i,t,s] <= m.inst.capacityTank[i] * m.buildNumStorageLiquid[i]
 
+def storage_liquid_day_change(m:ModelMOPTA, i:int, d:int, s:int):
+    # Relative state of charge at the start of the day after the representative day d
+    t_last = m.inst.endPeriodOfDay[d]
+    charged = m.inst.effChargingStorageLiquid[i] * m.storageLiquidCharge[i,t_last,s]
+    discharged = 1/m.inst.effDischargingStorageLiquid[i] * m.storageLiquidDischarge[i,t_last,s]
+    return (1 - m.inst.selfDischargeStorageLiquid[i]) * m.storageLiquidSoc[i,t_last,s] + charged - discharged
+
+def cons_storage_liquid_inter_update(m:ModelMOPTA, i:int, n:int, s:int):
+    # The first original day follows the last one
+    d = m.inst.daySequence[n-1]
+    n_next = n % len(m.inst.daySequence) + 1
+    decay = (1 - m.inst.selfDischargeStorageLiquid[i])**m.inst.periods_in_day(d)
+    return m.storageLiquidInter[i,n_next,s] == decay * m.storageLiquidInter[i,n,s] + storage_liquid_day_change(m, i, d, s)
+
+def cons_storage_liquid_intra_max(m:ModelMOPTA, i:int, t:int, s:int):
+    return m.storageLiquidSoc[i,t,s] <= m.storageLiquidIntraMax[i,m.inst.index.day_of_period(t),s]
+
+def cons_storage_liquid_intra_min(m:ModelMOPTA, i:int, t:int, s:int):
+    return m.storageLiquidSoc[i,t,s] >= m.storageLiquidIntraMin[i,m.inst.index.day_of_period(t),s]
+
+def cons_max_capacity_storage_liquid_inter(m:ModelMOPTA, i:int, n:int, s:int):
+    # Self-discharge only lowers the state of the start of the day, so the bound is conservative
+    d = m.inst.daySequence[n-1]
+    return m.storageLiquidInter[i,n,s] + m.storageLiquidIntraMax[i,d,s] <= m.inst.capacityTank[i] * m.buildNumStorageLiquid[i]
+
+def cons_min_storage_liquid_inter(m:ModelMOPTA, i:int, n:int, s:int):
+    d = m.inst.daySequence[n-1]
+    decay = (1 - m.inst.selfDischargeStorageLiquid[i])**(m.inst.periods_in_day(d) - 1)
+    return decay * m.storageLiquidInter[i,n,s] + m.storageLiquidIntraMin[i,d,s] >= 0
+
 def cons_max_capacity_storage_gas(m:ModelMOPTA, i:int, t:int, s:int):
     return m.storageGasSoc[i,t,s] <= m.inst.capacityElectrolyzer[i] * m.buildNumStorageGas[i]
 
@@ -514,12 +1569,12 @@ def cons_max_liquid_discharge_bound(m:ModelMOPTA, i:int, t:int, s:int):
     return m.storageLiquidDischarge[i,t,s] <= m.inst.maxChargeTank[i] * m.buildNumStorageLiquid[i]
 
 def cons_max_loss_load_electricity(m:ModelMOPTA, s:int):
-    rhs = m.inst.maxLossLoadElectricity * sum(m.inst.demandElectricity[i,t] for i in m.inst.LoadNodes for t in m.inst.TimePeriods)
-    return sum(m.lossLoadElectricity[i,t,s] for i in m.inst.LoadNodes for t in m.inst.TimePeriods) <= rhs
+    rhs = m.inst.maxLossLoadElectricity * m.totalDemandElectricity
+    return gp.quicksum(m.periodWeight[t] * m.lossLoadElectricity[i,t,s] for i in m.inst.LoadNodes for t in m.inst.TimePeriods) <= rhs
 
 def cons_max_loss_load_gas(m:ModelMOPTA, s:int):
-    rhs = m.inst.maxLossLoadGas * sum(m.inst.demandGas[i,t] for i in m.inst.IndustrialNodes for t in m.inst.TimePeriods)
-    return sum(m.lossLoadGas[i,t,s] for i in m.inst.IndustrialNodes for t in m.inst.TimePeriods) <= rhs
+    rhs = m.inst.maxLossLoadGas * m.totalDemandGas
+    return gp.quicksum(m.periodWeight[t] * m.lossLoadGas[i,t,s] for i in m.inst.IndustrialNodes for t in m.inst.TimePeriods) <= rhs
 
 def cons_max_flow_electricity(m:ModelMOPTA, i:int, j:int, t:int, s:int):
     if (i,j) in m.inst.capacityEdgeElectricity.index:
@@ -548,11 +1603,1378 @@ def obj_cost(m:ModelMOPTA):
     cost_build_storage_liquid = sum(m.inst.costBuildStorageLiquid[i]*m.buildNumStorageLiquid[i] for i in m.inst.TankNodes)
 
     # Operational Costs
-    cost_storage_gas = sum(m.inst.scenarioWeight[s] * (sum(m.inst.costStorageGas*m.storageGasSoc[i,t,s] for i in m.inst.ElectrolyzerNodes for t in m.inst.TimePeriods)) for s in m.inst.Scenarios)
-    cost_storage_liquid = sum(m.inst.scenarioWeight[s] * (sum(m.inst.costStorageLiquid*m.storageLiquidSoc[i,t,s] for i in m.inst.TankNodes for t in m.inst.TimePeriods)) for s in m.inst.Scenarios)
+    cost_storage_gas = sum(m.inst.scenarioWeight[s] * (sum(m.inst.costStorageGas*m.periodWeight[t]*m.storageGasSoc[i,t,s] for i in m.inst.ElectrolyzerNodes for t in m.inst.TimePeriods)) for s in m.inst.Scenarios)
+    cost_storage_liquid = sum(m.inst.scenarioWeight[s] * (sum(m.inst.costStorageLiquid*m.periodWeight[t]*m.storageLiquidSoc[i,t,s] for i in m.inst.TankNodes for t in m.inst.TimePeriods)) for s in m.inst.Scenarios)
+    if m.inst.daySequence is not None:
+        # State of charge of each original period is the decayed state at the start of its day plus the relative one
+        cost_storage_liquid += sum(m.inst.scenarioWeight[s] * m.inst.costStorageLiquid * m.storageLiquidInter[i,n,s]
+                                   * sum((1 - m.inst.selfDischargeStorageLiquid[i])**k for k in range(m.inst.periods_in_day(d)))
+                                   for i in m.inst.TankNodes for n, d in enumerate(m.inst.daySequence, start=1) for s in m.inst.Scenarios)
     
     return cost_build_solar + cost_build_wind + cost_build_storage_gas + cost_build_storage_liquid + cost_storage_gas + cost_storage_liquid
 
+#------------------------------------------------------------------------------
+# Auxiliary Functions to Build the Model in Matrix Form
+#------------------------------------------------------------------------------
+
+@dataclass
+class MatrixFormulationMOPTA():
+    # Variable family -> (first column, index sets), in the creation order of ModelMOPTA
+    columns : dict
+    # Columns with integrality restrictions
+    integer : np.ndarray
+    # Objective coefficients
+    obj     : np.ndarray
+    # Constraint families as (name, index sets, A, sense, rhs), in the order of ModelMOPTA
+    blocks  : list
+
+    @property
+    def num_columns(self):
+        return len(self.obj)
+
+def index_keys(levels:list):
+    '''
+    Keys of the product of index sets, with tuple elements (edges) flattened as in gurobipy
+    '''
+    for key in itertools.product(*levels):
+        yield tuple(k for part in key for k in (part if isinstance(part, tuple) else (part,)))
+
+def param_array(param:pd.Series, *levels):
+    '''
+    Dense array of a parameter over the product of the index sets levels
+    '''
+    index = levels[0] if len(levels) == 1 else pd.MultiIndex.from_product(levels)
+    values = param.reindex(index).to_numpy(dtype=float)
+    assert not np.isnan(values).any(), f"Parameter '{param.name}' is missing values for some of its indices."
+    return values.reshape([len(level) for level in levels])
+
+def build_matrix_formulation(inst:InstanceMOPTA, sparse:bool=False):
+    '''
+    Input:
+        inst   - Instance data of the problem
+        sparse - If True, flow columns are only created for the edges of the network
+    Output:
+        MatrixFormulationMOPTA with the same variables, constraints and objective as ModelMOPTA
+    '''
+    assert (inst.daySequence is None), f'Instances over representative days are only supported by the expression builder of ModelMOPTA.'
+    T, S = list(inst.TimePeriods), list(inst.Scenarios)
+    nT, nS = len(T), len(S)
+    Nodes = list(inst.Nodes)
+    SolarNodes, WindNodes, RenewableNodes = list(inst.SolarNodes), list(inst.WindNodes), list(inst.RenewableNodes)
+    ElectrolyzerNodes, TankNodes, FuelCellNodes = list(inst.ElectrolyzerNodes), list(inst.TankNodes), list(inst.FuelCellNodes)
+    LoadNodes, IndustrialNodes = list(inst.LoadNodes), list(inst.IndustrialNodes)
+
+    index = inst.index
+    nN = len(index.nodeIds)
+
+    # Pairs of nodes with a flow variable in each network, and their node codes
+    capacityEdge = {'Electricity': inst.capacityEdgeElectricity, 'Gas': inst.capacityEdgeGas, 'Liquid': inst.capacityEdgeLiquid}
+    if sparse:
+        arcs = {network: list(capacity.index) for network, capacity in capacityEdge.items()}
+        arc_from, arc_to = index.edgeFrom, index.edgeTo
+    else:
+        arcs = {network: list(itertools.product(Nodes, Nodes)) for network in capacityEdge}
+        arc_from = {network: np.repeat(np.arange(nN), nN) for network in capacityEdge}
+        arc_to = {network: np.tile(np.arange(nN), nN) for network in capacityEdge}
+
+    # Columns
+    columns, num_columns = {}, 0
+    for name, first_set, periodic in [('buildNumSolar', SolarNodes, False), ('buildNumWind', WindNodes, False),
+                                      ('buildNumStorageGas', ElectrolyzerNodes, False), ('buildNumStorageLiquid', TankNodes, False),
+                                      ('flowElectricity', arcs['Electricity'], True), ('flowGas', arcs['Gas'], True),
+                                      ('flowLiquid', arcs['Liquid'], True),
+                                      ('lossLoadElectricity', LoadNodes, True), ('lossLoadGas', IndustrialNodes, True),
+                                      ('generationRenewable', RenewableNodes, True), ('spillRenewable', RenewableNodes, True),
+                                      ('storageGasSoc', ElectrolyzerNodes, True), ('storageGasCharge', ElectrolyzerNodes, True),
+                                      ('storageGasDischarge', ElectrolyzerNodes, True),
+                                      ('storageLiquidSoc', TankNodes, True), ('storageLiquidCharge', TankNodes, True),
+                                      ('storageLiquidDischarge', TankNodes, True)]:
+        columns[name] = (num_columns, [first_set, T, S] if periodic else [first_set])
+        num_columns += len(first_set) * (nT * nS if periodic else 1)
+
+    integer = np.zeros(num_columns, dtype=bool)
+    for name in ['buildNumSolar', 'buildNumWind', 'buildNumStorageGas', 'buildNumStorageLiquid']:
+        integer[columns[name][0]:columns[name][0] + len(columns[name][1][0])] = True
+
+    t_idx = np.arange(nT)[None,:,None]
+    s_idx = np.arange(nS)[None,None,:]
+    def term(name:str, row_pos, col_pos, coef=1.0, t_map=None):
+        # Coefficients of column name[col_pos, t_map[t], s] in row [row_pos, t, s], for all periods and scenarios
+        row_pos, col_pos = np.asarray(row_pos, dtype=int)[:,None,None], np.asarray(col_pos, dtype=int)[:,None,None]
+        offset, levels = columns[name]
+        rows = (row_pos * nT + t_idx) * nS + s_idx
+        if len(levels) == 1:
+            cols = offset + col_pos + 0 * rows
+        else:
+            col_t = t_idx if t_map is None else t_map[t_idx]
+            cols = offset + (col_pos * nT + col_t) * nS + s_idx
+        coef = np.asarray(coef, dtype=float)
+        if coef.ndim == 1:
+            coef = coef[:,None,None]
+        return rows.ravel(), cols.ravel(), np.broadcast_to(coef, rows.shape).ravel()
+
+    def flow_term(network:str, nodes:list, direction:str, coef:float):
+        # Flows entering ('in') or leaving ('out') each of the nodes
+        pos = np.full(nN, -1)
+        pos[[index.nodeCode[i] for i in nodes]] = np.arange(len(nodes))
+        end = pos[arc_to[network] if direction == 'in' else arc_from[network]]
+        arc_pos = np.flatnonzero(end >= 0)
+        return term(f'flow{network}', end[arc_pos], arc_pos, coef)
+
+    def own(name:str, nodes:list, coef=1.0, t_map=None):
+        # Columns indexed by the same node as the row
+        return term(name, np.arange(len(nodes)), np.arange(len(nodes)), coef, t_map)
+
+    blocks = []
+    def add_block(name:str, levels:list, terms:list, sense:str, rhs=0.0):
+        num_rows = int(np.prod([len(level) for level in levels]))
+        rows, cols, vals = (np.concatenate(part) for part in zip(*terms))
+        A = sp.csr_matrix((vals, (rows, cols)), shape=(num_rows, num_columns))
+        A.eliminate_zeros()
+        blocks.append((name, levels, A, sense, np.broadcast_to(np.asarray(rhs, dtype=float), num_rows).copy()))
+
+    def build_term(name:str, nodes:list, coef):
+        # Columns of first stage decisions in rows indexed by nodes only
+        return np.arange(len(nodes)), columns[name][0] + np.arange(len(nodes)), np.broadcast_to(np.asarray(coef, dtype=float), len(nodes))
+
+    # First Stage Constraints
+    add_block("CbuildSolarBound", [SolarNodes], [build_term('buildNumSolar', SolarNodes, 1.0)], GRB.LESS_EQUAL, param_array(inst.capacitySolar, SolarNodes))
+    add_block("CbuildWindBound", [WindNodes], [build_term('buildNumWind', WindNodes, 1.0)], GRB.LESS_EQUAL, param_array(inst.capacityWind, WindNodes))
+
+    # Flow Balance Constraints
+    demandElectricity = np.repeat(param_array(inst.demandElectricity, LoadNodes, T)[:,:,None], nS, axis=2)
+    add_block("CflowBalanceLoads", [LoadNodes, T, S],
+              [flow_term('Electricity', LoadNodes, 'in', 1.0), own('lossLoadElectricity', LoadNodes),
+               flow_term('Electricity', LoadNodes, 'out', -1.0)], GRB.EQUAL, demandElectricity.ravel())
+    demandGas = np.repeat(param_array(inst.demandGas, IndustrialNodes, T)[:,:,None], nS, axis=2)
+    add_block("CflowBalanceGasLoads", [IndustrialNodes, T, S],
+              [flow_term('Gas', IndustrialNodes, 'in', 1.0), own('lossLoadGas', IndustrialNodes),
+               flow_term('Gas', IndustrialNodes, 'out', -1.0)], GRB.EQUAL, demandGas.ravel())
+
+    add_block("CflowBalanceRenewables", [RenewableNodes, T, S],
+              [flow_term('Electricity', RenewableNodes, 'in', 1.0), own('generationRenewable', RenewableNodes),
+               flow_term('Electricity', RenewableNodes, 'out', -1.0), own('spillRenewable', RenewableNodes, -1.0)], GRB.EQUAL)
+    solar = [(k, SolarNodes.index(i)) for k, i in enumerate(RenewableNodes) if i in inst.SolarNodes]
+    wind  = [(k, WindNodes.index(i)) for k, i in enumerate(RenewableNodes) if i not in inst.SolarNodes and i in inst.WindNodes]
+    terms = [own('generationRenewable', RenewableNodes)]
+    if solar:
+        k, pos = map(list, zip(*solar))
+        terms.append(term('buildNumSolar', k, pos, -param_array(inst.generationSolar, [RenewableNodes[r] for r in k], T, S)))
+    if wind:
+        k, pos = map(list, zip(*wind))
+        terms.append(term('buildNumWind', k, pos, -param_array(inst.generationWind, [RenewableNodes[r] for r in k], T, S)))
+    add_block("renewableGenerationDef", [RenewableNodes, T, S], terms, GRB.EQUAL)
+
+    k = inst.conversionElectricityGas * inst.efficiencyElectrolysis
+    add_block("CflowBalanceElectrolyzers", [ElectrolyzerNodes, T, S],
+              [flow_term('Electricity', ElectrolyzerNodes, 'in', 1.0), flow_term('Gas', ElectrolyzerNodes, 'out', -k),
+               own('storageGasCharge', ElectrolyzerNodes, -k), own('storageGasDischarge', ElectrolyzerNodes, k)], GRB.EQUAL)
+    k = inst.conversionGasLiquid * inst.efficiencyLiquefaction
+    add_block("CflowBalanceTanks", [TankNodes, T, S],
+              [flow_term('Gas', TankNodes, 'in', 1.0), flow_term('Liquid', TankNodes, 'out', -k),
+               own('storageLiquidCharge', TankNodes, -k), own('storageLiquidDischarge', TankNodes, k)], GRB.EQUAL)
+    add_block("CflowBalanceFuelCells", [FuelCellNodes, T, S],
+              [flow_term('Gas', FuelCellNodes, 'in', inst.efficiencyGasification),
+               flow_term('Liquid', FuelCellNodes, 'in', inst.efficiencyGasification * inst.conversionGasLiquid),
+               flow_term('Gas', FuelCellNodes, 'out', -1.0),
+               flow_term('Electricity', FuelCellNodes, 'out', -1.0/inst.conversionElectricityGas)], GRB.EQUAL)
+
+    # Battery Constraints
+    add_block("CstorageLiquidUpdate", [TankNodes, T, S],
+              [own('storageLiquidSoc', TankNodes),
+               own('storageLiquidSoc', TankNodes, -(1 - param_array(inst.selfDischargeStorageLiquid, TankNodes)), index.prevPeriodLiquid),
+               own('storageLiquidCharge', TankNodes, -param_array(inst.effChargingStorageLiquid, TankNodes), index.prevPeriodLiquid),
+               own('storageLiquidDischarge', TankNodes, 1/param_array(inst.effDischargingStorageLiquid, TankNodes), index.prevPeriodLiquid)], GRB.EQUAL)
+    add_block("CstorageGasUpdate", [ElectrolyzerNodes, T, S],
+              [own('storageGasSoc', ElectrolyzerNodes),
+               own('storageGasSoc', ElectrolyzerNodes, -(1 - param_array(inst.selfDischargeStorageGas, ElectrolyzerNodes)), index.prevPeriodGas),
+               own('storageGasCharge', ElectrolyzerNodes, -param_array(inst.effChargingStorageGas, ElectrolyzerNodes), index.prevPeriodGas),
+               own('storageGasDischarge', ElectrolyzerNodes, 1/param_array(inst.effDischargingStorageGas, ElectrolyzerNodes), index.prevPeriodGas)], GRB.EQUAL)
+
+    for name, soc, build, nodes, capacity in [("CmaxStorageLiquid", 'storageLiquidSoc', 'buildNumStorageLiquid', TankNodes, inst.capacityTank),
+                                              ("CmaxStorageGas", 'storageGasSoc', 'buildNumStorageGas', ElectrolyzerNodes, inst.capacityElectrolyzer),
+                                              ("CmaxChargeLiquid", 'storageLiquidCharge', 'buildNumStorageLiquid', TankNodes, inst.maxChargeTank),
+                                              ("CmaxDischargeLiquid", 'storageLiquidDischarge', 'buildNumStorageLiquid', TankNodes, inst.maxChargeTank),
+                                              ("CmaxChargeGas", 'storageGasCharge', 'buildNumStorageGas', ElectrolyzerNodes, inst.maxChargeElectrolyzer),
+                                              ("CmaxDischargeGas", 'storageGasDischarge', 'buildNumStorageGas', ElectrolyzerNodes, inst.maxChargeElectrolyzer)]:
+        add_block(name, [nodes, T, S], [own(soc, nodes), own(build, nodes, -param_array(capacity, nodes))], GRB.LESS_EQUAL)
+
+    # Loss of Load Contraints
+    for name, loss, nodes, demand, max_perc in [("CmaxLossLoadElectricity", 'lossLoadElectricity', LoadNodes, demandElectricity, inst.maxLossLoadElectricity),
+                                                ("CmaxLossLoadGas", 'lossLoadGas', IndustrialNodes, demandGas, inst.maxLossLoadGas)]:
+        offset = columns[loss][0]
+        cols = offset + np.arange(len(nodes) * nT * nS)
+        add_block(name, [S], [((cols - offset) % nS, cols, np.ones(len(cols)))], GRB.LESS_EQUAL, max_perc * demand[:,:,0].sum())
+
+    # Bound Contraints
+    for network in ['Electricity', 'Gas', 'Liquid']:
+        capacity = capacityEdge[network].reindex(arcs[network]).fillna(0).to_numpy(dtype=float)
+        add_block(f"CmaxFlow{network}", [arcs[network], T, S], [own(f'flow{network}', arcs[network])], GRB.LESS_EQUAL,
+                  np.repeat(capacity, nT * nS))
+
+    # Objective
+    obj = np.zeros(num_columns)
+    for name, nodes, cost in [('buildNumSolar', SolarNodes, inst.costBuildSolar), ('buildNumWind', WindNodes, inst.costBuildWind),
+                              ('buildNumStorageGas', ElectrolyzerNodes, inst.costBuildStorageGas),
+                              ('buildNumStorageLiquid', TankNodes, inst.costBuildStorageLiquid)]:
+        obj[columns[name][0]:columns[name][0] + len(nodes)] = param_array(cost, nodes)
+    weight = param_array(inst.scenarioWeight, S)
+    for name, nodes, cost in [('storageGasSoc', ElectrolyzerNodes, inst.costStorageGas), ('storageLiquidSoc', TankNodes, inst.costStorageLiquid)]:
+        offset = columns[name][0]
+        obj[offset:offset + len(nodes) * nT * nS] = np.tile(cost * weight, len(nodes) * nT)
+
+    return MatrixFormulationMOPTA(columns=columns, integer=integer, obj=obj, blocks=blocks)
+
+#------------------------------------------------------------------------------
+# Open-Source Solvers for the Model in Matrix Form
+#------------------------------------------------------------------------------
+
+# Engines of MatrixModelMOPTA
+MATRIX_BACKENDS = ['highs', 'scipy']
+
+class MatrixModelMOPTA():
+    '''
+    Model of the instance in matrix form solved with HiGHS (through highspy) or SciPy, without a
+    Gurobi license. Implements the parts of the ModelMOPTA interface used by the analyses, with
+    parameters and attributes named as in gurobipy
+    '''
+    def __init__(self, instance:InstanceMOPTA, sparse:bool=False, backend:str='highs'):
+        '''
+        Input:
+            instance - Instance data of the problem
+            sparse   - If True, flow variables are only created for the edges of the network
+            backend  - Engine used to solve the model, one of MATRIX_BACKENDS
+        '''
+        assert (backend in MATRIX_BACKENDS), f"Backend '{backend}' is not one of {MATRIX_BACKENDS}."
+        if (backend == 'highs') and (highspy is None):
+            raise ImportError("The 'highs' backend requires highspy, install it with 'pip install highspy'.")
+        self.__inst = instance
+        self.__sparse = sparse
+        self.__backend = backend
+        self.Params = SimpleNamespace(Threads=0, MIPGap=1e-4, TimeLimit=np.inf, LogToConsole=0)
+        # Seconds spent on each part of the construction and measures of the run (see telemetry)
+        self.__buildTimes = {}
+        self.__runId = uuid.uuid4().hex
+        self.__phases = {}
+
+        start = time.perf_counter()
+        formulation = build_matrix_formulation(instance, sparse)
+        self.__buildTimes['formulation'] = time.perf_counter() - start
+        start = time.perf_counter()
+        self.__columns = formulation.columns
+        self.__integer = formulation.integer
+        self.__obj = formulation.obj.copy()
+        self.__colLower = np.zeros(formulation.num_columns)
+        self.__colUpper = np.full(formulation.num_columns, np.inf)
+
+        # Constraints as lower <= A x <= upper, rows in the order of the blocks
+        self.__A = sp.vstack([A for _, _, A, _, _ in formulation.blocks], format='csr')
+        self.__rows = {}
+        self.__familyRows = {}
+        lower, upper, first = [], [], 0
+        for name, levels, A, sense, rhs in formulation.blocks:
+            rhs = np.broadcast_to(np.asarray(rhs, dtype=float), (A.shape[0],))
+            lower.append(np.full(A.shape[0], -np.inf) if sense == GRB.LESS_EQUAL else rhs)
+            upper.append(np.full(A.shape[0], np.inf) if sense == GRB.GREATER_EQUAL else rhs)
+            self.__rows[name] = (first, [key[0] for key in index_keys(levels)] if len(levels) == 1 else None)
+            self.__familyRows[name] = (first, A.shape[0])
+            first += A.shape[0]
+        self.__rowLower = np.concatenate(lower)
+        self.__rowUpper = np.concatenate(upper)
+        self.__buildTimes['matrix'] = time.perf_counter() - start
+
+        self.__baseBuildCosts = {name: getattr(instance, cost).copy() for name, cost in BUILD_COSTS.items()}
+        self.__totalDemandElectricity = sum(instance.demandElectricity[i,t] for i in instance.LoadNodes for t in instance.TimePeriods)
+        self.__totalDemandGas = sum(instance.demandGas[i,t] for i in instance.IndustrialNodes for t in instance.TimePeriods)
+        self.__solution_indices = {}
+        self.__reset()
+
+    @property
+    def inst(self):
+        return self.__inst
+    @property
+    def sparse(self):
+        return self.__sparse
+    @property
+    def backend(self):
+        return self.__backend
+    @property
+    def options(self):
+        # Arguments of create_model that build the same model
+        return {'backend': self.backend, 'sparse': self.sparse}
+    @property
+    def buildTimes(self):
+        # Seconds spent building the formulation and the constraint matrix
+        return self.__buildTimes
+    @property
+    def SolCount(self):
+        return int(self.__x is not None)
+    @property
+    def NumVars(self):
+        return self.__A.shape[1]
+    @property
+    def NumConstrs(self):
+        return self.__A.shape[0]
+    @property
+    def NumNZs(self):
+        return self.__A.nnz
+    @property
+    def IsMIP(self):
+        return int((self.__integer & (self.__colLower < self.__colUpper)).any())
+
+    def __reset(self):
+        # Solutions are discarded whenever the model changes, as in gurobipy
+        self.Status = GRB.LOADED
+        self.ObjVal = np.nan
+        self.Runtime = 0.0
+        self.__x = None
+        self.__duals = None
+
+    def __slice(self, name:str):
+        first, levels = self.__columns[name]
+        return slice(first, first + int(np.prod([len(level) for level in levels])))
+
+    def optimize(self, callback=None, phase_times:bool=None):
+        '''
+        Input:
+            callback    - Only accepted for the signature of ModelMOPTA.optimize, Gurobi callbacks cannot
+                          be called by the open-source engines
+            phase_times - Only accepted for the signature of ModelMOPTA.optimize, the engines are timed as a whole
+        '''
+        assert (callback is None), f"Callbacks are not supported by the '{self.backend}' backend."
+        time_start = time.perf_counter()
+        integer = self.__integer & (self.__colLower < self.__colUpper)
+        if self.backend == 'highs':
+            self.__optimize_highs(integer)
+        else:
+            self.__optimize_scipy(integer)
+        self.Runtime = time.perf_counter() - time_start
+        self.__phases['optimize'] = {'wall_time': self.Runtime, 'status': status_name(self.Status), 'Runtime': self.Runtime,
+                                     'solves': self.__phases.get('optimize', {}).get('solves', 0) + 1}
+        if os.environ.get(TELEMETRY_LOG_ENV):
+            log_telemetry(self.telemetry())
+
+    def family_stats(self):
+        '''
+        Output:
+            Dictionary with the number of rows, columns used and nonzeros of each constraint family
+        '''
+        stats = {}
+        for name, (first, num_rows) in self.__familyRows.items():
+            block = self.__A[first:first + num_rows]
+            stats[name] = {'rows': num_rows, 'cols': int(np.unique(block.indices).size), 'nonzeros': int(block.nnz)}
+        return stats
+
+    def telemetry(self):
+        '''
+        Output:
+            Record of the run of the model, with the same layout as ModelMOPTA.telemetry
+        '''
+        return {'kind': 'model', 'run_id': self.__runId, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'model': {'class': type(self).__name__, 'backend': self.backend, 'sparse': self.sparse,
+                          'vars': self.NumVars, 'constrs': self.NumConstrs, 'nonzeros': self.NumNZs},
+                'construction': dict(self.buildTimes), 'families': self.family_stats(),
+                'phases': copy.deepcopy(self.__phases), 'peak_rss_mb': peak_rss_mb()}
+
+    def __optimize_highs(self, integer:np.ndarray):
+        h = highspy.Highs()
+        h.setOptionValue('output_flag', bool(self.Params.LogToConsole))
+        h.setOptionValue('mip_rel_gap', self.Params.MIPGap)
+        if self.Params.Threads > 0:
+            h.setOptionValue('threads', int(self.Params.Threads))
+        if self.Params.TimeLimit < np.inf:
+            h.setOptionValue('time_limit', float(self.Params.TimeLimit))
+
+        lp = highspy.HighsLp()
+        lp.num_col_, lp.num_row_ = self.NumVars, self.NumConstrs
+        lp.col_cost_ = self.__obj
+        lp.col_lower_ = self.__colLower
+        lp.col_upper_ = np.where(np.isinf(self.__colUpper), highspy.kHighsInf, self.__colUpper)
+        lp.row_lower_ = np.where(np.isinf(self.__rowLower), -highspy.kHighsInf, self.__rowLower)
+        lp.row_upper_ = np.where(np.isinf(self.__rowUpper), highspy.kHighsInf, self.__rowUpper)
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+        lp.a_matrix_.num_col_, lp.a_matrix_.num_row_ = self.NumVars, self.NumConstrs
+        lp.a_matrix_.start_ = self.__A.indptr
+        lp.a_matrix_.index_ = self.__A.indices
+        lp.a_matrix_.value_ = self.__A.data
+        if integer.any():
+            lp.integrality_ = [highspy.HighsVarType.kInteger if is_integer else highspy.HighsVarType.kContinuous for is_integer in integer]
+        h.passModel(lp)
+        h.run()
+
+        status = h.getModelStatus()
+        statuses = {highspy.HighsModelStatus.kOptimal: GRB.OPTIMAL, highspy.HighsModelStatus.kInfeasible: GRB.INFEASIBLE,
+                    highspy.HighsModelStatus.kUnbounded: GRB.UNBOUNDED, highspy.HighsModelStatus.kUnboundedOrInfeasible: GRB.INF_OR_UNBD,
+                    highspy.HighsModelStatus.kTimeLimit: GRB.TIME_LIMIT}
+        self.Status = statuses.get(status, GRB.NUMERIC)
+        if self.Status == GRB.OPTIMAL:
+            solution = h.getSolution()
+            self.__x = np.array(solution.col_value)
+            self.ObjVal = h.getInfo().objective_function_value
+            self.__duals = None if integer.any() else np.array(solution.row_dual)
+
+    def __optimize_scipy(self, integer:np.ndarray):
+        bounds = scipy.optimize.Bounds(self.__colLower, self.__colUpper)
+        statuses = {0: GRB.OPTIMAL, 1: GRB.TIME_LIMIT, 2: GRB.INFEASIBLE, 3: GRB.UNBOUNDED}
+        if integer.any():
+            options = {'disp': bool(self.Params.LogToConsole), 'mip_rel_gap': self.Params.MIPGap}
+            if self.Params.TimeLimit < np.inf:
+                options['time_limit'] = float(self.Params.TimeLimit)
+            result = scipy.optimize.milp(self.__obj, integrality=integer.astype(int), bounds=bounds,
+                                         constraints=scipy.optimize.LinearConstraint(self.__A, self.__rowLower, self.__rowUpper),
+                                         options=options)
+            self.Status = statuses.get(result.status, GRB.NUMERIC)
+            if self.Status == GRB.OPTIMAL:
+                self.__x, self.ObjVal = result.x, result.fun
+            return
+
+        # Continuous model, solved with linprog to get the duals of the rows
+        equal = self.__rowLower == self.__rowUpper
+        less = ~equal & np.isfinite(self.__rowUpper)
+        greater = ~equal & np.isfinite(self.__rowLower)
+        result = scipy.optimize.linprog(self.__obj, A_ub=sp.vstack([self.__A[less], -self.__A[greater]]),
+                                        b_ub=np.concatenate([self.__rowUpper[less], -self.__rowLower[greater]]),
+                                        A_eq=self.__A[equal], b_eq=self.__rowUpper[equal],
+                                        bounds=np.column_stack([self.__colLower, self.__colUpper]), method='highs')
+        self.Status = statuses.get(result.status, GRB.NUMERIC)
+        if self.Status == GRB.OPTIMAL:
+            self.__x, self.ObjVal = result.x, result.fun
+            self.__duals = np.zeros(self.NumConstrs)
+            self.__duals[equal] = result.eqlin.marginals
+            self.__duals[less] = result.ineqlin.marginals[:less.sum()]
+            self.__duals[greater] = -result.ineqlin.marginals[less.sum():]
+
+    def get_values(self, name:str):
+        # Values of a variable family, in the creation order of ModelMOPTA
+        assert (self.__x is not None), f'Solutions do not exist, the model must be solved to optimality before.'
+        return self.__x[self.__slice(name)]
+
+    def get_build_values(self):
+        # Build decisions of the current solution
+        return {name: self.get_values(name).tolist() for name in BUILD_FAMILIES}
+
+    def set_build_start(self, values:dict):
+        # MIP starts are only used with Gurobi
+        pass
+
+    def fixed(self):
+        # Continuous model with the integer variables fixed to their values in the current solution
+        assert (self.__x is not None), f'Solutions do not exist, the model must be solved to optimality before.'
+        LPmodel = copy.copy(self)
+        LPmodel.Params = copy.copy(self.Params)
+        LPmodel.__colLower = np.where(self.__integer, np.round(self.__x), self.__colLower)
+        LPmodel.__colUpper = np.where(self.__integer, np.round(self.__x), self.__colUpper)
+        LPmodel.__solution_indices = {}
+        LPmodel.__runId = uuid.uuid4().hex
+        LPmodel.__phases = {}
+        LPmodel.__reset()
+        return LPmodel
+
+    def fixed_lp(self, warm_start:bool=False):
+        # Warm starts of the LP are only used with Gurobi
+        return self.fixed()
+
+    def save_lp_basis(self, LPmodel):
+        pass
+
+    def fixed_values(self, LPmodel, name:str):
+        return LPmodel.get_values(name)
+
+    def loss_load_duals(self, LPmodel):
+        '''
+        Input:
+            LPmodel - Solved fixed model of this model
+        Output:
+            Dictionaries of the loss of load duals of electricity and gas for each scenario
+        '''
+        assert (LPmodel.__duals is not None), f'Duals do not exist, the fixed model must be solved to optimality before.'
+        duals = []
+        for name in ['CmaxLossLoadElectricity', 'CmaxLossLoadGas']:
+            first, keys = self.__rows[name]
+            duals.append(dict(zip(keys, LPmodel.__duals[first:first + len(keys)])))
+        return duals[0], duals[1]
+
+    def update_loss_load_params(self, ll_perc_E:float, ll_perc_G:float):
+        self.inst.maxLossLoadElectricity = ll_perc_E
+        self.inst.maxLossLoadGas = ll_perc_G
+        for name, rhs in [('CmaxLossLoadElectricity', ll_perc_E * self.__totalDemandElectricity),
+                          ('CmaxLossLoadGas', ll_perc_G * self.__totalDemandGas)]:
+            first, keys = self.__rows[name]
+            self.__rowUpper[first:first + len(keys)] = rhs
+        self.__reset()
+
+    def set_investment_cost_multipliers(self, wind_cost_perc:float, pv_cost_perc:float, h2_tank_cost_perc:float, h2_intraday_cost_perc:float):
+        # Same as ModelMOPTA.set_investment_cost_multipliers
+        percs = {'buildNumSolar': pv_cost_perc, 'buildNumWind': wind_cost_perc,
+                 'buildNumStorageGas': h2_intraday_cost_perc, 'buildNumStorageLiquid': h2_tank_cost_perc}
+        for name in BUILD_FAMILIES:
+            cost = self.__baseBuildCosts[name] * (1 + percs[name])
+            setattr(self.inst, BUILD_COSTS[name], cost)
+            self.__obj[self.__slice(name)] = [cost[i] for i in self.__columns[name][1][0]]
+        self.__reset()
+
+    def update_investment_costs(self, wind_cost_perc:float, pv_cost_perc:float, h2_tank_cost_perc:float, h2_intraday_cost_perc:float):
+        self.set_investment_cost_multipliers(wind_cost_perc, pv_cost_perc, h2_tank_cost_perc, h2_intraday_cost_perc)
+
+    def load_solution_inst(self, families:list=None):
+        '''
+        Input:
+            families - Names of the variable families to load into the instance (default: all)
+        '''
+        self.inst.optimality_status = status_name(self.Status)
+        assert (self.__x is not None), f'Solutions do not exist, the model must be solved to optimality before.'
+        self.inst.is_solution_loaded = True
+
+        for name in (SOLUTION_LEVELS if families is None else families):
+            if name not in self.__solution_indices:
+                self.__solution_indices[name] = solution_index(self.inst, name)
+            setattr(self.inst, name, solution_frame(self.inst, name, self.get_values(name), self.sparse, self.__solution_indices[name]))
+
+    def dispose(self):
+        self.__x = None
+        self.__duals = None
+
+def create_model(instance:InstanceMOPTA, backend:str='gurobi', **options):
+    '''
+    Input:
+        instance - Instance data of the problem
+        backend  - 'gurobi' for ModelMOPTA or one of MATRIX_BACKENDS for MatrixModelMOPTA
+        options  - Keyword arguments of the model class
+    '''
+    if backend == 'gurobi':
+        return ModelMOPTA(instance, **options)
+    options.pop('vectorized', None)
+    return MatrixModelMOPTA(instance, backend=backend, **options)
+
+#------------------------------------------------------------------------------
+# Benders Decomposition of the Two-Stage Model
+#------------------------------------------------------------------------------
+
+class ScenarioSubproblemMOPTA(ModelMOPTA):
+    '''
+    Operational LP of a single scenario. The build decisions are continuous variables fixed by
+    their bounds, so that their reduced costs are the coefficients of the Benders cuts
+    '''
+    def __init__(self, instance:InstanceMOPTA, scenario:int, sparse:bool=True, vectorized:bool=False, **kwds):
+        '''
+        Input:
+            instance - Instance data of the problem, only the given scenario is modelled
+            scenario - Scenario of the subproblem
+        '''
+        super().__init__(instance.scenario_subset([scenario]), sparse=sparse, vectorized=vectorized, **kwds)
+        self.__build = [var for name in BUILD_FAMILIES for var in getattr(self, name).values()]
+        self.setAttr('VType', self.__build, [GRB.CONTINUOUS] * len(self.__build))
+        self.setAttr('Obj', self.__build, [0.0] * len(self.__build))
+
+        # Elastic variables of the loss of load limits, only free when measuring infeasibility
+        self.__elastic = [self.addVar(ub=0.0, name=f"elasticLossLoad{network}") for network in ['Electricity', 'Gas']]
+        self.chgCoeff(self.CmaxLossLoadElectricity[scenario], self.__elastic[0], -1.0)
+        self.chgCoeff(self.CmaxLossLoadGas[scenario], self.__elastic[1], -1.0)
+        self.update()
+        self.__vars = self.getVars()
+        self.__obj = self.getAttr('Obj', self.__vars)
+
+    def solve_at(self, build:list):
+        '''
+        Input:
+            build - Values of the build decisions, in the order of BUILD_FAMILIES
+        Output:
+            Tuple (is_feasible, value, gradient) where value is the weighted operational cost of the
+            scenario (or the loss of load violation if infeasible) and gradient its subgradient
+            with respect to the build decisions
+        '''
+        self.setAttr('LB', self.__build, build)
+        self.setAttr('UB', self.__build, build)
+        self.optimize()
+        if self.Status == GRB.OPTIMAL:
+            return True, self.ObjVal, self.getAttr('RC', self.__build)
+        assert (self.Status in [GRB.INFEASIBLE, GRB.INF_OR_UNBD]), f'Subproblem ended with status {self.Status}.'
+
+        # Phase one, minimise the violation of the loss of load limits
+        self.setAttr('Obj', self.__vars, [0.0] * len(self.__vars))
+        self.setAttr('Obj', self.__elastic, [1.0, 1.0])
+        self.setAttr('UB', self.__elastic, [GRB.INFINITY, GRB.INFINITY])
+        self.optimize()
+        assert (self.Status == GRB.OPTIMAL), f'Phase one of the subproblem ended with status {self.Status}.'
+        result = (False, self.ObjVal, self.getAttr('RC', self.__build))
+
+        self.setAttr('Obj', self.__vars, self.__obj)
+        self.setAttr('UB', self.__elastic, [0.0, 0.0])
+        return result
+
+class BendersMOPTA():
+    '''
+    L-shaped method for the two-stage model. The master problem holds the integer build decisions
+    and one cost estimate per scenario, the scenario subproblems return optimality cuts (or
+    feasibility cuts when the loss of load limits cannot be met)
+    '''
+    def __init__(self, instance:InstanceMOPTA, sparse:bool=True, vectorized:bool=False, num_workers:int=1):
+        '''
+        Input:
+            instance    - Instance data of the problem
+            sparse      - Formulation of the flows of the subproblems (see ModelMOPTA)
+            vectorized  - Builder of the subproblems (see ModelMOPTA)
+            num_workers - Number of subproblems solved in parallel, each one in its own environment
+        '''
+        self.inst = instance
+        self.num_workers = num_workers
+        self.history = pd.DataFrame()
+        self.ObjVal = np.inf
+        self.__build_master()
+
+        # Subproblems, one Gurobi environment each so that they can be solved from several threads
+        self.__envs = {}
+        self.subproblems = {}
+        for s in sorted(instance.Scenarios):
+            self.__envs[s] = gp.Env(empty=True)
+            self.__envs[s].setParam('OutputFlag', 0)
+            if num_workers > 1:
+                self.__envs[s].setParam('Threads', 1)
+            self.__envs[s].start()
+            self.subproblems[s] = ScenarioSubproblemMOPTA(instance, s, sparse=sparse, vectorized=vectorized, env=self.__envs[s])
+        self.__solved_build = None
+
+    def __build_master(self):
+        self.master = gp.Model('master')
+        self.master.Params.LogToConsole = 0
+        self.buildVars = {}
+        bounds = {'buildNumSolar': self.inst.capacitySolar, 'buildNumWind': self.inst.capacityWind}
+        for name in BUILD_FAMILIES:
+            nodes = list(getattr(self.inst, SOLUTION_LEVELS[name][0][0]))
+            ub = [bounds[name][i] for i in nodes] if name in bounds else GRB.INFINITY
+            self.buildVars[name] = self.master.addVars(nodes, ub=ub, vtype=GRB.INTEGER, name=name)
+        self.__build = [var for name in BUILD_FAMILIES for var in self.buildVars[name].values()]
+        self.__cost = np.array([getattr(self.inst, BUILD_COSTS[name])[i] for name in BUILD_FAMILIES for i in self.buildVars[name].keys()])
+        # Operational costs are non negative
+        self.theta = self.master.addVars(sorted(self.inst.Scenarios), name="theta")
+        self.master.setObjective(gp.LinExpr(self.__cost, self.__build) + self.theta.sum(), GRB.MINIMIZE)
+
+    def __solve_subproblems(self, build:list):
+        if self.num_workers > 1:
+            with ThreadPoolExecutor(max_workers=self.num_workers) as pool:
+                results = list(pool.map(lambda s: self.subproblems[s].solve_at(build), self.subproblems))
+        else:
+            results = [self.subproblems[s].solve_at(build) for s in self.subproblems]
+        self.__solved_build = build
+        return dict(zip(self.subproblems, results))
+
+    def solve(self, max_iterations:int=100, gap:float=1e-6, verbose:bool=False):
+        '''
+        Input:
+            max_iterations - Maximum number of master iterations
+            gap            - Relative gap between the bounds to stop (also the MIP gap of the master)
+            verbose        - If True, the bounds of every iteration are printed
+        Output:
+            Dataframe with the lower and upper bounds of every iteration
+        '''
+        self.master.Params.MIPGap = gap
+        history = []
+        for iteration in range(1, max_iterations + 1):
+            time_start = time.perf_counter()
+            self.master.optimize()
+            assert (self.master.Status == GRB.OPTIMAL), f'Master problem ended with status {self.master.Status}.'
+            lower_bound = self.master.ObjBound
+            build = [round(value) for value in self.master.getAttr('X', self.__build)]
+
+            results = self.__solve_subproblems(build)
+            for s, (is_feasible, value, gradient) in results.items():
+                cut = value + gp.LinExpr(gradient, self.__build) - float(np.dot(gradient, build))
+                if is_feasible:
+                    self.master.addConstr(self.theta[s] >= cut, name=f"optimalityCut[{iteration},{s}]")
+                else:
+                    self.master.addConstr(cut <= 0, name=f"feasibilityCut[{iteration},{s}]")
+
+            # Upper bound from the build decisions if every scenario is feasible
+            if all(is_feasible for is_feasible, _, _ in results.values()):
+                upper_bound = float(np.dot(self.__cost, build)) + sum(value for _, value, _ in results.values())
+                if upper_bound < self.ObjVal:
+                    self.ObjVal = upper_bound
+                    self.build = build
+            history.append({'iteration': iteration, 'lower_bound': lower_bound, 'upper_bound': self.ObjVal,
+                            'feasibility_cuts': sum(not is_feasible for is_feasible, _, _ in results.values()),
+                            'time_iteration': time.perf_counter() - time_start})
+            if verbose:
+                print(f"Iteration {iteration} | LB = {lower_bound:g} | UB = {self.ObjVal:g}")
+
+            if (self.ObjVal < np.inf) and (self.ObjVal - lower_bound <= gap * abs(self.ObjVal)):
+                break
+
+        self.history = pd.DataFrame(history)
+        return self.history
+
+    def load_solution_inst(self, families:list=None):
+        '''
+        Load the best solution into the instance, with the same frames as ModelMOPTA.load_solution_inst
+        Input:
+            families - Names of the variable families to load into the instance (default: all)
+        '''
+        assert (self.ObjVal < np.inf), f'Solutions do not exist, the decomposition must be solved before.'
+        if self.__solved_build != self.build:
+            self.__solve_subproblems(self.build)
+
+        families = list(SOLUTION_LEVELS if families is None else families)
+        for sub in self.subproblems.values():
+            sub.load_solution_inst(families)
+        for name in families:
+            if name in BUILD_FAMILIES:
+                # Same values in every subproblem
+                frame = getattr(next(iter(self.subproblems.values())).inst, name)
+            else:
+                frame = pd.concat([getattr(sub.inst, name) for sub in self.subproblems.values()])
+                frame = frame.reindex(solution_index(self.inst, name))
+            setattr(self.inst, name, frame)
+        self.inst.optimality_status = 'Optimal'
+        self.inst.is_solution_loaded = True
+
+    def dispose(self):
+        for sub in self.subproblems.values():
+            sub.dispose()
+        for env in self.__envs.values():
+            env.dispose()
+        self.master.dispose()
+
+#------------------------------------------------------------------------------
+# Progressive Hedging Decomposition of the Two-Stage Model
+#------------------------------------------------------------------------------
+
+class HedgingScenarioMOPTA(ModelMOPTA):
+    '''
+    Full model of a single scenario, with the operational costs scaled by the inverse of the
+    scenario probability so that the expected objective over scenarios is the extensive form one
+    '''
+    def __init__(self, instance:InstanceMOPTA, scenario:int, sparse:bool=True, vectorized:bool=False, **kwds):
+        '''
+        Input:
+            instance - Instance data of the problem, only the given scenario is modelled
+            scenario - Scenario of the model
+        '''
+        super().__init__(instance.scenario_subset([scenario]), sparse=sparse, vectorized=vectorized, **kwds)
+        probability = instance.scenarioWeight[scenario] / sum(instance.scenarioWeight[s] for s in instance.Scenarios)
+        self.__vars = self.getVars()
+        self.__build = [var for name in BUILD_FAMILIES for var in getattr(self, name).values()]
+        self.__buildPos = np.array([var.index for var in self.__build])
+        self.__obj = np.array(self.getAttr('Obj', self.__vars)) / probability
+        self.__obj[self.__buildPos] *= probability
+
+    def __optimize_objective(self, obj:np.ndarray, rho:np.ndarray=None, xbar:np.ndarray=None):
+        objective = gp.LinExpr(obj.tolist(), self.__vars)
+        if rho is not None:
+            # Proximal term, the linear part is already in obj
+            objective += gp.QuadExpr(gp.quicksum(0.5 * r * x * x for r, x in zip(rho, self.__build))) + float(0.5 * np.dot(rho, xbar**2))
+        self.setObjective(objective, GRB.MINIMIZE)
+        self.optimize()
+
+    def solve_hedging(self, multipliers:np.ndarray, rho:np.ndarray=None, xbar:np.ndarray=None):
+        '''
+        Input:
+            multipliers - Multipliers of the build decisions, in the order of BUILD_FAMILIES
+            rho         - Penalty of each build decision, no proximal term if None
+            xbar        - Consensus build decisions of the proximal term
+        Output:
+            Tuple (build, cost, bound) with the build decisions, the scenario cost of the solution
+            without the hedging terms, and the lower bound of the subproblem objective
+        '''
+        obj = self.__obj.copy()
+        obj[self.__buildPos] += multipliers
+        if rho is not None:
+            obj[self.__buildPos] -= rho * xbar
+        self.__optimize_objective(obj, rho, xbar)
+        if (rho is None) and (self.Status in [GRB.UNBOUNDED, GRB.INF_OR_UNBD]):
+            # Storage builds have no upper bound, the multipliers can make them free to build
+            return None, np.nan, -np.inf
+        assert (self.Status == GRB.OPTIMAL), f'Scenario model ended with status {self.Status}.'
+        values = np.array(self.getAttr('X', self.__vars))
+        return values[self.__buildPos], float(np.dot(self.__obj, values)), self.ObjBound
+
+    def evaluate(self, build:np.ndarray):
+        '''
+        Scenario cost of some build decisions, infinite if the loss of load limits cannot be met
+        '''
+        self.setAttr('LB', self.__build, build.tolist())
+        self.setAttr('UB', self.__build, build.tolist())
+        self.setObjective(gp.LinExpr(self.__obj.tolist(), self.__vars), GRB.MINIMIZE)
+        self.optimize()
+        cost = self.ObjVal if (self.Status == GRB.OPTIMAL) else np.inf
+        self.setAttr('LB', self.__build, [0.0] * len(self.__build))
+        self.setAttr('UB', self.__build, [GRB.INFINITY] * len(self.__build))
+        return cost
+
+# Scenario models of each worker process of progressive hedging, built on first use
+_hedging_instance = None
+_hedging_options = {}
+_hedging_models = {}
+
+def _init_hedging_worker(inst:InstanceMOPTA, model_options:dict, threads:int):
+    global _hedging_instance, _hedging_options
+    gp.setParam("LogToConsole", 0)
+    _hedging_instance = inst
+    _hedging_options = dict(model_options, Threads=threads)
+
+def _solve_hedging_task(models:dict, inst:InstanceMOPTA, options:dict, task:tuple):
+    # Task is (scenario, method name, arguments)
+    s, method, args = task
+    if s not in models:
+        options = dict(options)
+        threads = options.pop('Threads', None)
+        models[s] = HedgingScenarioMOPTA(inst, s, **options)
+        if threads:
+            models[s].Params.Threads = threads
+    return getattr(models[s], method)(*args)
+
+def _solve_hedging_worker(task:tuple):
+    return _solve_hedging_task(_hedging_models, _hedging_instance, _hedging_options, task)
+
+class ProgressiveHedgingMOPTA():
+    '''
+    Progressive hedging for the two-stage model. Every scenario model is solved on its own with
+    augmented Lagrangian penalties on the build decisions, until all scenarios agree on them
+    '''
+    def __init__(self, instance:InstanceMOPTA, sparse:bool=True, vectorized:bool=False, num_workers:int=1,
+                 threads_per_worker:int=None):
+        '''
+        Input:
+            instance           - Instance data of the problem
+            sparse             - Formulation of the flows of the scenario models (see ModelMOPTA)
+            vectorized         - Builder of the scenario models (see ModelMOPTA)
+            num_workers        - Number of worker processes, each one keeping the scenario models it has solved
+            threads_per_worker - Gurobi threads of each worker (default: cores split evenly between workers)
+        '''
+        self.inst = instance
+        self.num_workers = num_workers
+        self.threads = threads_per_worker or max(1, (os.cpu_count() or 1) // num_workers)
+        self.model_options = {'sparse': sparse, 'vectorized': vectorized}
+        self.scenarios = sorted(instance.Scenarios)
+        weights = np.array([instance.scenarioWeight[s] for s in self.scenarios])
+        self.probabilities = weights / weights.sum()
+        self.cost = np.array([getattr(instance, BUILD_COSTS[name])[i] for name in BUILD_FAMILIES
+                              for i in getattr(instance, SOLUTION_LEVELS[name][0][0])])
+        self.history = pd.DataFrame()
+        self.__models = {}
+
+    def __run(self, pool, method:str, args:list):
+        tasks = [(s, method, arg) for s, arg in zip(self.scenarios, args)]
+        if pool is None:
+            return [_solve_hedging_task(self.__models, self.inst, dict(self.model_options), task) for task in tasks]
+        return list(pool.map(_solve_hedging_worker, tasks))
+
+    def solve(self, rho:float=0.03, max_iterations:int=100, tolerance:float=1e-4, bound_every:int=5, verbose:bool=False):
+        '''
+        Input:
+            rho            - Penalty of each build decision as a fraction of its investment cost
+            max_iterations - Maximum number of iterations
+            tolerance      - Non-anticipativity gap (expected distance to the consensus) to stop
+            bound_every    - Iterations between Lagrangian lower bounds
+            verbose        - If True, the gap and bound of every iteration are printed
+        Output:
+            Dataframe with the non-anticipativity gap and bounds of every iteration
+        '''
+        rho = rho * self.cost
+        num_builds = len(self.cost)
+        multipliers = np.zeros((len(self.scenarios), num_builds))
+        history = []
+        pool = None
+        if self.num_workers > 1:
+            pool = ProcessPoolExecutor(max_workers=self.num_workers, initializer=_init_hedging_worker,
+                                       initargs=(self.inst, self.model_options, self.threads))
+        try:
+            # Iteration 0 is the wait-and-see problem, which is also a lower bound
+            for iteration in range(max_iterations + 1):
+                time_start = time.perf_counter()
+                if iteration == 0:
+                    results = self.__run(pool, 'solve_hedging', [(multipliers[k],) for k in range(len(self.scenarios))])
+                else:
+                    results = self.__run(pool, 'solve_hedging', [(multipliers[k], rho, xbar) for k in range(len(self.scenarios))])
+                builds = np.array([build for build, _, _ in results])
+                xbar = self.probabilities @ builds
+                multipliers += rho * (builds - xbar)
+                gap = float(self.probabilities @ np.abs(builds - xbar).sum(axis=1))
+
+                lower_bound = np.nan
+                if iteration == 0:
+                    lower_bound = float(self.probabilities @ np.array([bound for _, _, bound in results]))
+                elif iteration % bound_every == 0:
+                    # Multipliers have zero expectation, so the Lagrangian dual is a lower bound
+                    bounds = self.__run(pool, 'solve_hedging', [(multipliers[k],) for k in range(len(self.scenarios))])
+                    lower_bound = float(self.probabilities @ np.array([bound for _, _, bound in bounds]))
+
+                history.append({'iteration': iteration, 'na_gap': gap, 'lower_bound': lower_bound,
+                                'expected_cost': float(self.probabilities @ np.array([cost for _, cost, _ in results])),
+                                'time_iteration': time.perf_counter() - time_start})
+                if verbose:
+                    print(f"Iteration {iteration} | Gap = {gap:g} | LB = {lower_bound:g}")
+                if gap <= tolerance:
+                    break
+
+            # Cost of the consensus build decisions. If the scenarios do not agree yet, the consensus
+            # rounded up (more capacity keeps the loss of load limits feasible) and the build
+            # decisions of every scenario are evaluated and the best one is kept
+            if gap <= tolerance:
+                candidates = [np.round(xbar)]
+            else:
+                candidates = [np.ceil(xbar - tolerance)] + list(np.unique(np.round(builds), axis=0))
+            self.ObjVal = np.inf
+            for candidate in candidates:
+                costs = self.__run(pool, 'evaluate', [(candidate,)] * len(self.scenarios))
+                value = float(self.probabilities @ np.array(costs))
+                if value < self.ObjVal:
+                    self.ObjVal, self.build = value, candidate
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        self.history = pd.DataFrame(history)
+        self.LowerBound = self.history['lower_bound'].max()
+        return self.history
+
+    def get_build_values(self):
+        # Consensus build decisions, in the same format as ModelMOPTA.get_build_values
+        sizes = [len(getattr(self.inst, SOLUTION_LEVELS[name][0][0])) for name in BUILD_FAMILIES]
+        return {name: values.tolist() for name, values in zip(BUILD_FAMILIES, np.split(self.build, np.cumsum(sizes)[:-1]))}
+
+    def dispose(self):
+        for model in self.__models.values():
+            model.dispose()
+
+#------------------------------------------------------------------------------
+# Append-Only Store of Sweep Results
+#------------------------------------------------------------------------------
+
+def point_key(values):
+    # Parameter values of a sweep point, rounded so that stored and generated points compare equal
+    return tuple(round(float(v), 12) for v in values)
+
+class ResultsStore():
+    def __init__(self, filename:str, keys:list, table:str='results'):
+        '''
+        Rows of a sweep written to a SQLite file as soon as they are computed
+        Input:
+            filename - SQLite file of the results, created if it does not exist
+            keys     - Columns with the parameters of a point of the sweep
+            table    - Table of the results in the file
+        '''
+        self.filename = filename
+        self.keys = list(keys)
+        self.table = table
+        self.__connection = sqlite3.connect(filename)
+        self.__columns = [row[1] for row in self.__connection.execute(f'PRAGMA table_info("{table}")')]
+
+    @staticmethod
+    def __names(columns):
+        # Quoted column names, separated by commas
+        return ", ".join(f'"{c}"' for c in columns)
+
+    def append(self, row:dict):
+        # Columns are created on first use, each row is committed on its own
+        new_columns = [c for c in row if c not in self.__columns]
+        if not self.__columns:
+            self.__connection.execute(f'CREATE TABLE "{self.table}" ({self.__names(row)})')
+        else:
+            for c in new_columns:
+                self.__connection.execute(f'ALTER TABLE "{self.table}" ADD COLUMN "{c}"')
+        self.__columns += new_columns
+        values = [v.item() if isinstance(v, np.generic) else v for v in row.values()]
+        self.__connection.execute(f'INSERT INTO "{self.table}" ({self.__names(row)}) VALUES ({", ".join("?" * len(row))})', values)
+        self.__connection.commit()
+
+    def stored_points(self):
+        # Keys of the points already in the file
+        if not self.__columns:
+            return set()
+        return {point_key(values) for values in self.__connection.execute(f'SELECT {self.__names(self.keys)} FROM "{self.table}"')}
+
+    def read(self, points:list=None):
+        '''
+        Input:
+            points - Parameter values of the points to read, in the order of the rows (default: all rows)
+        Output:
+            Dataframe of the results, the last row written for each point is kept
+        '''
+        if not self.__columns:
+            return pd.DataFrame(columns=self.keys)
+        df = pd.read_sql_query(f'SELECT * FROM "{self.table}" ORDER BY rowid', self.__connection)
+        df = df.drop_duplicates(self.keys, keep='last', ignore_index=True)
+        if points is None:
+            return df
+        position = {point_key(values): k for k, values in enumerate(df[self.keys].itertuples(index=False))}
+        return df.iloc[[position[point_key(point)] for point in points if point_key(point) in position]].reset_index(drop=True)
+
+    def close(self):
+        self.__connection.close()
+
+#------------------------------------------------------------------------------
+# Content-Addressed Cache of Solved Models
+#------------------------------------------------------------------------------
+
+# Directory of the solve cache, one subdirectory per key
+SOLVE_CACHE_DIR = os.path.join('.cache', 'solutions')
+
+class SolveCache():
+    def __init__(self, directory:str=SOLVE_CACHE_DIR, max_bytes:int=1 << 30):
+        '''
+        Input:
+            directory - Directory of the entries, each one holds a record and optionally solution frames
+            max_bytes - Size limit of the directory, the least recently used entries are removed beyond it
+        '''
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, inst:InstanceMOPTA, **params):
+        # Key of a solve, from the content of the instance and every other parameter of the solve
+        digest = hashlib.sha256(inst.fingerprint().encode())
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def get(self, key:str, inst:InstanceMOPTA=None):
+        '''
+        Input:
+            key  - Key of the entry
+            inst - If given, the solution frames of the entry are loaded into the instance
+        Output:
+            Record of the entry, or None if the key is not in the cache
+        '''
+        path = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(path, 'record.json')) as f:
+                record = json.load(f)
+            if inst is not None:
+                for name in self.stored_frames(key):
+                    levels = [level_name for _, level_name in SOLUTION_LEVELS[name]]
+                    frame = pd.read_feather(os.path.join(path, f'{name}.feather'))
+                    frame = frame.set_index(list(frame.columns[:len(levels)]))
+                    frame.index.names = levels
+                    setattr(inst, name, frame)
+            # Last use of the entry, for the eviction order
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            return None
+        return record
+
+    def stored_frames(self, key:str):
+        # Variable families whose solution frames are stored in an entry
+        path = os.path.join(self.directory, key)
+        return [name for name in SOLUTION_LEVELS if os.path.isfile(os.path.join(path, f'{name}.feather'))]
+
+    def put(self, key:str, record:dict, inst:InstanceMOPTA=None, families:list=None):
+        '''
+        Input:
+            key      - Key of the entry
+            record   - JSON serialisable dictionary
+            inst     - Instance holding the solution frames to store
+            families - Names of the variable families whose frames are stored (default: none)
+        '''
+        path = os.path.join(self.directory, key)
+        families = [] if (inst is None) or (families is None) else list(families)
+        # Write to a temporary directory first so that readers never see a partial entry
+        tmp_path = f'{path}.tmp{os.getpid()}'
+        try:
+            os.makedirs(tmp_path, exist_ok=True)
+            for name in families:
+                # Index levels by position, the flow frames have two levels with the same name
+                frame = getattr(inst, name)
+                frame = frame.set_axis(frame.index.set_names([f'level_{k}' for k in range(frame.index.nlevels)]))
+                frame.reset_index().to_feather(os.path.join(tmp_path, f'{name}.feather'))
+            with open(os.path.join(tmp_path, 'record.json'), 'w') as f:
+                json.dump(record, f, default=lambda v: v.item() if isinstance(v, np.generic) else str(v))
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+        except OSError:
+            # Caching is best effort
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return
+        self.evict(keep=key)
+
+    def evict(self, keep:str=None):
+        # Remove the least recently used entries until the directory fits in max_bytes
+        evict_lru_entries(self.directory, self.max_bytes, keep)
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+def solve_cached(inst:InstanceMOPTA, cache:SolveCache, backend:str='gurobi', store_frames:bool=False,
+                 callback=None, env:gp.Env=None, **options):
+    '''
+    Solve the model of an instance, or take the solution from the cache if the same solve was done before
+    Input:
+        inst         - Instance of the problem, the build decisions, duals and stored frames are loaded into it
+        cache        - Cache of the solves
+        backend      - Solver of the model (see create_model)
+        store_frames - If True, all solution frames are stored with the entry and loaded on a hit
+        callback     - Gurobi callback of the MIP solve, only for the 'gurobi' backend
+        env          - Gurobi environment of the models, only for the 'gurobi' backend
+        options      - Options of the model (see create_model)
+    Output:
+        Dictionary with the objective, status, build decisions, costs and loss of load duals, and
+        cache_hit telling whether it was taken from the cache. Only optimal solutions are stored in the cache
+    '''
+    key = cache.key(inst, backend=backend, **options)
+    record = cache.get(key, inst)
+    is_hit = (record is not None) and ((not store_frames) or (set(SOLUTION_LEVELS) <= set(cache.stored_frames(key))))
+    if not is_hit:
+        model = create_model(inst, backend, **options) if (env is None) else create_model(inst, backend, env=env, **options)
+        if callback is None:
+            model.optimize()
+        else:
+            model.optimize(callback)
+        run_optimality_check(model)
+        is_optimal = (model.Status == GRB.OPTIMAL)
+        model.load_solution_inst()
+        # Fix integer variables to compute duals
+        LPmodel = model.fixed_lp()
+        LPmodel.optimize()
+        run_optimality_check(LPmodel)
+        duals_E, duals_G = model.loss_load_duals(LPmodel)
+        scenarios = list(inst.Scenarios)
+        build = model.get_build_values()
+        record = {'objective': model.ObjVal, 'status': inst.optimality_status, 'runtime': model.Runtime,
+                  'build': {name: list(build[name]) for name in BUILD_FAMILIES},
+                  'investment_cost': sum(getattr(inst, BUILD_COSTS[name])[i] * x for name in BUILD_FAMILIES for i, x in zip(getattr(inst, name).index, build[name])),
+                  'operational_cost': {str(s): float(inst.costStorageGas * inst.storageGasSoc.xs(s, level='Scenario').values.sum()
+                                                     + inst.costStorageLiquid * inst.storageLiquidSoc.xs(s, level='Scenario').values.sum()) for s in scenarios},
+                  'duals_E': {str(s): duals_E[s] for s in scenarios}, 'duals_G': {str(s): duals_G[s] for s in scenarios}}
+        LPmodel.dispose()
+        model.dispose()
+        if is_optimal:
+            cache.put(key, record, inst, SOLUTION_LEVELS if store_frames else BUILD_FAMILIES)
+
+    # Solution of the entry in the instance, all frames are there after a solve
+    inst.is_solution_loaded = (not is_hit) or (set(SOLUTION_LEVELS) <= set(cache.stored_frames(key)))
+    inst.optimality_status = record['status']
+    inst.duals_E = pd.DataFrame.from_dict({int(s): v for s, v in record['duals_E'].items()}, orient='index')
+    inst.duals_G = pd.DataFrame.from_dict({int(s): v for s, v in record['duals_G'].items()}, orient='index')
+    return {**record, 'cache_hit': is_hit}
+
+#------------------------------------------------------------------------------
+# Background Solves with Progress Reports
+#------------------------------------------------------------------------------
+
+class SolveJob():
+    def __init__(self, inst:InstanceMOPTA, options:dict):
+        '''
+        Input:
+            inst    - Copy of the instance solved by the job, the solution is loaded into it
+            options - Keyword arguments of solve_cached
+        '''
+        self.id = uuid.uuid4().hex[:12]
+        self.inst = inst
+        self.options = options
+        self.state = 'queued'   # queued, running, done, cancelled or failed
+        self.record = None
+        self.error = None
+        self.__cancel = threading.Event()
+        self.__lock = threading.Lock()
+        self.__progress = {'elapsed': 0.0, 'incumbent': None, 'bound': None, 'gap': None}
+        self.__time_start = None
+
+    def progress(self):
+        # State of the job and last values reported by the solver
+        with self.__lock:
+            elapsed = self.__progress['elapsed'] if (self.__time_start is None) or (self.state != 'running') else time.perf_counter() - self.__time_start
+            return dict(self.__progress, elapsed=elapsed, state=self.state, error=self.error)
+
+    def cancel(self):
+        self.__cancel.set()
+
+    @property
+    def is_cancelled(self):
+        return self.__cancel.is_set()
+
+    def callback(self, model:gp.Model, where:int):
+        # Gurobi callback, reports the MIP progress and stops the solve once the job is cancelled
+        if self.is_cancelled:
+            model.terminate()
+        elif where == GRB.Callback.MIP:
+            incumbent = model.cbGet(GRB.Callback.MIP_OBJBST)
+            bound = model.cbGet(GRB.Callback.MIP_OBJBND)
+            with self.__lock:
+                self.__progress['incumbent'] = incumbent if (incumbent < GRB.INFINITY) else None
+                self.__progress['bound'] = bound if (abs(bound) < GRB.INFINITY) else None
+                if (self.__progress['incumbent'] is not None) and (self.__progress['bound'] is not None):
+                    self.__progress['gap'] = abs(incumbent - bound) / max(abs(incumbent), 1e-10)
+
+    def run(self, cache:SolveCache, threads:int=None):
+        if self.is_cancelled:
+            self.state = 'cancelled'
+            return
+        with self.__lock:
+            self.state = 'running'
+            self.__time_start = time.perf_counter()
+        env = None
+        try:
+            options = dict(self.options)
+            if options.get('backend', 'gurobi') == 'gurobi':
+                # Each job has its own environment, so that jobs in other threads do not share parameters
+                env = gp.Env(empty=True)
+                env.setParam('LogToConsole', 0)
+                if threads is not None:
+                    env.setParam('Threads', threads)
+                env.start()
+                options.update(callback=self.callback, env=env)
+            self.record = solve_cached(self.inst, cache, **options)
+            state = 'cancelled' if self.is_cancelled else 'done'
+        except Exception as error:
+            # A cancelled solve fails once it finds no solution to load, that is not reported as an error
+            state = 'cancelled' if self.is_cancelled else 'failed'
+            if state == 'failed':
+                self.error = f'{type(error).__name__}: {error}'
+        finally:
+            if env is not None:
+                env.dispose()
+        with self.__lock:
+            self.__progress['elapsed'] = time.perf_counter() - self.__time_start
+            self.state = state
+
+class SolveJobManager():
+    def __init__(self, cache:SolveCache=None, max_workers:int=2, threads_per_job:int=None):
+        '''
+        Queue of solves run in background threads, jobs beyond max_workers wait for a free worker
+        Input:
+            cache           - Cache of the solves (default: SolveCache())
+            max_workers     - Number of jobs solved at the same time
+            threads_per_job - Gurobi threads of each job (default: cores split evenly between workers)
+        '''
+        self.cache = SolveCache() if (cache is None) else cache
+        self.threads_per_job = threads_per_job or max(1, (os.cpu_count() or 1) // max_workers)
+        self.__pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.__jobs = {}
+
+    def submit(self, inst:InstanceMOPTA, **options):
+        '''
+        Input:
+            inst    - Instance to solve, the job works on a copy of it
+            options - Keyword arguments of solve_cached
+        Output:
+            Id of the job
+        '''
+        job = SolveJob(copy.copy(inst), options)
+        self.__jobs[job.id] = job
+        self.__pool.submit(job.run, self.cache, self.threads_per_job)
+        return job.id
+
+    def has_job(self, job_id:str):
+        # Jobs are lost when the manager is rebuilt, while their ids may still be held by the sessions
+        return job_id in self.__jobs
+
+    def job(self, job_id:str):
+        return self.__jobs[job_id]
+
+    def progress(self, job_id:str):
+        return self.__jobs[job_id].progress()
+
+    def cancel(self, job_id:str):
+        if job_id in self.__jobs:
+            self.__jobs[job_id].cancel()
+
+    def forget(self, job_id:str):
+        # Remove a finished job, its instance is no longer kept
+        self.__jobs.pop(job_id, None)
+
+    def shutdown(self):
+        for job in self.__jobs.values():
+            job.cancel()
+        self.__pool.shutdown(wait=True)
+
+#------------------------------------------------------------------------------
+# Aggregates of Instances and Solutions for the Visualization Pages
+#------------------------------------------------------------------------------
+
+# Variable families summarised by AggregateCubeMOPTA
+CUBE_FAMILIES = ['generationRenewable', 'spillRenewable', 'lossLoadElectricity', 'lossLoadGas',
+                 'storageGasSoc', 'storageGasCharge', 'storageGasDischarge',
+                 'storageLiquidSoc', 'storageLiquidCharge', 'storageLiquidDischarge']
+
+class AggregateCubeMOPTA():
+    ## Axes
+    periodIds      : np.ndarray   # Period id at each position, in the order of TimePeriods
+    periodDay      : np.ndarray   # Day id of each period position (-1 if outside every day)
+    periodPosInDay : np.ndarray   # Position of each period within its day, starting at 1
+    scenarioIds    : np.ndarray   # Scenario id at each position
+    scenarioNames  : np.ndarray   # Scenario name at each position
+    scenarioWeight : np.ndarray   # Weight of each scenario position
+    loadNodeIds    : np.ndarray   # Load area at each position
+    isIndustrial   : np.ndarray   # Whether each load area is industrial
+    electrolyzerIds : np.ndarray  # Electrolyzer at each position
+    tankIds         : np.ndarray  # Hydrogen tank at each position
+
+    ## Data Totals
+    meanGenerationSolar : np.ndarray   # [scenario, period] mean generation per solar panel row
+    meanGenerationWind  : np.ndarray   # [scenario, period] mean generation per wind turbine
+    demandElectricity   : np.ndarray   # [load area, period]
+    demandGas           : np.ndarray   # [period] total over the industrial areas
+
+    ## Solution Totals (None if no solution is loaded)
+    generationRenewable    : np.ndarray = None   # [scenario, period] total over the renewable plants
+    spillRenewable         : np.ndarray = None   # [scenario, period] total over the renewable plants
+    lossLoadElectricity    : np.ndarray = None   # [scenario] total over the load areas and periods
+    lossLoadGas            : np.ndarray = None   # [scenario] total over the industrial areas and periods
+    dualsLossLoadElectricity : np.ndarray = None # [scenario]
+    dualsLossLoadGas         : np.ndarray = None # [scenario]
+    storageGasSoc          : np.ndarray = None   # [electrolyzer, scenario, period]
+    storageGasCharge       : np.ndarray = None   # [electrolyzer, scenario, period]
+    storageGasDischarge    : np.ndarray = None   # [electrolyzer, scenario, period]
+    storageLiquidSoc       : np.ndarray = None   # [tank, scenario, period]
+    storageLiquidCharge    : np.ndarray = None   # [tank, scenario, period]
+    storageLiquidDischarge : np.ndarray = None   # [tank, scenario, period]
+
+    def __init__(self, inst:InstanceMOPTA):
+        '''
+        Dense totals of an instance and its solution, so that the pages only slice them
+        Input:
+            inst - Instance, with or without a loaded solution
+        '''
+        self.periodIds = inst.index.periodIds
+        self.periodDay, self.periodPosInDay = inst.index.periodDay, inst.index.periodPosInDay
+        names = inst.Scenario_names.set_index('scenario_id')['scenario_name']
+        self.scenarioIds = np.array(sorted(inst.Scenarios))
+        self.scenarioNames = names.reindex(self.scenarioIds).to_numpy()
+        self.scenarioWeight = inst.scenarioWeight.reindex(self.scenarioIds).to_numpy(dtype=float)
+        self.loadNodeIds = np.array(sorted(inst.LoadNodes))
+        self.isIndustrial = np.isin(self.loadNodeIds, list(inst.IndustrialNodes))
+        self.electrolyzerIds = np.array(sorted(inst.ElectrolyzerNodes))
+        self.tankIds = np.array(sorted(inst.TankNodes))
+
+        scenario, period = ('scenario', self.scenarioIds), ('time_period', self.periodIds)
+        self.meanGenerationSolar = self.__dense(inst.generationSolar, [scenario, period], mean=True)
+        self.meanGenerationWind = self.__dense(inst.generationWind, [scenario, period], mean=True)
+        self.demandElectricity = self.__dense(inst.demandElectricity, [('vertex', self.loadNodeIds), period])
+        self.demandGas = self.__dense(inst.demandGas, [period])
+
+        if inst.is_solution_loaded:
+            scenario, period = ('Scenario', self.scenarioIds), ('Time Period', self.periodIds)
+            self.generationRenewable = self.__dense(inst.generationRenewable, [scenario, period])
+            self.spillRenewable = self.__dense(inst.spillRenewable, [scenario, period])
+            self.lossLoadElectricity = self.__dense(inst.lossLoadElectricity, [scenario])
+            self.lossLoadGas = self.__dense(inst.lossLoadGas, [scenario])
+            # Duals are only known once the fixed model of the solution is solved
+            self.dualsLossLoadElectricity, self.dualsLossLoadGas = [
+                duals[0].reindex(self.scenarioIds).to_numpy(dtype=float) if len(duals.columns) else np.full(len(self.scenarioIds), np.nan)
+                for duals in [inst.duals_E, inst.duals_G]]
+            for name in ['storageGasSoc', 'storageGasCharge', 'storageGasDischarge']:
+                setattr(self, name, self.__dense(getattr(inst, name), [('Electrolyzer', self.electrolyzerIds), scenario, period]))
+            for name in ['storageLiquidSoc', 'storageLiquidCharge', 'storageLiquidDischarge']:
+                setattr(self, name, self.__dense(getattr(inst, name), [('Hydrogen Tank', self.tankIds), scenario, period]))
+
+    @staticmethod
+    def __dense(values:pd.Series, axes:list, mean:bool=False):
+        # Totals (or means) of the values over the (level, ids) axes, summing over the other levels
+        values = values.iloc[:, 0] if isinstance(values, pd.DataFrame) else values
+        shape = tuple(len(ids) for _, ids in axes)
+        codes = [pd.Index(ids).get_indexer(values.index.get_level_values(level)) for level, ids in axes]
+        assert all((code >= 0).all() for code in codes), f'Values of {values.name} must be indexed by the sets of the instance.'
+        flat = np.ravel_multi_index(codes, shape)
+        total = np.bincount(flat, weights=values.to_numpy(dtype=float), minlength=int(np.prod(shape)))
+        if mean:
+            total = total / np.maximum(np.bincount(flat, minlength=int(np.prod(shape))), 1)
+        return total.reshape(shape)
+
+    def day_frame(self, **columns):
+        '''
+        Input:
+            columns - Arrays of values over the period positions
+        Output:
+            Frame with the columns 'Day' and 'Time Period' (position within the day) and the given columns
+        '''
+        return pd.DataFrame({'Day': self.periodDay.astype(str), 'Time Period': self.periodPosInDay, **columns})
+
 #------------------------------------------------------------------------------
 # Auxiliary Functions to Deal with Solutions
 #------------------------------------------------------------------------------
@@ -564,214 +2986,620 @@ def run_optimality_check(model:ModelMOPTA):
     else:
         print(f"Optimization ended with status {model.Status}")
 
-def run_economical_analysis(model:ModelMOPTA, ll_perc_lb:float, ll_perc_ub:float, ll_perc_step:float):
+def serpentine_grid(*axes):
+    '''
+    Points of the product of the axes in boustrophedon order, so that consecutive points
+    only differ by one step in a single coordinate
+    '''
+    if len(axes) == 1:
+        return [(value,) for value in axes[0]]
+    inner = serpentine_grid(*axes[1:])
+    return [(value,) + point for k, value in enumerate(axes[0]) for point in (inner if k % 2 == 0 else inner[::-1])]
+
+def solve_economical_point(model:ModelMOPTA, ll_perc_E:float, ll_perc_G:float, warm_start:bool=False, cache:SolveCache=None):
+    '''
+    Solve the model for one pair of loss of load limits
+    Input:
+        warm_start - If True, the build decisions of the model's last solution are the MIP start
+                     and the basis of the last fixed LP is the starting basis
+        cache      - If given, the row is taken from (or stored in) the cache of solves
+    Output:
+        Dictionary with the investment and operational costs, the loss of load duals and timings
+    '''
+    print(f"Elect = {ll_perc_E} | Gas = {ll_perc_G}")
+    time_start = time.perf_counter()
+    # Keep the incumbent, solutions are discarded once the model is modified
+    start = model.get_build_values() if (warm_start and model.SolCount > 0) else None
+
+    # Update Maximum Loss Load Parameter
+    model.update_loss_load_params(ll_perc_E, ll_perc_G)        
+    if cache is not None:
+        key = cache.key(model.inst, analysis='economical_point', **model.options)
+        row = cache.get(key)
+        if row is not None:
+            print(f"Solve cache hit {key[:12]}")
+            return row
+    if start is not None:
+        model.set_build_start(start)
+
+    # Run MILP Model
+    model.optimize()
+    run_optimality_check(model)
+
+    # Get optimal INVESTMENT Costs
+    build = model.get_build_values()
+    cost_build_solar = sum(model.inst.costBuildSolar[i] * x for i, x in zip(model.inst.SolarNodes, build['buildNumSolar']))
+    cost_build_wind  = sum(model.inst.costBuildWind[i] * x for i, x in zip(model.inst.WindNodes, build['buildNumWind']))
+    cost_build_storage_gas = sum(model.inst.costBuildStorageGas[i] * x for i, x in zip(model.inst.ElectrolyzerNodes, build['buildNumStorageGas']))
+    cost_build_storage_liquid = sum(model.inst.costBuildStorageLiquid[i] * x for i, x in zip(model.inst.TankNodes, build['buildNumStorageLiquid']))
+    investment_cost = cost_build_solar + cost_build_wind + cost_build_storage_gas + cost_build_storage_liquid
+
+    # Fix investement decision, relax integrality and re-solve LP
+    LPmodel = model.fixed_lp(warm_start)
+    LPmodel.optimize()
+    run_optimality_check(LPmodel) 
+    if warm_start:
+        model.save_lp_basis(LPmodel)
+    
+    # Get optimal OPERATIONAL Costs, values are ordered by (node, period, scenario)
+    soc_gas = model.fixed_values(LPmodel, 'storageGasSoc').reshape(-1, len(model.inst.Scenarios)).sum(axis=0)
+    soc_liquid = model.fixed_values(LPmodel, 'storageLiquidSoc').reshape(-1, len(model.inst.Scenarios)).sum(axis=0)
+    cost_storage_gas = {s: model.inst.costStorageGas * soc_gas[k] for k, s in enumerate(model.inst.Scenarios)}
+    cost_storage_liquid = {s: model.inst.costStorageLiquid * soc_liquid[k] for k, s in enumerate(model.inst.Scenarios)}
+    operarional_costs = {s: cost_storage_gas[s] + cost_storage_liquid[s] for s in model.inst.Scenarios}
+
+    # Compute Loss of Load Duals/Prices
+    duals_E, duals_G = model.loss_load_duals(LPmodel)
+
+    # Row of results
+    new_row = {'ll_perc_E': ll_perc_E, 
+                'll_perc_G': ll_perc_G,
+                'investment_solar': cost_build_solar,
+                'investment_wind': cost_build_wind,
+                'investment_storage_gas': cost_build_storage_gas,
+                'investment_storage_liquid': cost_build_storage_liquid,
+                'investment_cost': investment_cost,
+                'operational_cost': sum(operarional_costs[s] for s in model.inst.Scenarios)}
+
+    for s in model.inst.Scenarios:
+        new_row[f"operational_cost_{s}"] = operarional_costs[s]
+        new_row[f"ll_dual_E_{s}"] = duals_E[s]
+        new_row[f"ll_dual_G_{s}"] = duals_G[s]
+
+    # Timings of the point
+    new_row['runtime_mip'] = model.Runtime
+    new_row['runtime_lp'] = LPmodel.Runtime
+    new_row['time_point'] = time.perf_counter() - time_start
+    print(f"MIP = {new_row['runtime_mip']:.2f}s | LP = {new_row['runtime_lp']:.2f}s | Point = {new_row['time_point']:.2f}s")
+
+    LPmodel.dispose()
+    if cache is not None:
+        cache.put(key, new_row)
+    return new_row
+
+# Model of each worker process of the parallel sweeps
+_worker_model = None
+_worker_warm_start = False
+_worker_cache = None
+
+def _init_economical_worker(inst:InstanceMOPTA, model_options:dict, threads:int, warm_start:bool, cache:SolveCache):
+    # Build the worker's model once, it is reused for every grid point sent to the worker
+    global _worker_model, _worker_warm_start, _worker_cache
+    gp.setParam("LogToConsole", 0)
+    _worker_model = create_model(inst, **model_options)
+    _worker_model.Params.Threads = threads
+    _worker_warm_start = warm_start
+    _worker_cache = cache
+
+def _solve_economical_worker(point:tuple):
+    return solve_economical_point(_worker_model, *point, warm_start=_worker_warm_start, cache=_worker_cache)
+
+def run_economical_analysis(model:ModelMOPTA, ll_perc_lb:float, ll_perc_ub:float, ll_perc_step:float,
+                            num_workers:int=1, threads_per_worker:int=None, warm_start:bool=True,
+                            results_filename:str=None, cache:SolveCache=None):
+    '''
+    Input:
+        model              - Model solved at every point of the grid of loss of load limits
+        ll_perc_lb         - Lower bound of the loss of load limits
+        ll_perc_ub         - Upper bound of the loss of load limits
+        ll_perc_step       - Step between loss of load limits
+        num_workers        - Number of worker processes, each one holding its own copy of the model
+        threads_per_worker - Gurobi threads of each worker (default: cores split evenly between workers)
+        warm_start         - If True, each point starts from the MIP solution and LP basis of the previous one
+        results_filename   - SQLite file where each row is stored as soon as it is solved (see ResultsStore),
+                             points already in the file are not solved again
+        cache              - If given, points solved before are taken from the cache of solves (see SolveCache)
+    '''
     assert ((ll_perc_lb>=0) & (ll_perc_lb <=1)), f"The parameter 'll_perc_lb'={ll_perc_lb} must be a percentage."
     assert ((ll_perc_ub>=0) & (ll_perc_ub <=1)), f"The parameter 'll_perc_ub'={ll_perc_ub} must be a percentage."
     assert ((ll_perc_step>=0) & (ll_perc_step <=1)), f"The parameter 'll_perc_step'={ll_perc_step} must be between 0 and 1."
-
-    df_results = pd.DataFrame(columns=['ll_perc_E', 'll_perc_G', 'investment_solar','investment_wind',
-                                        'investment_storage_gas','investment_storage_liquid',
-                                        'investment_cost', 'operational_cost']
-                                + [f"operational_cost_{s}" for s in model.inst.Scenarios] 
-                                + [f"ll_dual_E_{s}" for s in model.inst.Scenarios]
-                                + [f"ll_dual_G_{s}" for s in model.inst.Scenarios])
-    
-    for ll_perc_E in np.arange(ll_perc_lb, ll_perc_ub+ll_perc_step, ll_perc_step):
-        for ll_perc_G in np.arange(ll_perc_lb, ll_perc_ub+ll_perc_step, ll_perc_step):
-            print(f"Elect = {ll_perc_E} | Gas = {ll_perc_G}")
-            # Update Maximum Loss Load Parameter
-            model.update_loss_load_params(ll_perc_E, ll_perc_G)        
-
-            # Run MILP Model
-            model.optimize()
-            run_optimality_check(model)
-
-            # Get optimal OPERATIONAL Costs
-            cost_build_solar = sum(model.inst.costBuildSolar[i] * model.buildNumSolar[i].X for i in model.inst.SolarNodes)
-            cost_build_wind  = sum(model.inst.costBuildWind[i] * model.buildNumWind[i].X for i in model.inst.WindNodes)
-            cost_build_storage_gas = sum(model.inst.costBuildStorageGas[i] * model.buildNumStorageGas[i].X for i in model.inst.ElectrolyzerNodes)
-            cost_build_storage_liquid = sum(model.inst.costBuildStorageLiquid[i] * model.buildNumStorageLiquid[i].X for i in model.inst.TankNodes)
-            investment_cost = cost_build_solar + cost_build_wind + cost_build_storage_gas + cost_build_storage_liquid
-
-            # Fix investement decision, relax integrality and re-solve LP
-            LPmodel = model.fixed()
-            LPmodel.optimize() #TODO warmstart=True
-            run_optimality_check(LPmodel) 
-            
-            # Get optimal OPERATIONAL Costs
-            cost_storage_gas = {s: (sum(model.inst.costStorageGas * LPmodel.getVarByName(f"storageGasSoc[{i},{t},{s}]").X\
-                                        for i in model.inst.ElectrolyzerNodes for t in model.inst.TimePeriods)) for s in model.inst.Scenarios}
-            cost_storage_liquid = {s: (sum(model.inst.costStorageLiquid * LPmodel.getVarByName(f"storageLiquidSoc[{i},{t},{s}]").X\
-                                        for i in model.inst.TankNodes for t in model.inst.TimePeriods)) for s in model.inst.Scenarios}
-            operarional_costs = {s: cost_storage_gas[s] + cost_storage_liquid[s] for s in model.inst.Scenarios}
-
-            # Compute Loss of Load Duals/Prices
-            duals_E = {s: LPmodel.getConstrByName(f"CmaxLossLoadElectricity[{s}]").Pi for s in model.inst.Scenarios}
-            duals_G = {s: LPmodel.getConstrByName(f"CmaxLossLoadGas[{s}]").Pi for s in model.inst.Scenarios}
-    
-            # Update dataframe of results
-            new_row = {'ll_perc_E': ll_perc_E, 
-                        'll_perc_G': ll_perc_G,
-                        'investment_solar': cost_build_solar,
-                        'investment_wind': cost_build_wind,
-                        'investment_storage_gas': cost_build_storage_gas,
-                        'investment_storage_liquid': cost_build_storage_liquid,
-                        'investment_cost': investment_cost,
-                        'operational_cost': sum(operarional_costs[s] for s in model.inst.Scenarios)}
-        
-            for s in model.inst.Scenarios:
-                new_row[f"operational_cost_{s}"] = operarional_costs[s]
-                new_row[f"ll_dual_E_{s}"] = duals_E[s]
-                new_row[f"ll_dual_G_{s}"] = duals_G[s]
-
-            df_results = pd.concat([df_results, pd.DataFrame(new_row, index=[0])], ignore_index=True)
-
-    return df_results
-
-def plot_economical_analysis(data_filename:str, scenario:int, scenario_name:str, z_axis:str, fig_filename:str, num_tol:int=0.00001):
-    assert z_axis in ['operational_cost', 'dual_E', 'dual_G'], f"z_axis argument must be one of ['operational_cost', 'dual_E', 'dual_G']"
-    
-    # Read data and save column names
-    df = pd.read_csv(data_filename)
-    x_name = 'll_perc_E'
-    y_name = 'll_perc_G'
-    df[x_name] = df[x_name] * 100
-    df[y_name] = df[y_name] * 100
-
-    if z_axis == 'operational_cost':
-        z_name  = f'operational_cost_'+str(scenario)
-        z_cmap  = 'RdYlGn_r'
-        z_title = f'Operational Cost \n of Scenario {scenario_name}'
-    elif z_axis == 'dual_E':
-        z_name  = f'll_dual_E_'+str(scenario)
-        z_cmap  = 'RdYlGn'
-        z_title = f'Shadow Price of Lost Electricity Load \n under Scenario {scenario_name}'
-    else: # z_axis == 'dual_G'
-        z_name  = f'll_dual_G_'+str(scenario)
-        z_cmap  = 'RdYlGn'
-        z_title = f'Shadow Price of Lost Gas Load \n under Scenario {scenario_name}'
-
-    # 2D-arrays from DataFrame
-    x1 = np.linspace(df[x_name].min(), df[x_name].max(), len(df[x_name].unique()))
-    y1 = np.linspace(df[y_name].min(), df[y_name].max(), len(df[y_name].unique()))
-    x, y = np.meshgrid(x1, y1)
-
-    n_row, n_col = x.shape
-    z = np.absolute(np.array([[float(df.loc[(np.abs(df[x_name]-x[i,j])<num_tol) & (np.abs(df[y_name]-y[i,j])<num_tol), z_name])
-                               for j in range(n_col)] for i in range(n_row)]))    
+    assert (num_workers >= 1), f"The parameter 'num_workers'={num_workers} must be at least 1."
+    time_start = time.perf_counter()
+
+    columns = (['ll_perc_E', 'll_perc_G', 'investment_solar','investment_wind',
+                'investment_storage_gas','investment_storage_liquid',
+                'investment_cost', 'operational_cost']
+               + [f"operational_cost_{s}" for s in model.inst.Scenarios] 
+               + [f"ll_dual_E_{s}" for s in model.inst.Scenarios]
+               + [f"ll_dual_G_{s}" for s in model.inst.Scenarios]
+               + ['runtime_mip', 'runtime_lp', 'time_point'])
+
+    # Neighbouring points are visited one after the other, so that warm starts are close to optimal
+    ll_percs = np.arange(ll_perc_lb, ll_perc_ub+ll_perc_step, ll_perc_step)
+    points = serpentine_grid(ll_percs, ll_percs)
+    store = None if (results_filename is None) else ResultsStore(results_filename, ['ll_perc_E', 'll_perc_G'])
+    if store is not None:
+        stored = store.stored_points()
+        print(f"Points already stored = {sum(point_key(point) in stored for point in points)}/{len(points)}")
+        points = [point for point in points if point_key(point) not in stored]
+
+    pool = None
+    if num_workers == 1:
+        results = (solve_economical_point(model, ll_perc_E, ll_perc_G, warm_start, cache) for ll_perc_E, ll_perc_G in points)
+    else:
+        threads = threads_per_worker or max(1, (os.cpu_count() or 1) // num_workers)
+        pool = ProcessPoolExecutor(max_workers=num_workers, initializer=_init_economical_worker,
+                                   initargs=(model.inst, model.options, threads, warm_start, cache))
+        # Each worker gets contiguous stretches of the path
+        chunksize = max(1, int(np.ceil(len(points) / (2 * num_workers))))
+        results = pool.map(_solve_economical_worker, points, chunksize=chunksize)
+    # Rows are stored as they come, so that an interrupted sweep can be resumed
+    rows = []
+    try:
+        for row in results:
+            rows.append(row)
+            if store is not None:
+                store.append(row)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if store is not None:
+        rows = store.read(itertools.product(ll_percs, ll_percs))
+        store.close()
+    # Rows in the order of the grid
+    df = pd.DataFrame(rows, columns=columns).sort_values(['ll_perc_E', 'll_perc_G'], ignore_index=True)
+    df.attrs['telemetry'] = driver_telemetry('run_economical_analysis', time_start, df, model, ll_perc_lb=ll_perc_lb, ll_perc_ub=ll_perc_ub,
+                                             ll_perc_step=ll_perc_step, num_workers=num_workers, warm_start=warm_start)
+    return df
+
+def surface_grid(df:pd.DataFrame, x_name:str, y_name:str, z_names:list, num_tol:float=0.00001):
+    '''
+    Input:
+        df      - Results with one row per point of a grid over the x and y columns
+        z_names - Columns whose surfaces are built
+        num_tol - Tolerance under which x and y values are the same grid value
+    Output:
+        2D-arrays x and y of the grid and dictionary of the 2D-array of each z column (NaN at missing points)
+    '''
+    # Grid values rounded to the tolerance, so that a single pivot places every row
+    x_key = np.round(df[x_name].to_numpy() / num_tol).astype(np.int64)
+    y_key = np.round(df[y_name].to_numpy() / num_tol).astype(np.int64)
+    keys = pd.DataFrame({'x_key': x_key, 'y_key': y_key})
+    duplicated = keys.duplicated()
+    # Several rows in a cell (e.g. other columns of the grid left unfiltered) have no single surface value
+    assert (not duplicated.any()), f"Rows {list(df.index[keys.duplicated(keep=False)][:6])} share the same ({x_name}, {y_name}) point, filter the other parameters first."
+    table = df[z_names].assign(x_key=x_key, y_key=y_key).groupby(['y_key', 'x_key']).last().unstack('x_key')
+    x, y = np.meshgrid(table[z_names[0]].columns.to_numpy() * num_tol, table.index.to_numpy() * num_tol)
+    return x, y, {z_name: table[z_name].to_numpy(dtype=float) for z_name in z_names}
+
+def plot_surface(x:np.ndarray, y:np.ndarray, z:np.ndarray, cmap:str, x_label:str, y_label:str, title:str, fig_filename:str):
     # Set up axes and put data on the surface
     fig = plt.figure()
     axes = fig.add_subplot(projection='3d')
-    axes.plot_surface(x, y, z, cmap=z_cmap)
+    axes.plot_surface(x, y, z, cmap=cmap)
 
     # Customize labels
-    axes.set_xlabel('Electricity Loss of Load (%)')
-    axes.set_ylabel('Gas Loss of Load (%)')
-    axes.set_title(z_title)     
+    axes.set_xlabel(x_label)
+    axes.set_ylabel(y_label)
+    axes.set_title(title)
 
     plt.savefig(fig_filename, bbox_inches='tight', pad_inches=0.3)
-    plt.close()
+    plt.close(fig)
+
+def _init_plot_worker():
+    # Figures are only saved to files
+    plt.switch_backend('Agg')
+
+def _plot_surface_worker(task:tuple):
+    plot_surface(*task)
+    return task[-1]
+
+def render_surfaces(tasks:list, num_workers:int=None):
+    '''
+    Input:
+        tasks       - Arguments of plot_surface for each figure
+        num_workers - Number of processes rendering the figures (default: one per core, 1 renders in this process)
+    Output:
+        Names of the files of the figures
+    '''
+    num_workers = num_workers or min(len(tasks), os.cpu_count() or 1)
+    if num_workers <= 1:
+        return [_plot_surface_worker(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_plot_worker) as pool:
+        return list(pool.map(_plot_surface_worker, tasks))
+
+def economical_surface_labels(z_axis:str, scenario:int, scenario_name:str):
+    # Column, colour map and title of the surface of a metric of a scenario
+    assert z_axis in ['operational_cost', 'dual_E', 'dual_G'], f"z_axis argument must be one of ['operational_cost', 'dual_E', 'dual_G']"
+    if z_axis == 'operational_cost':
+        return f'operational_cost_{scenario}', 'RdYlGn_r', f'Operational Cost \n of Scenario {scenario_name}'
+    elif z_axis == 'dual_E':
+        return f'll_dual_E_{scenario}', 'RdYlGn', f'Shadow Price of Lost Electricity Load \n under Scenario {scenario_name}'
+    else: # z_axis == 'dual_G'
+        return f'll_dual_G_{scenario}', 'RdYlGn', f'Shadow Price of Lost Gas Load \n under Scenario {scenario_name}'
 
-def run_future_scenarios_analysis(wind_cost_scenarios:list, pv_cost_scenarios:list,
-                                  h2_tank_cost_scenarios:list, h2_intraday_cost_scenarios:list):
-    gp.setParam("LogToConsole", 0)
+def read_economical_analysis(data_filename:str):
+    # Results of run_economical_analysis with loss of load percentages in %
+    df = pd.read_csv(data_filename)
+    df['ll_perc_E'] = df['ll_perc_E'] * 100
+    df['ll_perc_G'] = df['ll_perc_G'] * 100
+    return df
 
-    df_results = pd.DataFrame(columns=['wind_cost_scenario', 'pv_cost_scenario', 
-                                       'h2_tank_cost_scenario','h2_intraday_cost_scenario',
-                                       'investment_solar', 'investment_wind',
-                                       'investment_storage_gas','investment_storage_liquid',
-                                       'investment_cost', 'operational_cost',
-                                       'Sol_wind', 'Sol_pv', 'Sol_h2_tank', 'Sol_h2_intraday']
-                                     + [f"operational_cost_{s}" for s in range(1,10)])
+def plot_economical_analysis(data_filename:str, scenario:int, scenario_name:str, z_axis:str, fig_filename:str, num_tol:int=0.00001):
+    z_name, z_cmap, z_title = economical_surface_labels(z_axis, scenario, scenario_name)
+
+    # Read data and build the 2D-arrays of the surface
+    df = read_economical_analysis(data_filename)
+    x, y, z = surface_grid(df, 'll_perc_E', 'll_perc_G', [z_name], num_tol)
+    plot_surface(x, y, np.absolute(z[z_name]), z_cmap, 'Electricity Loss of Load (%)', 'Gas Loss of Load (%)', z_title, fig_filename)
+
+def plot_economical_analysis_batch(data_filename:str, scenario_names:dict, fig_prefix:str,
+                                   z_axes:list=['operational_cost', 'dual_E', 'dual_G'], num_workers:int=None, num_tol:int=0.00001):
+    '''
+    Plot every (metric, scenario) surface of an economical analysis, reading its results once
+    Input:
+        scenario_names - Scenario id -> scenario name
+        fig_prefix     - Figures are saved as '{fig_prefix}_{z_axis}_{scenario_name}.pdf'
+        num_workers    - Number of processes rendering the figures (see render_surfaces)
+    Output:
+        Names of the files of the figures
+    '''
+    labels = [economical_surface_labels(z_axis, scenario, scenario_name) + (f'{fig_prefix}_{z_axis}_{scenario_name}.pdf',)
+              for z_axis in z_axes for scenario, scenario_name in scenario_names.items()]
+    df = read_economical_analysis(data_filename)
+    x, y, z = surface_grid(df, 'll_perc_E', 'll_perc_G', list(dict.fromkeys(z_name for z_name, _, _, _ in labels)), num_tol)
+    tasks = [(x, y, np.absolute(z[z_name]), z_cmap, 'Electricity Loss of Load (%)', 'Gas Loss of Load (%)', z_title, fig_filename)
+             for z_name, z_cmap, z_title, fig_filename in labels]
+    return render_surfaces(tasks, num_workers)
+
+def solve_future_scenario_point(model:ModelMOPTA, wind_cost:float, pv_cost:float, h2_tank_cost:float, h2_intraday_cost:float,
+                                start:dict=None):
+    '''
+    Solve the model for one combination of relative changes of the investment costs, the costs must
+    already be set on the model (see ModelMOPTA.set_investment_cost_multipliers)
+    Input:
+        start - Build decisions used as MIP start
+    Output:
+        Dictionary with the investment and operational costs, the number of assets built and timings
+    '''
+    time_start = time.perf_counter()
+    if start is not None:
+        model.set_build_start(start)
+
+    # Run MILP Model
+    model.optimize()
+    run_optimality_check(model)
+
+    # Get optimal INVESTMENT Costs
+    build = model.get_build_values()
+    cost_build_solar = sum(model.inst.costBuildSolar[i] * x for i, x in zip(model.inst.SolarNodes, build['buildNumSolar']))
+    cost_build_wind  = sum(model.inst.costBuildWind[i] * x for i, x in zip(model.inst.WindNodes, build['buildNumWind']))
+    cost_build_storage_gas = sum(model.inst.costBuildStorageGas[i] * x for i, x in zip(model.inst.ElectrolyzerNodes, build['buildNumStorageGas']))
+    cost_build_storage_liquid = sum(model.inst.costBuildStorageLiquid[i] * x for i, x in zip(model.inst.TankNodes, build['buildNumStorageLiquid']))
+    investment_cost = cost_build_solar + cost_build_wind + cost_build_storage_gas + cost_build_storage_liquid 
     
-    for wind_cost, pv_cost in itertools.product(wind_cost_scenarios, pv_cost_scenarios):
-        for h2_tank_cost, h2_intraday_cost in itertools.product(h2_tank_cost_scenarios, h2_intraday_cost_scenarios):
-            print(f"Wind = {wind_cost} | PV = {pv_cost} | H2 Tank = {h2_tank_cost} | H2 Intraday = {h2_intraday_cost}")
-            
-            # Create model from instance
-            model = ModelMOPTA(InstanceMOPTA('Instances\stochastic_instance_2050.xlsx'))
-
-            # Update Investment Cost Parameter
-            model.update_investment_costs(wind_cost, pv_cost, h2_tank_cost, h2_intraday_cost)
+    # Get optimal OPERATIONAL Costs, values are ordered by (node, period, scenario)
+    soc_gas = np.array(model.getAttr('X', list(model.storageGasSoc.values()))).reshape(-1, len(model.inst.Scenarios)).sum(axis=0)
+    soc_liquid = np.array(model.getAttr('X', list(model.storageLiquidSoc.values()))).reshape(-1, len(model.inst.Scenarios)).sum(axis=0)
+    cost_storage_gas = {s: model.inst.costStorageGas * soc_gas[k] for k, s in enumerate(model.inst.Scenarios)}
+    cost_storage_liquid = {s: model.inst.costStorageLiquid * soc_liquid[k] for k, s in enumerate(model.inst.Scenarios)}
+    operarional_costs = {s: cost_storage_gas[s] + cost_storage_liquid[s] for s in model.inst.Scenarios}
+
+    # Get optimal INVESTMENT Solution
+    num_wind_turbines = sum(build['buildNumWind'])
+    num_pv_panels = sum(build['buildNumSolar'])
+    num_h2_tanks = sum(build['buildNumStorageLiquid'])
+    num_h2_intraday = sum(build['buildNumStorageGas'])
+
+    # Update dataframe of results
+    new_row = {'wind_cost_scenario': wind_cost, 
+                'pv_cost_scenario': pv_cost, 
+                'h2_tank_cost_scenario': h2_tank_cost, 
+                'h2_intraday_cost_scenario': h2_intraday_cost,
+                'investment_solar': cost_build_solar,
+                'investment_wind': cost_build_wind,
+                'investment_storage_gas': cost_build_storage_gas,
+                'investment_storage_liquid': cost_build_storage_liquid,
+                'investment_cost': investment_cost,
+                'operational_cost': sum(operarional_costs[s] for s in model.inst.Scenarios),
+                'Sol_wind': num_wind_turbines,
+                'Sol_pv': num_pv_panels,
+                'Sol_h2_tank': num_h2_tanks,
+                'Sol_h2_intraday': num_h2_intraday}      
+    for s in model.inst.Scenarios:
+        new_row[f"operational_cost_{s}"] = operarional_costs[s]
+
+    # Timings of the point
+    new_row['runtime_mip'] = model.Runtime
+    new_row['time_point'] = time.perf_counter() - time_start
+    print(f"MIP = {new_row['runtime_mip']:.2f}s | Point = {new_row['time_point']:.2f}s")
+    return new_row
 
-            # Run MILP Model
-            model.optimize()
-            run_optimality_check(model)
-
-            # Get optimal INVESTMENT Costs
-            cost_build_solar = sum(model.inst.costBuildSolar[i] * model.buildNumSolar[i].X for i in model.inst.SolarNodes)
-            cost_build_wind  = sum(model.inst.costBuildWind[i] * model.buildNumWind[i].X for i in model.inst.WindNodes)
-            cost_build_storage_gas = sum(model.inst.costBuildStorageGas[i] * model.buildNumStorageGas[i].X for i in model.inst.ElectrolyzerNodes)
-            cost_build_storage_liquid = sum(model.inst.costBuildStorageLiquid[i] * model.buildNumStorageLiquid[i].X for i in model.inst.TankNodes)
-            investment_cost = cost_build_solar + cost_build_wind + cost_build_storage_gas + cost_build_storage_liquid 
-            
-            # Get optimal OPERATIONAL Costs
-            cost_storage_gas = {s: (sum(model.inst.costStorageGas * model.getVarByName(f"storageGasSoc[{i},{t},{s}]").X\
-                                        for i in model.inst.ElectrolyzerNodes for t in model.inst.TimePeriods)) for s in model.inst.Scenarios}
-            cost_storage_liquid = {s: (sum(model.inst.costStorageLiquid * model.getVarByName(f"storageLiquidSoc[{i},{t},{s}]").X\
-                                        for i in model.inst.TankNodes for t in model.inst.TimePeriods)) for s in model.inst.Scenarios}
-            operarional_costs = {s: cost_storage_gas[s] + cost_storage_liquid[s] for s in model.inst.Scenarios}
-
-            # Get optimal INVESTMENT Solution
-            num_wind_turbines = sum(model.buildNumWind[i].X for i in model.inst.WindNodes)
-            num_pv_panels = sum(model.buildNumSolar[i].X for i in model.inst.SolarNodes)
-            num_h2_tanks = sum(model.buildNumStorageLiquid[i].X for i in model.inst.TankNodes)
-            num_h2_intraday = sum(model.buildNumStorageGas[i].X for i in model.inst.ElectrolyzerNodes)
-
-            # Update dataframe of results
-            new_row = {'wind_cost_scenario': wind_cost, 
-                        'pv_cost_scenario': pv_cost, 
-                        'h2_tank_cost_scenario': h2_tank_cost, 
-                        'h2_intraday_cost_scenario': h2_intraday_cost,
-                        'investment_solar': cost_build_solar,
-                        'investment_wind': cost_build_wind,
-                        'investment_storage_gas': cost_build_storage_gas,
-                        'investment_storage_liquid': cost_build_storage_liquid,
-                        'investment_cost': investment_cost,
-                        'operational_cost': sum(operarional_costs[s] for s in model.inst.Scenarios),
-                        'Sol_wind': num_wind_turbines,
-                        'Sol_pv': num_pv_panels,
-                        'Sol_h2_tank': num_h2_tanks,
-                        'Sol_h2_intraday': num_h2_intraday}      
-            for s in model.inst.Scenarios:
-                new_row[f"operational_cost_{s}"] = operarional_costs[s]
-
-            df_results = pd.concat([df_results, pd.DataFrame(new_row, index=[0])], ignore_index=True)
-            model.dispose()
+def run_future_scenarios_analysis(wind_cost_scenarios:list, pv_cost_scenarios:list,
+                                  h2_tank_cost_scenarios:list, h2_intraday_cost_scenarios:list,
+                                  instance_filename:str=os.path.join('Instances', 'stochastic_instance_2050.xlsx'),
+                                  results_filename:str=None, cache:SolveCache=None):
+    '''
+    Input:
+        *_cost_scenarios  - Relative changes of the investment costs, every combination is solved
+        instance_filename - Instance of the analysis, the model is built once and only the
+                            objective coefficients of the build decisions change between scenarios
+        results_filename  - SQLite file where each row is stored as soon as it is solved (see ResultsStore),
+                            combinations already in the file are not solved again
+        cache             - If given, combinations solved before are taken from the cache of solves (see SolveCache)
+    '''
+    gp.setParam("LogToConsole", 0)
+    time_start = time.perf_counter()
+
+    # Create model from instance
+    model = ModelMOPTA(InstanceMOPTA(instance_filename))
+
+    columns = (['wind_cost_scenario', 'pv_cost_scenario', 
+                'h2_tank_cost_scenario','h2_intraday_cost_scenario',
+                'investment_solar', 'investment_wind',
+                'investment_storage_gas','investment_storage_liquid',
+                'investment_cost', 'operational_cost',
+                'Sol_wind', 'Sol_pv', 'Sol_h2_tank', 'Sol_h2_intraday']
+               + [f"operational_cost_{s}" for s in model.inst.Scenarios]
+               + ['runtime_mip', 'time_point'])
+
+    # Neighbouring cost scenarios are solved one after the other and the build decisions of
+    # the previous scenario are the MIP start of the next one
+    axes = (wind_cost_scenarios, pv_cost_scenarios, h2_tank_cost_scenarios, h2_intraday_cost_scenarios)
+    grid = list(itertools.product(*axes))
+    points = serpentine_grid(*axes)
+    store = None if (results_filename is None) else ResultsStore(results_filename, columns[:4])
+    if store is not None:
+        stored = store.stored_points()
+        print(f"Points already stored = {sum(point_key(point) in stored for point in points)}/{len(points)}")
+        points = [point for point in points if point_key(point) not in stored]
+    start = None
+    rows = {}
+    for wind_cost, pv_cost, h2_tank_cost, h2_intraday_cost in points:
+        print(f"Wind = {wind_cost} | PV = {pv_cost} | H2 Tank = {h2_tank_cost} | H2 Intraday = {h2_intraday_cost}")
+
+        # Update Investment Cost Parameter
+        model.set_investment_cost_multipliers(wind_cost, pv_cost, h2_tank_cost, h2_intraday_cost)
+        record = None
+        if cache is not None:
+            key = cache.key(model.inst, analysis='future_scenario_point', **model.options)
+            record = cache.get(key)
+        if record is not None:
+            print(f"Solve cache hit {key[:12]}")
+            # The build decisions of the entry are the MIP start of the next solve
+            new_row, start = record['row'], record['build']
+        else:
+            new_row = solve_future_scenario_point(model, wind_cost, pv_cost, h2_tank_cost, h2_intraday_cost, start)
+            start = model.get_build_values()
+            if cache is not None:
+                cache.put(key, {'row': new_row, 'build': start})
+
+        rows[(wind_cost, pv_cost, h2_tank_cost, h2_intraday_cost)] = new_row
+        if store is not None:
+            store.append(new_row)
+
+    if store is not None:
+        df = store.read(grid).reindex(columns=columns)
+        store.close()
+    else:
+        # Rows in the order of the grid
+        df = pd.DataFrame([rows[point] for point in grid], columns=columns)
+    df.attrs['telemetry'] = driver_telemetry('run_future_scenarios_analysis', time_start, df, model, instance_filename=instance_filename,
+                                             points=len(grid), solved=len(points))
+    model.dispose()
+    return df
+
+def run_time_aggregation_analysis(inst:InstanceMOPTA, num_days_list:list, sparse:bool=True):
+    '''
+    Compare the model over representative days (see InstanceMOPTA.aggregate_days) with the full model
+    Input:
+        inst          - Instance over the full horizon
+        num_days_list - Numbers of representative days to compare
+        sparse        - Formulation of the flows (see ModelMOPTA)
+    Output:
+        Dataframe with the profile error of the clustering, the error of the objective, the relative
+        cost of the aggregated build decisions in the full model and the speedup of each number of days
+    '''
+    gp.setParam("LogToConsole", 0)
 
-    return df_results
+    time_full_start = time_start = time.perf_counter()
+    model = ModelMOPTA(inst, sparse=sparse)
+    model.optimize()
+    run_optimality_check(model)
+    time_full = time.perf_counter() - time_start
+    obj_full = model.ObjVal
+    profiles = inst.day_profiles()
+    days = list(inst.startPeriodOfDay.sort_values().index)
+
+    rows = []
+    for num_days in num_days_list:
+        print(f"Representative days = {num_days}")
+        time_start = time.perf_counter()
+        inst_agg = inst.aggregate_days(num_days)
+        model_agg = ModelMOPTA(inst_agg, sparse=sparse)
+        model_agg.optimize()
+        run_optimality_check(model_agg)
+        time_agg = time.perf_counter() - time_start
+
+        # Profiles of the original days against the ones of their representative days
+        medoids = [days.index(inst_agg.dayMedoid[d]) for d in inst_agg.daySequence]
+        profile_rmse = np.sqrt(np.mean((profiles - profiles[medoids])**2))
+
+        # Cost of the aggregated build decisions over the full horizon
+        model.fix_build(model_agg.get_build_values())
+        model.optimize()
+        obj_build = model.ObjVal if (model.Status == GRB.OPTIMAL) else np.inf
+        model.fix_build(None)
+
+        rows.append({'num_days': num_days, 'profile_rmse': profile_rmse,
+                     'objective': model_agg.ObjVal, 'objective_error': (model_agg.ObjVal - obj_full) / obj_full,
+                     'objective_build_full': obj_build, 'build_regret': (obj_build - obj_full) / obj_full,
+                     'time_full': time_full, 'time_aggregated': time_agg, 'speedup': time_full / time_agg})
+        print(f"Objective error = {rows[-1]['objective_error']:.2%} | Regret = {rows[-1]['build_regret']:.2%} | Speedup = {rows[-1]['speedup']:.1f}x")
+        model_agg.dispose()
+
+    df = pd.DataFrame(rows)
+    df.attrs['telemetry'] = driver_telemetry('run_time_aggregation_analysis', time_full_start, df, model, num_days_list=list(num_days_list), sparse=sparse)
+    model.dispose()
+    return df
+
+def run_rolling_horizon(inst:InstanceMOPTA, build:dict, window_days:int=7, lookahead_days:int=1,
+                        initial_soc:dict=None, budget:str='proportional', sparse:bool=True, vectorized:bool=False):
+    '''
+    Operational dispatch of fixed build decisions solved over windows of consecutive days, only one
+    window model exists at a time. Each window commits its first window_days days and looks ahead over
+    the next lookahead_days ones, the liquid state of charge and the loss of load budget left unused by
+    the committed days carry over to the next window.
+    Input:
+        inst           - Instance over the full horizon, the stitched solution is loaded into it
+        build          - Values of each build family, as given by ModelMOPTA.get_build_values
+        window_days    - Number of committed days of each window
+        lookahead_days - Number of look-ahead days of each window
+        initial_soc    - Dictionary of the liquid state of charge at the start of the horizon for each tank
+                         and scenario, if None it is chosen by the first window and the last window must
+                         end at least at that level, as in the cyclic condition of the full model
+        budget         - Loss of load budget of each window, 'proportional' (share of the horizon budget
+                         proportional to the demand of the window plus the budget left unused so far) or
+                         'remaining' (whole budget not used by the previous windows)
+        sparse         - Formulation of the flows (see ModelMOPTA)
+        vectorized     - Assembly of the window models (see ModelMOPTA)
+    Output:
+        Dataframe with the committed days, objective, operational cost of the committed days and
+        runtime of each window
+    '''
+    assert (window_days >= 1) and (lookahead_days >= 0), f'Windows must commit at least one day and look ahead a non-negative number of days.'
+    assert (budget in ['proportional', 'remaining']), f"Budget '{budget}' must be 'proportional' or 'remaining'."
+    gp.setParam("LogToConsole", 0)
+    time_start = time.perf_counter()
+    days = list(inst.startPeriodOfDay.sort_values().index)
+    families = [name for name in SOLUTION_LEVELS if name not in BUILD_FAMILIES]
+    frames = {name: [] for name in families}
+    scenarios = list(inst.Scenarios)
+    # Loss of load budget of each scenario not used yet, and share of the committed days left unused
+    perc = {'Electricity': inst.maxLossLoadElectricity, 'Gas': inst.maxLossLoadGas}
+    demand = {'Electricity': inst.demandElectricity[inst.demandElectricity.index.get_level_values('vertex').isin(inst.LoadNodes)],
+              'Gas': inst.demandGas[inst.demandGas.index.get_level_values('vertex').isin(inst.IndustrialNodes)]}
+    remaining = {network: dict.fromkeys(scenarios, perc[network] * demand[network].sum()) for network in perc}
+    carry = {network: dict.fromkeys(scenarios, 0.0) for network in perc}
+    soc = initial_soc
+
+    rows = []
+    for k in range(0, len(days), window_days):
+        committed = days[k:k+window_days]
+        window = inst.day_window(days[k:k+window_days+lookahead_days])
+        periods = window.df_day_of_period.index[window.df_day_of_period['day_of_period'].isin(committed)]
+        print(f"Window of days {committed[0]}-{committed[-1]} | Look-ahead = {len(window.Days) - len(committed)} days")
+
+        model = ModelMOPTA(window, sparse=sparse, vectorized=vectorized)
+        model.fix_build(build)
+        # Without initial state, a first window that reaches the end of the horizon keeps the cyclic
+        # condition and later ones that reach it must end at least at the state the first one started from
+        is_first, reaches_end = (k == 0), (k + window_days + lookahead_days >= len(days))
+        is_cyclic = is_first and reaches_end and (initial_soc is None)
+        if not is_cyclic:
+            model.fix_initial_storage_liquid(soc)
+        if reaches_end and (not is_first) and (initial_soc is None):
+            model.bound_final_storage_liquid(start_soc)
+        # Loss of load budget of the window, never more than the budget not used yet
+        for network in perc:
+            share = perc[network] * getattr(model, f'totalDemand{network}')
+            rhs = [remaining[network][s] if (budget == 'remaining') else min(max(share + carry[network][s], 0), remaining[network][s]) for s in scenarios]
+            constrs = getattr(model, f'CmaxLossLoad{network}')
+            model.setAttr('RHS', [constrs[s] for s in scenarios], rhs)
+        model.optimize()
+        assert (model.Status == GRB.OPTIMAL), f'Window starting on day {committed[0]} ended with status {model.Status}, a longer look-ahead may be needed.'
+
+        # Keep the committed periods only
+        model.load_solution_inst(families)
+        for name in families:
+            frame = getattr(window, name)
+            frames[name].append(frame[frame.index.get_level_values('Time Period').isin(periods)])
+
+        # Loss of load of the committed periods
+        for network in perc:
+            used = frames[f'lossLoad{network}'][-1].groupby(level='Scenario').sum().iloc[:,0]
+            committed_demand = demand[network][demand[network].index.get_level_values('time_period').isin(periods)].sum()
+            for s in scenarios:
+                remaining[network][s] = max(remaining[network][s] - used[s], 0.0)
+                carry[network][s] += perc[network] * committed_demand - used[s]
+
+        if is_first:
+            start_soc = window.storageLiquidSoc.xs(periods.min(), level='Time Period').iloc[:,0].to_dict()
+
+        # State of charge at the start of the first period after the committed ones
+        t_end = periods.max()
+        end = {name: getattr(window, name).xs(t_end, level='Time Period').iloc[:,0] for name in ['storageLiquidSoc', 'storageLiquidCharge', 'storageLiquidDischarge']}
+        soc = {(i, s): (1 - inst.selfDischargeStorageLiquid[i]) * end['storageLiquidSoc'][i,s]
+                       + inst.effChargingStorageLiquid[i] * end['storageLiquidCharge'][i,s]
+                       - end['storageLiquidDischarge'][i,s] / inst.effDischargingStorageLiquid[i]
+               for i in inst.TankNodes for s in scenarios}
+
+        cost = sum(inst.scenarioWeight[s] * (inst.costStorageGas * frames['storageGasSoc'][-1].xs(s, level='Scenario').values.sum()
+                                             + inst.costStorageLiquid * frames['storageLiquidSoc'][-1].xs(s, level='Scenario').values.sum())
+                   for s in scenarios)
+        rows.append({'first_day': committed[0], 'last_day': committed[-1], 'lookahead_days': len(window.Days) - len(committed),
+                     'objective': model.ObjVal, 'operational_cost': cost, 'runtime': model.Runtime})
+        model.dispose()
+
+    # Stitch the committed periods of every window, with the build decisions fixed in them
+    for name in BUILD_FAMILIES:
+        setattr(inst, name, solution_frame(inst, name, np.round(build[name]), sparse=False))
+    for name in families:
+        setattr(inst, name, pd.concat(frames[name]).reindex(solution_index(inst, name)))
+    inst.is_solution_loaded = True
+    inst.optimality_status = 'Optimal'
+
+    rows = pd.DataFrame(rows)
+    print(f"Operational cost = {rows['operational_cost'].sum():g}")
+    rows.attrs['telemetry'] = driver_telemetry('run_rolling_horizon', time_start, rows, window_days=window_days,
+                                               lookahead_days=lookahead_days, budget=budget, sparse=sparse, vectorized=vectorized)
+    return rows
+
+def read_investment_analysis(data_filename:str):
+    # Results of run_future_scenarios_analysis with cost changes in %
+    df = pd.read_csv(data_filename)
+    df['wind_cost_scenario'] = df['wind_cost_scenario'] * 100
+    df['pv_cost_scenario'] = df['pv_cost_scenario'] * 100
+    return df
 
 def plot_investment_analysis(data_filename:str='Investment Analysis/future_cases_analysis_wind_vs_pv.csv',
                              z_name:str='Sol_wind',
                              z_title = '# Turbines Build \n in Optimal Solution',
                              fig_filename:str = "Investment Analysis/Turbines_w_changes_wind_pv.pdf",
                              num_tol:int=0.00001):
-    # Read data and save column names
-    df = pd.read_csv(data_filename)
-    x_name = 'wind_cost_scenario'
-    y_name = 'pv_cost_scenario'
-    df[x_name] = df[x_name] * 100
-    df[y_name] = df[y_name] * 100
-
-    # 2D-arrays from DataFrame
-    x1 = np.linspace(df[x_name].min(), df[x_name].max(), len(df[x_name].unique()))
-    y1 = np.linspace(df[y_name].min(), df[y_name].max(), len(df[y_name].unique()))
-    x, y = np.meshgrid(x1, y1)
-
-    n_row, n_col = x.shape
-    z = np.absolute(np.array([[float(df.loc[(np.abs(df[x_name]-x[i,j])<num_tol) & (np.abs(df[y_name]-y[i,j])<num_tol), z_name])
-                                for j in range(n_col)] for i in range(n_row)]))    
-    # Set up axes and put data on the surface
-    fig = plt.figure()
-    axes = fig.add_subplot(projection='3d')
-    axes.plot_surface(x, y, z, cmap='RdYlGn')
-
-    # Customize labels
-    axes.set_xlabel('Change in Wind \n Investement Cost (%)')
-    axes.set_ylabel('\n Change in PV \n Investement Cost  (%)')
-    axes.set_title(z_title) 
-
-    plt.savefig(fig_filename, bbox_inches='tight', pad_inches=0.3)
-    plt.close()
+    # Read data and build the 2D-arrays of the surface
+    df = read_investment_analysis(data_filename)
+    x, y, z = surface_grid(df, 'wind_cost_scenario', 'pv_cost_scenario', [z_name], num_tol)
+    plot_surface(x, y, np.absolute(z[z_name]), 'RdYlGn', 'Change in Wind \n Investement Cost (%)',
+                 '\n Change in PV \n Investement Cost  (%)', z_title, fig_filename)
+
+def plot_investment_analysis_batch(data_filename:str='Investment Analysis/future_cases_analysis_wind_vs_pv.csv',
+                                   figures:list=[('Sol_wind', '# Turbines Build \n in Optimal Solution', 'Investment Analysis/Turbines_w_changes_wind_pv.pdf')],
+                                   num_workers:int=None, num_tol:int=0.00001):
+    '''
+    Plot several surfaces of an investment analysis, reading its results once
+    Input:
+        figures     - (z_name, z_title, fig_filename) of each figure
+        num_workers - Number of processes rendering the figures (see render_surfaces)
+    Output:
+        Names of the files of the figures
+    '''
+    df = read_investment_analysis(data_filename)
+    x, y, z = surface_grid(df, 'wind_cost_scenario', 'pv_cost_scenario', list(dict.fromkeys(z_name for z_name, _, _ in figures)), num_tol)
+    tasks = [(x, y, np.absolute(z[z_name]), 'RdYlGn', 'Change in Wind \n Investement Cost (%)',
+              '\n Change in PV \n Investement Cost  (%)', z_title, fig_filename)
+             for z_name, z_title, fig_filename in figures]
+    return render_surfaces(tasks, num_workers)
 
 ### END
\ No newline at end of file
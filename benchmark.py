@@ -0,0 +1,274 @@
+"""
+@author: Bárbara Rodrigues, Daniel Kopisitskiy, Denise Cariaga Sandoval
+@project: MOPTA Competition 2024 Project
+
+Performance benchmark of the model stages over the instances, usage:
+    python benchmark.py run --output benchmark.json [--instances Instances/*.xlsx synthetic:num_loads=50,num_days=7] [--scales 1,1,1 2,1,1]
+    python benchmark.py compare baseline.json benchmark.json [--threshold 0.2]
+"""
+# User-defined Libraries
+from auxiliary import InstanceMOPTA, AggregateCubeMOPTA, create_model, read_instance_sheets, status_name, synthetic_instance_sheets, peak_rss_mb
+# Python Libraries
+import gurobipy as gp
+import pandas as pd
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+
+#-------------------------------------------------------------------------------
+# Measurement of the Stages
+#-------------------------------------------------------------------------------
+
+def current_rss_mb():
+    # Resident memory of the process, /proc is only read on Linux
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        return peak_rss_mb() or 0.0
+
+class StageTimer():
+    def __init__(self, interval:float=0.01):
+        '''
+        Wall time and peak resident memory of a stage, memory is sampled in a background thread
+        so that the allocations of Gurobi are measured as well
+        Input:
+            interval - Seconds between memory samples
+        '''
+        self.interval = interval
+        self.stages = {}
+
+    def measure(self, name:str, func, *args, **kwds):
+        '''
+        Input:
+            name - Name of the stage
+            func - Function run by the stage, with its arguments
+        Output:
+            Value returned by the function
+        '''
+        start_rss = current_rss_mb()
+        peak = [start_rss]
+        done = threading.Event()
+        def sample():
+            while not done.wait(self.interval):
+                peak[0] = max(peak[0], current_rss_mb())
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwds)
+        finally:
+            elapsed = time.perf_counter() - start
+            done.set()
+            sampler.join()
+            peak[0] = max(peak[0], current_rss_mb())
+            self.stages[name] = {'time': elapsed, 'peak_rss_mb': peak[0], 'delta_rss_mb': peak[0] - start_rss}
+
+#-------------------------------------------------------------------------------
+# Scaled Copies of the Instances
+#-------------------------------------------------------------------------------
+
+# Columns of the sheets holding node ids, periods and scenarios
+NODE_COLUMNS = {'vertices': ['vertex_id'], 'solar_params': ['solar_panel_id'], 'wind_params': ['wind_turbine_id'],
+                'electrolyzer_params': ['electrolyzer_id'], 'tank_params': ['liquid_tank_id'], 'fuelcell_params': ['fuel_cell_id'],
+                'electricityloads': ['electricity_loads_id'], 'industrialloads': ['industrial_loads_id'],
+                'electricity_edges': ['vertex_from', 'vertex_to'], 'gas_edges': ['vertex_from', 'vertex_to'],
+                'liquid_edges': ['vertex_from', 'vertex_to'], 'electricity_demand': ['vertex'], 'gas_demand': ['vertex'],
+                'solar_generation': ['vertex'], 'wind_generation': ['vertex']}
+PERIOD_COLUMNS = {'time_params': ['time_period_id'], 'day_params': ['start_time_period', 'end_time_period'],
+                  'electricity_demand': ['time_period'], 'gas_demand': ['time_period'],
+                  'solar_generation': ['time_period'], 'wind_generation': ['time_period']}
+DAY_COLUMNS = {'time_params': ['day_of_period'], 'day_params': ['day_id']}
+SCENARIO_COLUMNS = {'scenario_params': ['scenario_id'], 'solar_generation': ['scenario'], 'wind_generation': ['scenario']}
+
+def replicate(sheets:dict, columns:dict, offset:int, copies:int):
+    # Sheets with the given columns shifted by offset in each copy
+    sheets = dict(sheets)
+    for sheet, names in columns.items():
+        df = sheets[sheet]
+        sheets[sheet] = pd.concat([df.assign(**{name: df[name] + k * offset for name in names}) for k in range(copies)],
+                                  ignore_index=True)
+    return sheets
+
+def scale_sheets(sheets:dict, nodes:int=1, days:int=1, scenarios:int=1):
+    '''
+    Input:
+        sheets    - Dictionary of dataframes for each sheet of an instance
+        nodes     - Number of disjoint copies of the network
+        days      - Number of times the horizon is repeated
+        scenarios - Number of copies of each scenario, weights are split between the copies
+    Output:
+        Dictionary of dataframes of the scaled instance
+    '''
+    sheets = replicate(sheets, NODE_COLUMNS, int(sheets['vertices']['vertex_id'].max()), nodes)
+    if days > 1:
+        num_periods = int(sheets['time_params']['time_period_id'].max())
+        num_days = int(sheets['day_params']['day_id'].max())
+        for sheet in PERIOD_COLUMNS:
+            df = sheets[sheet]
+            shifted = [df.assign(**{name: df[name] + k * num_periods for name in PERIOD_COLUMNS[sheet]},
+                                 **{name: df[name] + k * num_days for name in DAY_COLUMNS.get(sheet, [])}) for k in range(days)]
+            sheets[sheet] = pd.concat(shifted, ignore_index=True)
+    if scenarios > 1:
+        copies = replicate(sheets, SCENARIO_COLUMNS, int(sheets['scenario_params']['scenario_id'].max()), scenarios)
+        df = copies['scenario_params']
+        names = df['scenario_name'].astype(str) + [f' ({k+1})' for k in range(scenarios) for _ in range(len(sheets['scenario_params']))]
+        copies['scenario_params'] = df.assign(percent_weight=df['percent_weight'] / scenarios, scenario_name=names)
+        sheets = copies
+    return sheets
+
+#-------------------------------------------------------------------------------
+# Benchmark Runs
+#-------------------------------------------------------------------------------
+
+def instance_sheets(source:str, use_cache:bool):
+    '''
+    Input:
+        source - Name of an xlsx instance file, or 'synthetic:' followed by key=value arguments of
+                 synthetic_instance_sheets separated by commas
+    '''
+    if source.startswith('synthetic:'):
+        params = dict(item.split('=') for item in source[len('synthetic:'):].split(',') if item)
+        return synthetic_instance_sheets(**{key: float(value) if key == 'edge_density' else int(value) for key, value in params.items()})
+    return read_instance_sheets(source, use_cache)
+
+def run_case(filename:str, scale:tuple, sparse:bool, vectorized:bool, time_limit:float, use_cache:bool):
+    '''
+    Input:
+        filename - Name of the xlsx instance file or synthetic instance (see instance_sheets)
+        scale    - Copies of the (nodes, days, scenarios) of the instance (see scale_sheets)
+    Output:
+        Dictionary with the measures of each stage, later stages are skipped if the model has no solution
+    '''
+    timer = StageTimer()
+    case = {'instance': filename, 'scale': dict(zip(['nodes', 'days', 'scenarios'], scale)), 'stages': timer.stages}
+    try:
+        inst = timer.measure('load', lambda: InstanceMOPTA.from_sheets(scale_sheets(instance_sheets(filename, use_cache), *scale)))
+        model = timer.measure('construction', create_model, inst, sparse=sparse, vectorized=vectorized)
+        case['families'] = dict(model.buildTimes)
+        case['size'] = {'vars': model.NumVars, 'constrs': model.NumConstrs, 'nonzeros': model.NumNZs}
+
+        model.setParam('OutputFlag', 0)
+        model.setParam('TimeLimit', time_limit)
+        timer.measure('optimize', model.optimize, phase_times=True)
+        case['status'] = status_name(model.Status)
+        case['runtime'] = model.Runtime
+        case['telemetry'] = model.telemetry()
+        if model.SolCount == 0:
+            return case
+        case['objective'] = model.ObjVal
+
+        LPmodel = timer.measure('fixed_lp', lambda: model.fixed_lp())
+        timer.measure('fixed_lp_optimize', LPmodel.optimize)
+        timer.measure('load_solution_inst', model.load_solution_inst)
+        timer.measure('page_aggregation', AggregateCubeMOPTA, inst)
+    except gp.GurobiError as e:
+        # Size limited licenses stop large cases, the rest of the suite still runs
+        case['error'] = str(e)
+    return case
+
+def run_benchmark(instances:list, scales:list, sparse:bool=True, vectorized:bool=False, time_limit:float=600,
+                  use_cache:bool=False):
+    '''
+    Input:
+        instances - Names of the xlsx instance files or synthetic instances (see instance_sheets)
+        scales    - List of (nodes, days, scenarios) copies, each instance is run at every scale
+    Output:
+        Dictionary with the environment of the run and the measures of each case
+    '''
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    results = {'created': datetime.datetime.now().isoformat(timespec='seconds'), 'commit': commit,
+               'python': platform.python_version(), 'gurobi': '.'.join(map(str, gp.gurobi.version())),
+               'platform': platform.platform(), 'options': {'sparse': sparse, 'vectorized': vectorized, 'time_limit': time_limit},
+               'cases': {}}
+    for filename in instances:
+        for scale in scales:
+            base = filename if filename.startswith('synthetic:') else os.path.splitext(os.path.basename(filename))[0]
+            name = f"{base}@{'x'.join(map(str, scale))}"
+            print(f"Running {name}")
+            results['cases'][name] = run_case(filename, scale, sparse, vectorized, time_limit, use_cache)
+            stages = results['cases'][name]['stages']
+            print('    ' + ', '.join(f"{stage} {measure['time']:.2f}s" for stage, measure in stages.items()))
+    return results
+
+#-------------------------------------------------------------------------------
+# Comparison with a Baseline
+#-------------------------------------------------------------------------------
+
+def compare_benchmarks(baseline:dict, current:dict, threshold:float=0.2, min_time:float=0.05, min_memory:float=10):
+    '''
+    Input:
+        threshold  - Relative increase over the baseline flagged as a regression
+        min_time   - Increases of time below these seconds are noise
+        min_memory - Increases of peak memory below these MB are noise
+    Output:
+        DataFrame with one row per (case, measure) present in both runs, and whether it regressed
+    '''
+    rows = []
+    for name, case in current['cases'].items():
+        base = baseline['cases'].get(name)
+        if base is None:
+            continue
+        measures = [(f'{stage}.time', min_time, case['stages'][stage]['time'], base['stages'][stage]['time'])
+                    for stage in case['stages'] if stage in base['stages']]
+        measures += [(f'{stage}.delta_rss_mb', min_memory, case['stages'][stage]['delta_rss_mb'], base['stages'][stage]['delta_rss_mb'])
+                     for stage in case['stages'] if stage in base['stages']]
+        measures += [(f'family.{family}', min_time, value, base['families'][family])
+                     for family, value in case.get('families', {}).items() if family in base.get('families', {})]
+        for measure, noise, value, base_value in measures:
+            rows.append({'case': name, 'measure': measure, 'baseline': base_value, 'current': value,
+                         'ratio': value / base_value if base_value > 0 else float('inf'),
+                         'regression': (value > (1 + threshold) * base_value) and (value - base_value > noise)})
+    return pd.DataFrame(rows, columns=['case', 'measure', 'baseline', 'current', 'ratio', 'regression'])
+
+#-------------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the load, construction, solve and extraction of the model.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='Run the benchmark and write its results')
+    run.add_argument('--instances', nargs='+', default=sorted(glob.glob(os.path.join('Instances', '*.xlsx'))))
+    run.add_argument('--scales', nargs='+', default=['1,1,1'], help='Copies of nodes,days,scenarios of each instance')
+    run.add_argument('--dense', action='store_true', help='Flow variables for every pair of nodes')
+    run.add_argument('--vectorized', action='store_true', help='Constraints built with the matrix API')
+    run.add_argument('--time-limit', type=float, default=600)
+    run.add_argument('--use-cache', action='store_true', help='Read instances through the parsed sheets cache')
+    run.add_argument('--output', default='benchmark.json')
+
+    compare = commands.add_parser('compare', help='Flag regressions of a run against a baseline')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=0.2)
+    compare.add_argument('--min-time', type=float, default=0.05)
+    compare.add_argument('--min-memory', type=float, default=10)
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        scales = [tuple(int(k) for k in scale.split(',')) for scale in args.scales]
+        assert all(len(scale) == 3 and min(scale) >= 1 for scale in scales), f'Scales must be three positive integers nodes,days,scenarios.'
+        results = run_benchmark(args.instances, scales, not args.dense, args.vectorized, args.time_limit, args.use_cache)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        df = compare_benchmarks(baseline, current, args.threshold, args.min_time, args.min_memory)
+        regressions = df[df['regression']]
+        print(regressions.to_string(index=False) if len(regressions) else 'No regressions.')
+        sys.exit(1 if len(regressions) else 0)
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 # User-defined Libraries
-from auxiliary import InstanceMOPTA, ModelMOPTA, run_optimality_check
+from auxiliary import InstanceMOPTA, SolveCache, SolveJobManager, CUBE_FAMILIES
 # Python Libraries
 import os
 import streamlit as st
@@ -14,8 +14,14 @@ if 'inst_type' not in st.session_state:
     st.session_state.inst_type = 'default'
 if 'inst_filename' not in st.session_state:
     st.session_state.inst_filename = 'Instances\stochastic_instance_100_panels_20_percent.xlsx' #'Instances\stochastic_instance.xlsx' #'Instances\deterministic_instance.xlsx'
+def set_instance_data(inst):
+    # Fingerprints are computed once per loaded or solved instance, the visualization pages key their caches on them
+    st.session_state.inst_data = inst
+    st.session_state.inst_fingerprints = (inst.fingerprint(), inst.solution_fingerprint(CUBE_FAMILIES))
 if 'inst_data' not in st.session_state:
-    st.session_state.inst_data = InstanceMOPTA(st.session_state.inst_filename)
+    set_instance_data(InstanceMOPTA(st.session_state.inst_filename))
+if 'job_id' not in st.session_state:
+    st.session_state.job_id = None
 
 #-------------------------------------------------------------------------------
 st.set_page_config(page_title="Data Input", page_icon=":eye:",
@@ -29,34 +35,53 @@ instance_type = st.radio("What type of instance do you want to use?",
                          captions = ["As described in the project's report.", "A file must be uploaded first."])
 
 def update_instance_data():
-    st.session_state.inst_data = InstanceMOPTA(st.session_state.inst_filename)
+    # The solve of the previous instance is no longer needed
+    cancel_model()
+    set_instance_data(InstanceMOPTA(st.session_state.inst_filename))
+
+@st.cache_resource
+def get_job_manager():
+    # Background solves shared by every session of the server, solutions are persisted on disk
+    return SolveJobManager(SolveCache())
 
-@st.cache_data
 def run_model():
-    # Run model and stora solution
-    inst_data = st.session_state.get('inst_data')
-    model = ModelMOPTA(inst_data)
-
-    model.optimize()
-    run_optimality_check(model)
-    # Load solution to inst_data
-    model.load_solution_inst()
-    inst_data = model.inst 
-    
-    # Fix integer variables to compute duals
-    LPmodel = model.fixed()
-    # Re-run model
-    LPmodel.optimize()
-    run_optimality_check(LPmodel)
-
-    # Export duals to instance
-    inst_data.duals_E = pd.DataFrame.from_dict({s: LPmodel.getConstrByName(f"CmaxLossLoadElectricity[{s}]").Pi
-                                                for s in model.inst.Scenarios}, orient='index')
-    inst_data.duals_G = pd.DataFrame.from_dict({s: LPmodel.getConstrByName(f"CmaxLossLoadGas[{s}]").Pi
-                                                for s in model.inst.Scenarios}, orient='index')
-    
-    st.session_state.inst_data = inst_data
-    
+    # Solve in the background, keyed on the content of the instance so that known instances load instantly
+    if st.session_state.job_id is None:
+        st.session_state.job_id = get_job_manager().submit(st.session_state.inst_data, store_frames=True)
+
+def cancel_model():
+    if st.session_state.job_id is not None:
+        get_job_manager().cancel(st.session_state.job_id)
+        get_job_manager().forget(st.session_state.job_id)
+        st.session_state.job_id = None
+
+@st.fragment(run_every=1)
+def show_solve_progress():
+    manager = get_job_manager()
+    if not manager.has_job(st.session_state.job_id):
+        # The manager was rebuilt (cleared cache or reloaded code) and the job with it
+        st.session_state.solve_lost = True
+        st.session_state.job_id = None
+        st.rerun()
+    progress = manager.progress(st.session_state.job_id)
+    if progress['state'] in ['queued', 'running']:
+        col1, col2, col3, col4, col5 = st.columns(5)
+        col1.metric(label="Solve", value=progress['state'].capitalize())
+        col2.metric(label="Elapsed", value=f"{progress['elapsed']:.0f} s")
+        col3.metric(label="MIP Gap", value='-' if progress['gap'] is None else f"{progress['gap']:.2%}")
+        col4.metric(label="Incumbent", value='-' if progress['incumbent'] is None else f"{progress['incumbent']:,.0f}")
+        col5.metric(label="Bound", value='-' if progress['bound'] is None else f"{progress['bound']:,.0f}")
+        st.button('Cancel Solve', on_click=cancel_model)
+    else:
+        # Finished solve, its solution replaces the instance of the session
+        if progress['state'] == 'done':
+            set_instance_data(manager.job(st.session_state.job_id).inst)
+        elif progress['state'] == 'failed':
+            st.session_state.solve_error = progress['error']
+        manager.forget(st.session_state.job_id)
+        st.session_state.job_id = None
+        st.rerun()
+
 if instance_type == "**User-defined Data**":
     #-------------------------------------------------------------------------------
     st.subheader('User-defined Data')
@@ -90,5 +115,13 @@ st.write("Computing the solution might take a few minutes for the default instan
 
 col1, col2, col3 = st.columns(3)
 col1.button('Update and View Data', on_click=update_instance_data, use_container_width=True)
-col2.button('Compute and View Solution', on_click=run_model, type="primary", use_container_width=True)
-col2.metric(label="Status", value=st.session_state.inst_data.optimality_status)
\ No newline at end of file
+col2.button('Compute and View Solution', on_click=run_model, type="primary", use_container_width=True,
+            disabled=(st.session_state.job_id is not None))
+col2.metric(label="Status", value=st.session_state.inst_data.optimality_status)
+
+if st.session_state.job_id is not None:
+    show_solve_progress()
+if st.session_state.get('solve_error') is not None:
+    st.error(f"The solve failed: {st.session_state.pop('solve_error')}")
+if st.session_state.pop('solve_lost', False):
+    st.warning("The solve was lost when the server was reloaded, please resubmit it with 'Compute and View Solution'.")
\ No newline at end of file
@@ -1,18 +1,19 @@
+# User-defined Libraries
+from auxiliary import AggregateCubeMOPTA, CUBE_FAMILIES
 # Python Libraries
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
 
 #-------------------------------------------------------------------------------
 # Auxiliary Functions
-# Function to get the day for each time_period
-def get_day(row):
-    inst_data = st.session_state.get('inst_data')
-    df = pd.concat([inst_data.startPeriodOfDay, inst_data.endPeriodOfDay], axis=1).reset_index()
-    for index, df_row in df.iterrows():
-        if df_row['start_time_period'] <= row['time_period'] <= df_row['end_time_period']:
-            return df_row['day_id']
-    return None
+@st.cache_data(max_entries=8)
+def get_aggregate_cube(fingerprint, solution_fingerprint, _inst):
+    '''
+    Totals of the instance and its solution, built once per content of both
+    '''
+    return AggregateCubeMOPTA(_inst)
 
 #-------------------------------------------------------------------------------
 st.set_page_config(page_title="Data Visualization", page_icon=":zap:",
@@ -21,8 +22,12 @@ st.title('Data Visualization')
 
 # Gloabal Data Parameters
 inst_data = st.session_state.get('inst_data')
+if 'inst_fingerprints' not in st.session_state:
+    # Normally set by the Data Input page whenever the instance is loaded or solved
+    st.session_state.inst_fingerprints = (inst_data.fingerprint(), inst_data.solution_fingerprint(CUBE_FAMILIES))
+cube = get_aggregate_cube(*st.session_state.inst_fingerprints, inst_data)
 
-scenario_options = tuple(inst_data.Scenario_names['scenario_name'])
+scenario_options = tuple(cube.scenarioNames)
 electrolyzer_options = tuple(inst_data.ElectrolyzerNodes)
 tank_options = tuple(inst_data.TankNodes)
 
@@ -45,7 +50,7 @@ st.header('Renewable Generation')
 
 colA, colB, colC, colD = st.columns(4)
 scenario_renewable = colA.selectbox('Pick a scenario', scenario_options, key='scenario_renewable')
-scenario_renewable_id = inst_data.Scenario_names.loc[inst_data.Scenario_names['scenario_name'] == scenario_renewable]['scenario_id'].iloc[0]
+scenario_renewable_pos = scenario_options.index(scenario_renewable)
 
 #-------------------------------------------------------------------------------
 
@@ -53,17 +58,9 @@ col1, col2 = st.columns(2)
 col1.subheader('Solar Generation')
 col1.write('mean generation per solar panel row of installed capacity')
 
-# Create dataframe
-df = inst_data.generationSolar.groupby(level=[1,2]).mean().reset_index()
-max_solar = df['generation'].max()
-df = df.loc[df['scenario'] == scenario_renewable_id]
-# Create a new columns 'Day' and 'Time Period'
-df['Day'] = df.apply(get_day, axis=1)
-df['Time Period'] = df.groupby('Day').cumcount() + 1
-df = df.astype({'Day': 'str'})
-
-# Filter scenario selected and plot
-df = df.rename(columns={'generation': 'Generation (MWh/Panel Row)'})
+# Filter scenario selected with columns 'Day' and 'Time Period' and plot
+max_solar = cube.meanGenerationSolar.max()
+df = cube.day_frame(**{'Generation (MWh/Panel Row)': cube.meanGenerationSolar[scenario_renewable_pos]})
 fig = px.line(df, x="Time Period", y="Generation (MWh/Panel Row)", color="Day")
 fig.update_layout(yaxis=dict(range=[0, max_solar*1.2]))
 col1.plotly_chart(fig, theme="streamlit", use_container_width=True)
@@ -75,18 +72,9 @@ col2.write('mean generation per wind turbine of installed capacity')
 #colA, colB = col2.columns(2)
 #scenario_wind = colA.selectbox('Pick a scenario', scenario_options, key='scenario_wind')
 
-# Create dataframe
-df = inst_data.generationWind.groupby(level=[1,2]).mean().reset_index()
-max_wind = df['generation'].max()
-df = df.loc[df['scenario'] == scenario_renewable_id]
-
-# Create a new columns 'Day' and 'Time Period'
-df['Day'] = df.apply(get_day, axis=1)
-df['Time Period'] = df.groupby('Day').cumcount() + 1
-df = df.astype({'Day': 'str'})
-
-# Filter scenario selected and plot
-df = df.rename(columns={'generation': 'Generation (MWh/Turbine)'})
+# Filter scenario selected with columns 'Day' and 'Time Period' and plot
+max_wind = cube.meanGenerationWind.max()
+df = cube.day_frame(**{'Generation (MWh/Turbine)': cube.meanGenerationWind[scenario_renewable_pos]})
 fig = px.line(df, x="Time Period", y="Generation (MWh/Turbine)", color="Day")
 fig.update_layout(yaxis=dict(range=[0, max_wind+0.1]))
 col2.plotly_chart(fig, theme="streamlit", use_container_width=True)
@@ -104,22 +92,14 @@ colA, colB = col1.columns(2)
 load_type = colA.selectbox('Pick a type of area', ('All Areas', 'Residential Areas', 'Industrial Areas'), key='load_type')
 
 if load_type == 'Industrial Areas':
-    load_areas = list(inst_data.IndustrialNodes)
+    load_areas = cube.isIndustrial
 elif load_type == 'Residential Areas':
-    load_areas = [item for item in list(inst_data.LoadNodes) if item not in list(inst_data.IndustrialNodes)]
+    load_areas = ~cube.isIndustrial
 else:
-    load_areas = list(inst_data.LoadNodes)
-
-# Create dataframe with sum of demand for selected areas
-df = inst_data.demandElectricity
-df = df[df.index.isin(load_areas, level=0)]
-df = df.groupby(level=[1]).sum().reset_index()
-# Create a new columns 'Day' and 'Time Period'
-df['Day'] = df.apply(get_day, axis=1)
-df['Time Period'] = df.groupby('Day').cumcount() + 1
-df = df.astype({'Day': 'str'})
-# Plot data
-df = df.rename(columns={'demand': 'Demand (MWh)'})
+    load_areas = np.ones(len(cube.loadNodeIds), dtype=bool)
+
+# Create dataframe with sum of demand for selected areas and plot
+df = cube.day_frame(**{'Demand (MWh)': cube.demandElectricity[load_areas].sum(axis=0)})
 fig = px.line(df, x="Time Period", y="Demand (MWh)", color="Day")
 col1.plotly_chart(fig, theme="streamlit", use_container_width=True)
 
@@ -130,14 +110,8 @@ col2.write("##")
 col2.write("##")
 col2.write("##")
 
-# Create dataframe with sum of demand
-df = inst_data.demandGas.groupby(level=[1]).sum().reset_index()
-# Create a new columns 'Day' and 'Time Period'
-df['Day'] = df.apply(get_day, axis=1)
-df['Time Period'] = df.groupby('Day').cumcount() + 1
-df = df.astype({'Day': 'str'})
-# Plot data
-df = df.rename(columns={'demand': 'Demand (MWh)'})
+# Create dataframe with sum of demand and plot
+df = cube.day_frame(**{'Demand (MWh)': cube.demandGas})
 fig = px.line(df, x="Time Period", y="Demand (MWh)", color="Day")
 col2.plotly_chart(fig, theme="streamlit", use_container_width=True)
 
@@ -1,3 +1,5 @@
+# User-defined Libraries
+from auxiliary import AggregateCubeMOPTA, CUBE_FAMILIES
 # Python Libraries
 import streamlit as st
 import numpy as np
@@ -15,16 +17,12 @@ def millify(n):
 
     return '{:.0f}{}'.format(n / 10**(3 * millidx), millnames[millidx])
 
-def get_day(row):
+@st.cache_data(max_entries=8)
+def get_aggregate_cube(fingerprint, solution_fingerprint, _inst):
     '''
-    Function to get the day for each time_period
+    Totals of the instance and its solution, built once per content of both
     '''
-    inst_data = st.session_state.get('inst_data')
-    df = pd.concat([inst_data.startPeriodOfDay, inst_data.endPeriodOfDay], axis=1).reset_index()
-    for index, df_row in df.iterrows():
-        if df_row['start_time_period'] <= row['Time Period'] <= df_row['end_time_period']:
-            return df_row['day_id']
-    return None
+    return AggregateCubeMOPTA(_inst)
    
 #-------------------------------------------------------------------------------
 st.set_page_config(page_title="Solution Visualization", page_icon=":bulb:",
@@ -40,10 +38,15 @@ if inst_data.is_solution_loaded == False:
     st.page_link("pages/1_Data Input.py", label="Data Input", icon="👁️")
 else:
     #-------------------------------------------------------------------------------
-    scenario_options = tuple(inst_data.Scenario_names['scenario_name'])
+    if 'inst_fingerprints' not in st.session_state:
+        # Normally set by the Data Input page whenever the instance is loaded or solved
+        st.session_state.inst_fingerprints = (inst_data.fingerprint(), inst_data.solution_fingerprint(CUBE_FAMILIES))
+    cube = get_aggregate_cube(*st.session_state.inst_fingerprints, inst_data)
+
+    scenario_options = tuple(cube.scenarioNames)
     #day_options = tuple(['All']) + tuple(inst_data.Days)
-    electrolyzer_options = tuple(inst_data.ElectrolyzerNodes)
-    tank_options = tuple(inst_data.TankNodes)
+    electrolyzer_options = tuple(cube.electrolyzerIds)
+    tank_options = tuple(cube.tankIds)
 
     #-------------------------------------------------------------------------------
     st.header('Costs Breakdown')
@@ -57,10 +60,10 @@ else:
     total_investment = cost_build_solar + cost_build_wind + cost_build_storage_gas + cost_build_storage_liquid
 
     # Operational Costs
-    cost_storage_gas_scenario = inst_data.costStorageGas * inst_data.storageGasSoc.groupby(level=[2]).sum()
-    cost_storage_liquid_scenario = inst_data.costStorageLiquid * inst_data.storageLiquidSoc.groupby(level=[2]).sum()
-    cost_storage_gas = np.dot(np.array(inst_data.scenarioWeight), np.array(cost_storage_gas_scenario)) + 0.0
-    cost_storage_liquid = np.dot(np.array(inst_data.scenarioWeight), np.array(cost_storage_liquid_scenario)) + 0.0
+    cost_storage_gas_scenario = inst_data.costStorageGas * cube.storageGasSoc.sum(axis=(0,2))
+    cost_storage_liquid_scenario = inst_data.costStorageLiquid * cube.storageLiquidSoc.sum(axis=(0,2))
+    cost_storage_gas = np.dot(cube.scenarioWeight, cost_storage_gas_scenario) + 0.0
+    cost_storage_liquid = np.dot(cube.scenarioWeight, cost_storage_liquid_scenario) + 0.0
     total_operational = cost_storage_gas + cost_storage_liquid
 
     col1, col2, col3 = st.columns(3)
@@ -96,14 +99,11 @@ else:
     #-------------------------------------------------------------------------------
     st.subheader('Operational Costs')
     col1, col2 = st.columns(2)
-    cost_storage_gas_scenario['storageGasSoc'] = cost_storage_gas_scenario['storageGasSoc'].apply(lambda x: millify(x))
-    cost_storage_gas_scenario = cost_storage_gas_scenario.merge(inst_data.Scenario_names, left_on='Scenario', right_on='scenario_id')
-    cost_storage_gas_scenario.columns = ['Operational Cost of Hydrogen Gas Storage','scenario_id', 'Scenario']
-    cost_storage_gas_scenario = cost_storage_gas_scenario[['Scenario', 'Operational Cost of Hydrogen Gas Storage']].set_index('Scenario')
-    cost_storage_liquid_scenario['storageLiquidSoc'] = cost_storage_liquid_scenario['storageLiquidSoc'].apply(lambda x: millify(x))
-    cost_storage_liquid_scenario = cost_storage_liquid_scenario.merge(inst_data.Scenario_names, left_on='Scenario', right_on='scenario_id')
-    cost_storage_liquid_scenario.columns = ['Operational Cost of Liquid Hydrogen Storage','scenario_id', 'Scenario']
-    cost_storage_liquid_scenario = cost_storage_liquid_scenario[['Scenario', 'Operational Cost of Liquid Hydrogen Storage']].set_index('Scenario')    
+    scenario_index = pd.Index(cube.scenarioNames, name='Scenario')
+    cost_storage_gas_scenario = pd.DataFrame({'Operational Cost of Hydrogen Gas Storage': [millify(x) for x in cost_storage_gas_scenario]},
+                                             index=scenario_index)
+    cost_storage_liquid_scenario = pd.DataFrame({'Operational Cost of Liquid Hydrogen Storage': [millify(x) for x in cost_storage_liquid_scenario]},
+                                                index=scenario_index)
 
     col1.dataframe(cost_storage_gas_scenario)
     col2.dataframe(cost_storage_liquid_scenario)
@@ -140,22 +140,12 @@ else:
     col1, col2, col3, col4 = st.columns(4)
 
     generation_scenario = col1.selectbox('Pick a scenario', scenario_options, key='generation_scenario')
-    generation_scenario_id = inst_data.Scenario_names.loc[inst_data.Scenario_names['scenario_name'] == generation_scenario]['scenario_id'].iloc[0]
+    generation_scenario_pos = scenario_options.index(generation_scenario)
     
-    # Sum over all locations for each (period, scenario) pair
-    df1 = inst_data.generationRenewable.groupby(level=[1,2]).sum()
-    df2 = inst_data.spillRenewable.groupby(level=[1,2]).sum()
-    # Get generation and spillage data together and filter for scenario
-    df = df1.join(df2).reset_index()
-    max_gen = df['generationRenewable'].max()
-    df = df.loc[df['Scenario'] == generation_scenario_id]
-    # Create a new columns 'Day' and 'Time Period'
-    df['Day'] = df.apply(get_day, axis=1)
-    df['Time Period'] = df.groupby('Day').cumcount() + 1
-    df = df.astype({'Day': 'str'})
-    # Plot Data
-    df = df.rename(columns={'generationRenewable': 'Installed Generation (MW)',
-                            'spillRenewable':'Electricity Spillage (MW)'})
+    # Sums over all locations of generation and spillage for the scenario, with columns 'Day' and 'Time Period'
+    max_gen = cube.generationRenewable.max()
+    df = cube.day_frame(**{'Installed Generation (MW)': cube.generationRenewable[generation_scenario_pos],
+                           'Electricity Spillage (MW)': cube.spillRenewable[generation_scenario_pos]})
 
     tab1, tab2, tab3 = st.tabs(["Both", "Installed Generation", "Electricity Spillage"])
     with tab1:
@@ -196,40 +186,24 @@ else:
     # Filters
     colA, colB = col1.columns(2)
     scenario_electrolyzer = colA.selectbox('Pick a scenario', scenario_options, key='electrolyzer')
-    scenario_electrolyzer_id = inst_data.Scenario_names.loc[inst_data.Scenario_names['scenario_name'] == scenario_electrolyzer]['scenario_id'].iloc[0]
+    scenario_electrolyzer_pos = scenario_options.index(scenario_electrolyzer)
     electrolyzer_id = colB.selectbox('Pick an electrolyzer ID', electrolyzer_options)
+    electrolyzer_pos = electrolyzer_options.index(electrolyzer_id)
     
     tab1, tab2 = col1.tabs(["Storage Level", "Charge vs. Discharge"])
     with tab1:
-        # Get and Filter State of charge data
-        df = inst_data.storageGasSoc
-        df = df[(df.index.isin([electrolyzer_id], level=0)) & (df.index.isin([scenario_electrolyzer_id], level=2))]
-        df = df.reset_index()
-        # Create a new columns 'Day' and 'Time Period'
-        df['Day'] = df.apply(get_day, axis=1)
-        df['Time Period'] = df.groupby('Day').cumcount() + 1
-        df = df.astype({'Day': 'str'})
+        # State of charge data of the electrolyzer and scenario, with columns 'Day' and 'Time Period'
+        df = cube.day_frame(**{'Storage Level (MW)': cube.storageGasSoc[electrolyzer_pos, scenario_electrolyzer_pos]})
         # Plot SoC
-        df = df.rename(columns={'storageGasSoc':'Storage Level (MW)'})
         fig = px.line(df, x="Time Period", y="Storage Level (MW)", color='Day')
         st.plotly_chart(fig, theme="streamlit", use_container_width=True)
     with tab2:
         # Plot Charge vs Discharge
         # Select electrolyzer ID and scenario
-        df1 = inst_data.storageGasCharge
-        df1 = df1[(df1.index.isin([electrolyzer_id], level=0)) & (df1.index.isin([scenario_electrolyzer_id], level=2))]
-        df2 = inst_data.storageGasDischarge
-        df2 = df2[(df2.index.isin([electrolyzer_id], level=0)) & (df2.index.isin([scenario_electrolyzer_id], level=2))]
-        # Make discharge negative to plot in negative axis
-        df2 = -df2 
-        # Get charge and discharge data together
-        df = df1.join(df2).reset_index()
-        # New column to combine charge and discharge together
-        df['Charged (MW)'] = np.where(df['storageGasCharge'] > 0, df['storageGasCharge'], df['storageGasDischarge'])
-        # Create a new columns 'Day' and 'Time Period'
-        df['Day'] = df.apply(get_day, axis=1)
-        df['Time Period'] = df.groupby('Day').cumcount() + 1
-        df = df.astype({'Day': 'str'})
+        charge = cube.storageGasCharge[electrolyzer_pos, scenario_electrolyzer_pos]
+        discharge = cube.storageGasDischarge[electrolyzer_pos, scenario_electrolyzer_pos]
+        # Combine charge and discharge together, discharge is negative to plot in negative axis
+        df = cube.day_frame(**{'Charged (MW)': np.where(charge > 0, charge, -discharge)})
         # Plot data
         fig = px.area(df, x="Time Period", y="Charged (MW)", color='Day')
         st.plotly_chart(fig, theme="streamlit", use_container_width=True)
@@ -239,40 +213,24 @@ else:
     # Filters
     colA, colB = col2.columns(2)
     scenario_tank = colA.selectbox('Pick a scenario', scenario_options, key='tank')
-    scenario_tank_id = inst_data.Scenario_names.loc[inst_data.Scenario_names['scenario_name'] == scenario_tank]['scenario_id'].iloc[0]
+    scenario_tank_pos = scenario_options.index(scenario_tank)
     tank_id = colB.selectbox('Pick an tank ID', tank_options)
+    tank_pos = tank_options.index(tank_id)
 
     tab1, tab2 = col2.tabs(["Storage Level", "Charge vs. Discharge"])
     with tab1:
-        # Get and Filter State of charge data
-        df = inst_data.storageLiquidSoc
-        df = df[(df.index.isin([tank_id], level=0)) & (df.index.isin([scenario_tank_id], level=2))]
-        df = df.reset_index()
-        # Create a new columns 'Day' and 'Time Period'
-        df['Day'] = df.apply(get_day, axis=1)
-        df['Time Period'] = df.groupby('Day').cumcount() + 1
-        df = df.astype({'Day': 'str'})
+        # State of charge data of the tank and scenario, with columns 'Day' and 'Time Period'
+        df = cube.day_frame(**{'Storage Level (MW)': cube.storageLiquidSoc[tank_pos, scenario_tank_pos]})
         # Plot SoC
-        df = df.rename(columns={'storageLiquidSoc':'Storage Level (MW)'})
         fig = px.line(df, x="Time Period", y="Storage Level (MW)", color='Day')
         st.plotly_chart(fig, theme="streamlit", use_container_width=True)
     with tab2:
         # Plot Charge vs Discharge
-        # Select electrolyzer ID and scenario
-        df1 = inst_data.storageLiquidCharge
-        df1 = df1[(df1.index.isin([tank_id], level=0)) & (df1.index.isin([scenario_tank_id], level=2))]
-        df2 = inst_data.storageLiquidDischarge
-        df2 = df2[(df2.index.isin([tank_id], level=0)) & (df2.index.isin([scenario_tank_id], level=2))]
-        # Make discharge negative to plot in negative axis
-        df2 = -df2 
-        # Get charge and discharge data together
-        df = df1.join(df2).reset_index()
-        # New column to combine charge and discharge together
-        df['Charged (MW)'] = np.where(df['storageLiquidCharge'] > 0, df['storageLiquidCharge'], df['storageLiquidDischarge'])
-        # Create a new columns 'Day' and 'Time Period'
-        df['Day'] = df.apply(get_day, axis=1)
-        df['Time Period'] = df.groupby('Day').cumcount() + 1
-        df = df.astype({'Day': 'str'})
+        # Select tank ID and scenario
+        charge = cube.storageLiquidCharge[tank_pos, scenario_tank_pos]
+        discharge = cube.storageLiquidDischarge[tank_pos, scenario_tank_pos]
+        # Combine charge and discharge together, discharge is negative to plot in negative axis
+        df = cube.day_frame(**{'Charged (MW)': np.where(charge > 0, charge, -discharge)})
         # Plot data
         fig = px.area(df, x="Time Period", y="Charged (MW)", color='Day')
         st.plotly_chart(fig, theme="streamlit", use_container_width=True)
@@ -287,23 +245,11 @@ else:
     max_lossload_perc = round(100 * inst_data.maxLossLoadElectricity, 3)
     col1.metric(label="**Maximum Loss of Load Allowed**", value=f"{max_lossload_perc}%")
 
-    sol_lossload = inst_data.lossLoadElectricity.groupby(level=[2]).sum()
-    sol_demand_sum = inst_data.demandElectricity.sum()
-    sol_lossload["Solution's Loss Load"] = sol_lossload['lossLoadElectricity'].apply(
-                                        lambda x: f"{round(100*x/sol_demand_sum, 3)}%")
-    sol_lossload = sol_lossload[["Solution's Loss Load"]]
-
-    # Add Shadow Prices
-    df = inst_data.duals_E.reset_index()
-    df = df.rename(columns={'index': 'scenario_id', 0: 'Shadow Prices'})
-    df['Shadow Prices'] = np.abs(df['Shadow Prices']).round(decimals=2)
-    sol_lossload = sol_lossload.merge(df, left_on='Scenario', right_on='scenario_id')
-
-    # Add scenario names
-    sol_lossload = sol_lossload.merge(inst_data.Scenario_names, left_on='scenario_id', right_on='scenario_id')
-    sol_lossload = sol_lossload.rename(columns={'scenario_name': 'Scenario'})
-    sol_lossload = sol_lossload.set_index('Scenario')
-    sol_lossload = sol_lossload[["Solution's Loss Load", "Shadow Prices"]]
+    # Loss of load and shadow prices of each scenario
+    sol_demand_sum = cube.demandElectricity.sum()
+    sol_lossload = pd.DataFrame({"Solution's Loss Load": [f"{round(100*x/sol_demand_sum, 3)}%" for x in cube.lossLoadElectricity],
+                                 "Shadow Prices": np.abs(cube.dualsLossLoadElectricity).round(decimals=2)},
+                                index=scenario_index)
     
     col1.dataframe(sol_lossload)
 
@@ -313,23 +259,11 @@ else:
     max_lossload_perc = round(100 * inst_data.maxLossLoadGas, 3)
     col2.metric(label="**Maximum Loss of Load Allowed**", value=f"{max_lossload_perc}%")
 
-    sol_lossload = inst_data.lossLoadGas.groupby(level=[2]).sum()
-    sol_demand_sum = inst_data.demandGas.sum()
-    sol_lossload["Solution's Loss Load"] = sol_lossload['lossLoadGas'].apply(
-                                        lambda x: f"{round(100*x/sol_demand_sum, 3)}%")
-    sol_lossload = sol_lossload[["Solution's Loss Load"]]
-
-    # Add Shadow Prices
-    df = inst_data.duals_G.reset_index()
-    df = df.rename(columns={'index': 'scenario_id', 0: 'Shadow Prices'})
-    df['Shadow Prices'] = np.abs(df['Shadow Prices']).round(decimals=2)
-    sol_lossload = sol_lossload.merge(df, left_on='Scenario', right_on='scenario_id')
-
-    # Add scenario names
-    sol_lossload = sol_lossload.merge(inst_data.Scenario_names, left_on='scenario_id', right_on='scenario_id')
-    sol_lossload = sol_lossload.rename(columns={'scenario_name': 'Scenario'})
-    sol_lossload = sol_lossload.set_index('Scenario')
-    sol_lossload = sol_lossload[["Solution's Loss Load", "Shadow Prices"]]
+    # Loss of load and shadow prices of each scenario
+    sol_demand_sum = cube.demandGas.sum()
+    sol_lossload = pd.DataFrame({"Solution's Loss Load": [f"{round(100*x/sol_demand_sum, 3)}%" for x in cube.lossLoadGas],
+                                 "Shadow Prices": np.abs(cube.dualsLossLoadGas).round(decimals=2)},
+                                index=scenario_index)
 
     col2.dataframe(sol_lossload)
     
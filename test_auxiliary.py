@@ -0,0 +1,219 @@
+"""
+@author: Bárbara Rodrigues, Daniel Kopisitskiy, Denise Cariaga Sandoval
+@project: MOPTA Competition 2024 Project
+
+Regression checks of the model builders and solvers on a small synthetic instance, usage:
+    python -m pytest test_auxiliary.py
+"""
+# User-defined Libraries
+from auxiliary import InstanceMOPTA, BendersMOPTA, ProgressiveHedgingMOPTA, create_model, driver_telemetry, run_economical_analysis, synthetic_instance_sheets
+# Python Libraries
+import auxiliary
+import gurobipy as gp
+import itertools
+import numpy as np
+import os
+import pandas as pd
+import pytest
+
+# Small enough for the size-limited Gurobi license with the dense formulation
+SMALL_INSTANCE = dict(num_loads=2, num_industrial=1, num_days=2, periods_per_day=2, num_scenarios=2, seed=0)
+
+gp.setParam('OutputFlag', 0)
+
+def small_instance():
+    # Models change the costs and limits of their instance, so every check gets its own
+    return InstanceMOPTA.from_sheets(synthetic_instance_sheets(**SMALL_INSTANCE))
+
+def solve_objective(backend:str='gurobi', **options):
+    model = create_model(small_instance(), backend, **options)
+    model.optimize()
+    assert (model.Status == gp.GRB.OPTIMAL), f'Model {options} ended with status {model.Status}.'
+    objective = model.ObjVal
+    model.dispose()
+    return objective
+
+@pytest.fixture(scope='module')
+def dense_objective():
+    return solve_objective()
+
+@pytest.mark.parametrize('options', [{'sparse': True}, {'vectorized': True}, {'sparse': True, 'vectorized': True}])
+def test_builders_match_dense(dense_objective, options):
+    assert solve_objective(**options) == pytest.approx(dense_objective, rel=1e-6)
+
+def test_benders_reaches_extensive_form(dense_objective):
+    benders = BendersMOPTA(small_instance())
+    history = benders.solve()
+    benders.dispose()
+    assert benders.ObjVal == pytest.approx(dense_objective, rel=1e-6)
+    assert history['lower_bound'].iloc[-1] <= benders.ObjVal * (1 + 1e-6)
+
+def test_progressive_hedging_reaches_extensive_form(dense_objective):
+    hedging = ProgressiveHedgingMOPTA(small_instance())
+    hedging.solve()
+    hedging.dispose()
+    # Consensus build decisions are evaluated exactly, the Lagrangian bound stays below the optimum
+    assert hedging.ObjVal == pytest.approx(dense_objective, rel=1e-4)
+    assert hedging.LowerBound <= dense_objective * (1 + 1e-6)
+
+def economical_sweep(backend:str):
+    # Sweep of the economical analysis over a 2x2 grid of loss of load limits
+    model = create_model(small_instance(), backend, sparse=True)
+    df = run_economical_analysis(model, 0, 0.01, 0.01, warm_start=(backend == 'gurobi'))
+    model.dispose()
+    return df
+
+@pytest.mark.parametrize('backend', ['highs', 'scipy'])
+def test_matrix_backends_match_gurobi(dense_objective, backend):
+    assert solve_objective(backend, sparse=True) == pytest.approx(dense_objective, rel=1e-6)
+    expected, df = economical_sweep('gurobi'), economical_sweep(backend)
+    columns = ['ll_perc_E', 'll_perc_G', 'investment_cost', 'operational_cost']
+    pd.testing.assert_frame_equal(df[columns], expected[columns], rtol=1e-6)
+
+def test_sweep_telemetry_on_highs(monkeypatch, tmp_path):
+    monkeypatch.setenv('MOPTA_TELEMETRY_LOG', str(tmp_path / 'telemetry.jsonl'))
+    record = economical_sweep('highs').attrs['telemetry']
+    assert (record['points'] == 4) and (record['model']['model']['backend'] == 'highs')
+    # Models without telemetry only give the record of the driver
+    assert 'model' not in driver_telemetry('check', 0.0, pd.DataFrame(), object())
+
+def test_phase_times_are_opt_in(monkeypatch):
+    monkeypatch.delenv('MOPTA_TELEMETRY_LOG', raising=False)
+    model = create_model(small_instance(), sparse=True)
+    model.optimize()
+    assert 'presolve_time' not in model.telemetry()['phases']['optimize']
+    model.reset()
+    model.optimize(phase_times=True)
+    assert 'presolve_time' in model.telemetry()['phases']['optimize']
+    model.dispose()
+
+def test_instance_cache_evicts_old_workbooks(monkeypatch, tmp_path):
+    monkeypatch.setattr(auxiliary, 'INSTANCE_CACHE_DIR', str(tmp_path / 'cache'))
+    for seed in range(2):
+        InstanceMOPTA.from_sheets(synthetic_instance_sheets(**{**SMALL_INSTANCE, 'seed': seed})).to_excel(str(tmp_path / f'{seed}.xlsx'))
+    sheets = auxiliary.read_instance_sheets(str(tmp_path / '0.xlsx'), max_bytes=0)
+    assert len(os.listdir(tmp_path / 'cache')) == 1
+    # The entry just written is kept even beyond the limit, older ones are removed
+    auxiliary.read_instance_sheets(str(tmp_path / '1.xlsx'), max_bytes=0)
+    assert len(os.listdir(tmp_path / 'cache')) == 1
+    cached = auxiliary.read_instance_sheets(str(tmp_path / '0.xlsx'))
+    assert all(cached[sheet].equals(sheets[sheet]) for sheet in sheets)
+    assert len(os.listdir(tmp_path / 'cache')) == 2
+
+def small_instance_file(tmp_path):
+    filename = str(tmp_path / 'small_instance.xlsx')
+    small_instance().to_excel(filename)
+    return filename
+
+def test_future_scenarios_timings_and_start_after_cache_hit(monkeypatch, tmp_path):
+    filename, cache = small_instance_file(tmp_path), auxiliary.SolveCache(str(tmp_path / 'solutions'))
+    df = auxiliary.run_future_scenarios_analysis([-0.3], [0], [0], [0], instance_filename=filename, cache=cache)
+    assert (df[['runtime_mip', 'time_point']] > 0).all(axis=None)
+    (key,) = os.listdir(tmp_path / 'solutions')
+    # The first point is a hit, the build decisions of its entry are the MIP start of the second one
+    starts = []
+    solve_point = auxiliary.solve_future_scenario_point
+    monkeypatch.setattr(auxiliary, 'solve_future_scenario_point', lambda model, *args: starts.append(args[-1]) or solve_point(model, *args))
+    auxiliary.run_future_scenarios_analysis([-0.3, 0], [0], [0], [0], instance_filename=filename, cache=cache)
+    assert starts == [cache.get(key)['build']]
+
+def test_aggregation_with_every_day_matches_full_model():
+    # Three days so that the inter-day links of the liquid storages chain more than two days
+    inst = InstanceMOPTA.from_sheets(synthetic_instance_sheets(**{**SMALL_INSTANCE, 'num_days': 3}))
+    assert sorted(inst.aggregate_days(len(inst.Days)).daySequence) == [1, 2, 3]
+    df = auxiliary.run_time_aggregation_analysis(inst, [len(inst.Days)])
+    # Within the MIP gap of the two solves
+    assert abs(df.loc[0, 'objective_error']) <= 1e-4
+    assert abs(df.loc[0, 'build_regret']) <= 1e-4
+
+def test_rolling_horizon_covers_every_day_with_fixed_build(monkeypatch):
+    inst = InstanceMOPTA.from_sheets(synthetic_instance_sheets(**{**SMALL_INSTANCE, 'num_days': 5}))
+    model = create_model(inst, sparse=True)
+    model.optimize()
+    build = model.get_build_values()
+    model.dispose()
+    # Solution values off the integers by the feasibility tolerance are fixed to the rounded values
+    perturbed = {name: [x - 1e-7 if x > 0 else x for x in values] for name, values in build.items()}
+    fixed = []
+    fix_build = auxiliary.ModelMOPTA.fix_build
+    def record_fix_build(model, values=None):
+        fix_build(model, values)
+        fixed.append({name: model.getAttr('LB', list(getattr(model, name).values())) for name in build})
+    monkeypatch.setattr(auxiliary.ModelMOPTA, 'fix_build', record_fix_build)
+
+    # Every window looks ahead to the end of the horizon and gets the budget left, so each one is
+    # feasible with the rest of the solution of the previous window
+    rows = auxiliary.run_rolling_horizon(inst, perturbed, window_days=2, lookahead_days=len(inst.Days), budget='remaining')
+    days = [d for first, last in zip(rows['first_day'], rows['last_day']) for d in range(first, last + 1)]
+    assert days == sorted(inst.Days)
+    assert (len(fixed) == len(rows)) and all(values == build for values in fixed)
+    for name in build:
+        assert np.array_equal(getattr(inst, name).to_numpy().ravel(), build[name])
+    assert not inst.storageLiquidSoc.isna().any(axis=None)
+
+def test_economical_sweep_resumes_from_store(monkeypatch, tmp_path):
+    expected = economical_sweep('gurobi')
+    filename = str(tmp_path / 'results.sqlite')
+    store = auxiliary.ResultsStore(filename, ['ll_perc_E', 'll_perc_G'])
+    for _, row in expected.iloc[[3, 0]].iterrows():
+        store.append(row.to_dict())
+    store.close()
+
+    solved = []
+    solve_point = auxiliary.solve_economical_point
+    monkeypatch.setattr(auxiliary, 'solve_economical_point', lambda model, *args: solved.append(args[:2]) or solve_point(model, *args))
+    model = create_model(small_instance(), sparse=True)
+    df = run_economical_analysis(model, 0, 0.01, 0.01, results_filename=filename)
+    model.dispose()
+    # Only the points missing from the store are solved, rows come back in the order of the grid
+    assert sorted(solved) == sorted(map(tuple, expected[['ll_perc_E', 'll_perc_G']].iloc[[1, 2]].to_numpy()))
+    grid = list(itertools.product([0, 0.01], [0, 0.01]))
+    store = auxiliary.ResultsStore(filename, ['ll_perc_E', 'll_perc_G'])
+    stored = store.read(grid)
+    store.close()
+    assert list(map(tuple, stored[['ll_perc_E', 'll_perc_G']].to_numpy())) == grid
+    columns = ['ll_perc_E', 'll_perc_G', 'investment_cost', 'operational_cost']
+    pd.testing.assert_frame_equal(df[columns], expected[columns], rtol=1e-6)
+
+def test_solve_cache_hit_restores_frames_without_building(monkeypatch, tmp_path):
+    cache = auxiliary.SolveCache(str(tmp_path / 'solutions'))
+    solved = small_instance()
+    record = auxiliary.solve_cached(solved, cache, sparse=True, store_frames=True)
+    assert not record['cache_hit']
+
+    # A hit must not build a model, its solution comes only from the entry
+    monkeypatch.setattr(auxiliary, 'create_model', lambda *args, **kwds: pytest.fail('A cache hit built a model.'))
+    restored = small_instance()
+    hit = auxiliary.solve_cached(restored, cache, sparse=True, store_frames=True)
+    assert hit == {**record, 'cache_hit': True}
+    assert restored.is_solution_loaded and (restored.optimality_status == solved.optimality_status)
+    for name in auxiliary.SOLUTION_LEVELS:
+        pd.testing.assert_frame_equal(getattr(restored, name), getattr(solved, name), check_dtype=False)
+    pd.testing.assert_frame_equal(restored.duals_E, solved.duals_E)
+    pd.testing.assert_frame_equal(restored.duals_G, solved.duals_G)
+
+    # Another instance content is another key
+    other = InstanceMOPTA.from_sheets(synthetic_instance_sheets(**{**SMALL_INSTANCE, 'seed': 1}))
+    with pytest.raises(pytest.fail.Exception):
+        auxiliary.solve_cached(other, cache, sparse=True, store_frames=True)
+
+def test_surface_grid_rejects_several_rows_per_cell():
+    df = pd.DataFrame({'x': [0, 0, 1, 1], 'y': [0, 1, 0, 1], 'z': [1.0, 2.0, 3.0, 4.0]})
+    x, y, z = auxiliary.surface_grid(df, 'x', 'y', ['z'])
+    assert np.array_equal(z['z'], [[1.0, 3.0], [2.0, 4.0]])
+    # A third parameter left unfiltered puts two rows in the same cell
+    with pytest.raises(AssertionError):
+        auxiliary.surface_grid(pd.concat([df, df.assign(z=df['z'] + 10)]), 'x', 'y', ['z'])
+
+@pytest.mark.parametrize('options', [{'sparse': True}, {'sparse': True, 'vectorized': True}])
+def test_family_stats_add_up_to_model_size(options):
+    inst = small_instance()
+    model = create_model(inst, **options)
+    # Families added in several blocks, after the model was built
+    for level in [0, 1]:
+        model.bound_final_storage_liquid({(i, s): level for i in inst.TankNodes for s in inst.Scenarios})
+        stats = model.family_stats()
+        assert sum(family['rows'] for family in stats.values()) == model.NumConstrs
+        assert sum(family['nonzeros'] for family in stats.values()) == model.NumNZs
+    assert stats['CfinalStorageLiquid']['rows'] == 2 * len(inst.TankNodes) * len(inst.Scenarios)
+    model.dispose()